@@ -0,0 +1,258 @@
+# --------------------------------------------------------------------------------
+#                                     AGREGADOS.PY
+#
+# Totales de los pedidos e ingresos, calculados en el servidor.
+#
+# - Los pedidos solo guardan pares (producto_id, cantidad). El total de un pedido
+#   se obtiene uniendo sus líneas con los productos del árbol (precio actual).
+# - Las unidades vendidas de cada producto y de cada cliente se mantienen de
+#   forma incremental: se suman al crear un pedido y se restan al modificarlo o
+#   eliminarlo, así que no hace falta recorrer toda la lista de pedidos.
+# - Para recalcular todo de golpe (o sumar un lote grande de pedidos) se usa
+#   NumPy si está instalado; si no, se suman los pedidos uno a uno.
+# --------------------------------------------------------------------------------
+
+import heapq
+from array import array
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError: # NumPy es opcional
+    np = None
+
+
+LINEAS_MINIMAS_NUMPY = 10000 # Por debajo de este número de líneas no compensa usar NumPy
+LIMITE_SUMA_NUMPY = 2 ** 62 # Las sumas con enteros de 64 bits no deben desbordarse
+
+
+def _es_clave(valor) -> bool:
+    return isinstance(valor, (str, int, float))
+
+
+# Solo se suman las cantidades numéricas (los datos llegan por JSON sin validar su tipo)
+def _es_cantidad(valor) -> bool:
+    return type(valor) in (int, float) and valor == valor # (NaN != NaN)
+
+
+def _sumar_en(unidades: dict, clave, cantidad):
+    total = unidades.get(clave, 0) + cantidad
+    # Si ya no quedan unidades, se borra la entrada
+    if total == 0:
+        unidades.pop(clave, None)
+    else:
+        unidades[clave] = total
+
+
+class AgregadosPedidos:
+    def __init__(self):
+        self.unidades_productos = {} # producto_id --> unidades vendidas
+        self.clientes = {} # nombre_cliente --> [número de pedidos, {producto_id: unidades}]
+
+    # Suma (signo=1) o resta (signo=-1) las líneas de un pedido
+    def _aplicar(self, pedido, signo: int):
+        cliente = pedido.nombre_cliente
+        resumen = None
+        if _es_clave(cliente):
+            resumen = self.clientes.get(cliente)
+            if resumen is None:
+                resumen = self.clientes[cliente] = [0, {}]
+            resumen[0] += signo
+
+        for producto_id, cantidad in pedido.lista_pedidos.pares():
+            if not _es_clave(producto_id) or not _es_cantidad(cantidad):
+                continue
+            _sumar_en(self.unidades_productos, producto_id, signo * cantidad)
+            if resumen is not None:
+                _sumar_en(resumen[1], producto_id, signo * cantidad)
+
+        if resumen is not None and resumen[0] == 0:
+            del self.clientes[cliente]
+
+    def sumar(self, pedido):
+        self._aplicar(pedido, 1)
+
+    def restar(self, pedido):
+        self._aplicar(pedido, -1)
+
+    # Cambia algunas líneas de un pedido del mismo cliente: se restan las líneas
+    # "antes" y se suman las líneas "despues" (el número de pedidos no cambia).
+    def ajustar(self, cliente, antes: list[tuple], despues: list[tuple]):
+        resumen = self.clientes.get(cliente) if _es_clave(cliente) else None
+        for signo, lineas in ((-1, antes), (1, despues)):
+            for producto_id, cantidad in lineas:
+                if not _es_clave(producto_id) or not _es_cantidad(cantidad):
+                    continue
+                _sumar_en(self.unidades_productos, producto_id, signo * cantidad)
+                if resumen is not None:
+                    _sumar_en(resumen[1], producto_id, signo * cantidad)
+
+    # Suma unas unidades ya agrupadas (por ejemplo, las de los pedidos archivados):
+    # {producto_id: unidades} y {nombre_cliente: [número de pedidos, {producto_id: unidades}]}
+    def sumar_resumen(self, unidades_productos: dict, clientes: dict):
+        for producto_id, unidades in unidades_productos.items():
+            _sumar_en(self.unidades_productos, producto_id, unidades)
+        for cliente, (numero_pedidos, unidades) in clientes.items():
+            resumen = self.clientes.get(cliente)
+            if resumen is None:
+                resumen = self.clientes[cliente] = [0, {}]
+            resumen[0] += numero_pedidos
+            for producto_id, cantidad in unidades.items():
+                _sumar_en(resumen[1], producto_id, cantidad)
+
+    # Suma un lote de pedidos. Los pedidos cuyas líneas están en un array de enteros
+    # se agrupan con NumPy (ordenando por producto y sumando cada grupo); el resto
+    # se suman uno a uno.
+    def sumar_lote(self, pedidos):
+        if np is None:
+            for pedido in pedidos:
+                self.sumar(pedido)
+            return
+
+        valores = array("q") # [producto_id, cantidad, ...] de todos los pedidos
+        vectorizables = [] # Pedidos cuyas líneas se han copiado en "valores"
+        for pedido in pedidos:
+            datos = pedido.lista_pedidos.valores()
+            if type(datos) is array:
+                valores.extend(datos)
+                vectorizables.append(pedido)
+            else:
+                self.sumar(pedido)
+        if len(valores) < 2 * LINEAS_MINIMAS_NUMPY:
+            for pedido in vectorizables:
+                self.sumar(pedido)
+            return
+
+        pares = np.frombuffer(valores, dtype=np.int64).reshape(-1, 2)
+        productos = pares[:, 0]
+        cantidades = pares[:, 1]
+        # Si la suma pudiera desbordar un entero de 64 bits, se suman con Python
+        if float(np.abs(cantidades.astype(np.float64)).max()) * len(cantidades) >= LIMITE_SUMA_NUMPY:
+            for pedido in vectorizables:
+                self.sumar(pedido)
+            return
+
+        for producto_id, unidades in zip(*self._agrupar(productos, cantidades)):
+            _sumar_en(self.unidades_productos, producto_id, unidades)
+
+        # Cada cliente se sustituye por un código numérico (-1 si no se agrupa por cliente)
+        nombres = [] # código --> nombre_cliente
+        codigo_de = {} # nombre_cliente --> código
+        codigos = []
+        for pedido in vectorizables:
+            cliente = pedido.nombre_cliente
+            if _es_clave(cliente):
+                codigo = codigo_de.get(cliente)
+                if codigo is None:
+                    codigo = codigo_de[cliente] = len(nombres)
+                    nombres.append(cliente)
+                codigos.append(codigo)
+            else:
+                codigos.append(-1)
+        numero_pedidos = np.bincount(np.array(codigos, dtype=np.int64) + 1, minlength=len(nombres) + 1)
+        for codigo, cliente in enumerate(nombres):
+            resumen = self.clientes.get(cliente)
+            if resumen is None:
+                resumen = self.clientes[cliente] = [0, {}]
+            resumen[0] += int(numero_pedidos[codigo + 1])
+
+        lineas = [len(pedido.lista_pedidos) for pedido in vectorizables]
+        clientes = np.repeat(np.array(codigos, dtype=np.int64), lineas)
+        con_cliente = clientes >= 0
+        clientes = clientes[con_cliente]
+        productos = productos[con_cliente]
+        cantidades = cantidades[con_cliente]
+        if len(clientes) == 0:
+            return
+        # Se ordena por (cliente, producto): las líneas de cada cliente quedan juntas
+        orden = np.lexsort((productos, clientes))
+        clientes = clientes[orden]
+        productos = productos[orden]
+        distinto = (clientes[1:] != clientes[:-1]) | (productos[1:] != productos[:-1])
+        inicios = np.flatnonzero(np.concatenate(([True], distinto)))
+        sumas = np.add.reduceat(cantidades[orden], inicios)
+        clientes = clientes[inicios]
+        productos = productos[inicios]
+        cortes = np.flatnonzero(np.concatenate(([True], clientes[1:] != clientes[:-1], [True])))
+        for inicio, fin in zip(cortes[:-1].tolist(), cortes[1:].tolist()):
+            unidades = self.clientes[nombres[int(clientes[inicio])]][1]
+            ids = productos[inicio:fin].tolist()
+            totales = sumas[inicio:fin].tolist()
+            if not unidades and 0 not in totales:
+                unidades.update(zip(ids, totales))
+            else:
+                for producto_id, total in zip(ids, totales):
+                    _sumar_en(unidades, producto_id, total)
+
+    # Suma las cantidades de cada clave distinta. Devuelve (claves, sumas) como listas.
+    @staticmethod
+    def _agrupar(claves, cantidades):
+        orden = np.argsort(claves, kind="stable")
+        claves = claves[orden]
+        inicios = np.flatnonzero(np.concatenate(([True], claves[1:] != claves[:-1])))
+        return claves[inicios].tolist(), np.add.reduceat(cantidades[orden], inicios).tolist()
+
+    # Recalcula todos los agregados desde cero
+    def recalcular(self, pedidos):
+        self.unidades_productos = {}
+        self.clientes = {}
+        self.sumar_lote(list(pedidos))
+
+    # Los "n" productos con más unidades vendidas: [(producto_id, unidades), ...]
+    def top_productos(self, n: int) -> list[tuple]:
+        return heapq.nlargest(n, self.unidades_productos.items(), key=itemgetter(1))
+
+    # (número de pedidos, {producto_id: unidades}) de un cliente
+    def resumen_cliente(self, nombre_cliente) -> tuple[int, dict]:
+        resumen = self.clientes.get(nombre_cliente)
+        if resumen is None:
+            return 0, {}
+        return resumen[0], dict(resumen[1])
+
+
+# ------------------------------------------------------------
+#                 UNIÓN CON LOS PRODUCTOS (PRECIOS)
+# "productos" es un diccionario producto_id --> Producto (por
+# ejemplo, el resultado de "buscar_varios"). Las líneas cuyo
+# producto no existe o no tiene un precio numérico no tienen
+# subtotal y no se suman al total.
+# ------------------------------------------------------------
+def _importe(cantidad, producto):
+    if producto is None or not _es_cantidad(cantidad) or not _es_cantidad(producto.precio):
+        return None
+    return cantidad * producto.precio
+
+
+def total_pedido(pedido, productos: dict) -> dict:
+    lineas = []
+    total = 0
+    for producto_id, cantidad in pedido.lista_pedidos.pares():
+        producto = productos.get(producto_id) if _es_clave(producto_id) else None
+        subtotal = _importe(cantidad, producto)
+        if subtotal is not None:
+            total += subtotal
+        lineas.append({
+            "producto_id": producto_id,
+            "cantidad": cantidad,
+            "precio": producto.precio if producto is not None else None,
+            "subtotal": subtotal
+        })
+    return {
+        "pedido_id": pedido.id,
+        "nombre_cliente": pedido.nombre_cliente,
+        "lineas": lineas,
+        "total": total
+    }
+
+
+def ingresos_productos(unidades: list[tuple], productos: dict) -> list[dict]:
+    resultado = []
+    for producto_id, cantidad in unidades:
+        producto = productos.get(producto_id)
+        resultado.append({
+            "producto_id": producto_id,
+            "nombre": producto.nombre if producto is not None else None,
+            "unidades": cantidad,
+            "ingresos": _importe(cantidad, producto)
+        })
+    return resultado
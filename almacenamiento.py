@@ -0,0 +1,393 @@
+# --------------------------------------------------------------------------------
+#                                  ALMACENAMIENTO.PY
+#
+# Interfaz común de almacenamiento de productos y de pedidos, y una
+# implementación basada en SQLite.
+#
+# - AlmacenProductos: la implementan ProductosTreeBST (en memoria) y ProductosSQLite.
+# - AlmacenPedidos: la implementan ListaPedidos (en memoria) y PedidosSQLite.
+# - Contador: reparte identificadores; lo implementan ContadorAtomico (en memoria)
+#   y ContadorSQLite.
+#
+# El árbol y la lista en memoria pertenecen a un único proceso, así que con
+# varios workers (por ejemplo, gunicorn con "-w 4") cada uno tendría sus
+# propios datos. Con el almacenamiento SQLite todos los procesos comparten el
+# mismo fichero de base de datos (en modo WAL, que permite lecturas en
+# paralelo con una escritura).
+# --------------------------------------------------------------------------------
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Protocol
+
+from lista_enlazada_pedidos import LineaPedido, LineasPedido, Pedido, _cambiar_lineas
+from productos import Producto
+
+
+# ------------------------------------------------------------
+#                           INTERFACES
+# ------------------------------------------------------------
+class AlmacenProductos(Protocol):
+    def __len__(self) -> int: ...
+    def insertar(self, producto: Producto): ...
+    def insertar_lote(self, productos: list[Producto]): ...
+    def buscar(self, producto_id: int) -> Producto | None: ...
+    def buscar_varios(self, producto_ids) -> dict[int, Producto]: ...
+    def recorrido_inorder(self) -> list[Producto]: ...
+    def iterar_rango(self, desde=None, hasta=None) -> Iterator[Producto]: ...
+    def iterar_por_precio(self, precio_min=None, precio_max=None,
+                          despues_de: int | None = None) -> Iterator[Producto]: ...
+
+
+class AlmacenPedidos(Protocol):
+    def __len__(self) -> int: ...
+    def agregar_pedido(self, pedido: Pedido): ...
+    def agregar_pedidos(self, pedidos: list[Pedido]): ...
+    def buscar_pedido(self, pedido_id: int) -> Pedido | None: ...
+    def actualizar_pedido(self, pedido_id: int, pedido: Pedido) -> bool: ...
+    def modificar_lineas(self, pedido_id: int, cambios: dict, nombre_cliente=None) -> Pedido | None: ...
+    def eliminar_pedido(self, pedido_id: int) -> bool: ...
+    def listar_pedidos(self) -> list[Pedido]: ...
+    def iterar_pedidos(self, despues_de: int | None = None) -> Iterator[Pedido]: ...
+    def filtrar_pedidos(self, nombre_cliente=None, producto_id=None,
+                        despues_de: int | None = None) -> Iterator[Pedido]: ...
+    def top_productos(self, n: int) -> list[tuple]: ...
+    def resumen_cliente(self, nombre_cliente) -> tuple[int, dict]: ...
+
+
+class Contador(Protocol):
+    @property
+    def valor(self) -> int: ...
+    def siguiente(self, cantidad: int = 1) -> int: ...
+    def ajustar(self, minimo: int): ...
+
+
+# ------------------------------------------------------------
+#                       CONEXIÓN SQLITE
+# Cada hilo usa su propia conexión (las conexiones de sqlite3 no
+# se deben compartir entre hilos). Las conexiones funcionan en modo
+# "autocommit" y las operaciones de varias filas usan una transacción.
+# ------------------------------------------------------------
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre,
+    precio
+);
+CREATE INDEX IF NOT EXISTS productos_precio ON productos (precio, id);
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY,
+    nombre_cliente,
+    lineas TEXT NOT NULL -- JSON: [[producto_id, cantidad], ...]
+);
+CREATE INDEX IF NOT EXISTS pedidos_cliente ON pedidos (nombre_cliente);
+-- Índice secundario producto --> pedidos que lo contienen
+CREATE TABLE IF NOT EXISTS pedidos_productos (
+    producto_id,
+    pedido_id INTEGER NOT NULL,
+    PRIMARY KEY (producto_id, pedido_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS contadores (
+    nombre TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+"""
+
+
+FILAS_POR_BLOQUE = 500 # Filas leídas en cada consulta al recorrer una tabla
+INFINITO = float("inf")
+
+
+class ConexionSQLite:
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        self.conexion().executescript(ESQUEMA)
+
+    def conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, isolation_level=None, timeout=30,
+                                       check_same_thread=False)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # Ejecuta varias sentencias en una única transacción
+    @contextmanager
+    def transaccion(self):
+        conexion = self.conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+
+
+# Devuelve una conexión compartida por ruta, para que los productos, los
+# pedidos y los contadores de un mismo proceso reutilicen las conexiones.
+_conexiones: dict[str, ConexionSQLite] = {}
+_cerrojo_conexiones = threading.Lock()
+
+
+def _obtener_conexion(ruta: str) -> ConexionSQLite:
+    with _cerrojo_conexiones:
+        if ruta not in _conexiones:
+            _conexiones[ruta] = ConexionSQLite(ruta)
+        return _conexiones[ruta]
+
+
+# ------------------------------------------------------------
+#                       PRODUCTOSSQLITE
+# ------------------------------------------------------------
+class ProductosSQLite:
+    def __init__(self, ruta: str):
+        self.bd = _obtener_conexion(ruta)
+
+    def __len__(self) -> int:
+        return self.bd.conexion().execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+
+    @staticmethod
+    def _producto(fila) -> Producto:
+        return Producto(producto_id=fila[0], nombre_producto=fila[1], precio_producto=fila[2])
+
+    def insertar(self, producto: Producto):
+        self.insertar_lote([producto])
+
+    def insertar_lote(self, productos: list[Producto]):
+        with self.bd.transaccion() as conexion:
+            conexion.executemany("INSERT OR REPLACE INTO productos (id, nombre, precio) VALUES (?, ?, ?)",
+                                 [(producto.id, producto.nombre, producto.precio) for producto in productos])
+
+    def buscar(self, producto_id: int) -> Producto | None:
+        fila = self.bd.conexion().execute(
+            "SELECT id, nombre, precio FROM productos WHERE id = ?", (producto_id,)).fetchone()
+        return self._producto(fila) if fila is not None else None
+
+    def buscar_varios(self, producto_ids) -> dict[int, Producto]:
+        ids = list(set(producto_ids))
+        res = {}
+        conexion = self.bd.conexion()
+        # SQLite limita el número de parámetros de una consulta, se busca por bloques
+        for inicio in range(0, len(ids), 500):
+            bloque = ids[inicio:inicio + 500]
+            marcas = ",".join("?" * len(bloque))
+            for fila in conexion.execute(f"SELECT id, nombre, precio FROM productos WHERE id IN ({marcas})", bloque):
+                res[fila[0]] = self._producto(fila)
+        return res
+
+    def recorrido_inorder(self) -> list[Producto]:
+        return list(self.iterar_rango())
+
+    def iterar_rango(self, desde=None, hasta=None) -> Iterator[Producto]:
+        siguiente = desde if desde is not None else -2**63
+        hasta = hasta if hasta is not None else 2**63 - 1
+        # Se lee por bloques (paginación por clave) para no cargar toda la tabla
+        while True:
+            filas = self.bd.conexion().execute(
+                "SELECT id, nombre, precio FROM productos WHERE id >= ? AND id <= ? ORDER BY id LIMIT ?",
+                (siguiente, hasta, FILAS_POR_BLOQUE)).fetchall()
+            for fila in filas:
+                yield self._producto(fila)
+            if len(filas) < FILAS_POR_BLOQUE:
+                return
+            siguiente = filas[-1][0] + 1
+
+    # Igual que en el árbol en memoria, solo se tienen en cuenta los precios numéricos
+    def iterar_por_precio(self, precio_min=None, precio_max=None,
+                          despues_de: int | None = None) -> Iterator[Producto]:
+        precio_min = precio_min if precio_min is not None else -INFINITO
+        precio_max = precio_max if precio_max is not None else INFINITO
+        ultimo = (precio_min, -2**63)
+        if despues_de is not None:
+            fila = self.bd.conexion().execute(
+                "SELECT precio FROM productos WHERE id = ? AND typeof(precio) IN ('integer', 'real')",
+                (despues_de,)).fetchone()
+            if fila is not None:
+                ultimo = max(ultimo, (fila[0], despues_de))
+        while True:
+            filas = self.bd.conexion().execute(
+                "SELECT id, nombre, precio FROM productos "
+                "WHERE typeof(precio) IN ('integer', 'real') AND precio <= ? "
+                "AND (precio > ? OR (precio = ? AND id > ?)) "
+                "ORDER BY precio, id LIMIT ?",
+                (precio_max, ultimo[0], ultimo[0], ultimo[1], FILAS_POR_BLOQUE)).fetchall()
+            for fila in filas:
+                yield self._producto(fila)
+            if len(filas) < FILAS_POR_BLOQUE:
+                return
+            ultimo = (filas[-1][2], filas[-1][0])
+
+
+# ------------------------------------------------------------
+#                        PEDIDOSSQLITE
+# Los pedidos se recorren ordenados por identificador, que es el
+# mismo orden en el que se añaden.
+# ------------------------------------------------------------
+class PedidosSQLite:
+    def __init__(self, ruta: str):
+        self.bd = _obtener_conexion(ruta)
+
+    def __len__(self) -> int:
+        return self.bd.conexion().execute("SELECT COUNT(*) FROM pedidos").fetchone()[0]
+
+    @staticmethod
+    def _pedido(fila) -> Pedido:
+        return Pedido(pedido_id=fila[0], nombre_cliente=fila[1],
+                      lista_pedidos=[LineaPedido(producto_id=producto_id, cantidad=cantidad)
+                                     for producto_id, cantidad in json.loads(fila[2])])
+
+    @staticmethod
+    def _lineas(pedido: Pedido) -> str:
+        return json.dumps([[producto_id, cantidad] for producto_id, cantidad in pedido.lista_pedidos.pares()])
+
+    def agregar_pedido(self, pedido: Pedido):
+        self.agregar_pedidos([pedido])
+
+    @staticmethod
+    def _productos(pedido: Pedido) -> list[tuple]:
+        return [(producto_id, pedido.id) for producto_id in
+                {producto_id for producto_id, _ in pedido.lista_pedidos.pares()}]
+
+    def agregar_pedidos(self, pedidos: list[Pedido]):
+        with self.bd.transaccion() as conexion:
+            conexion.executemany("INSERT INTO pedidos (id, nombre_cliente, lineas) VALUES (?, ?, ?)",
+                                 [(pedido.id, pedido.nombre_cliente, self._lineas(pedido)) for pedido in pedidos])
+            conexion.executemany("INSERT INTO pedidos_productos (producto_id, pedido_id) VALUES (?, ?)",
+                                 [fila for pedido in pedidos for fila in self._productos(pedido)])
+
+    def buscar_pedido(self, pedido_id: int) -> Pedido | None:
+        fila = self.bd.conexion().execute(
+            "SELECT id, nombre_cliente, lineas FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()
+        return self._pedido(fila) if fila is not None else None
+
+    def actualizar_pedido(self, pedido_id: int, pedido: Pedido) -> bool:
+        with self.bd.transaccion() as conexion:
+            cursor = conexion.execute(
+                "UPDATE pedidos SET nombre_cliente = ?, lineas = ? WHERE id = ?",
+                (pedido.nombre_cliente, self._lineas(pedido), pedido_id))
+            if cursor.rowcount == 0:
+                return False
+            conexion.execute("DELETE FROM pedidos_productos WHERE pedido_id = ?", (pedido_id,))
+            conexion.executemany("INSERT INTO pedidos_productos (producto_id, pedido_id) VALUES (?, ?)",
+                                 [(producto_id, pedido_id) for producto_id, _ in self._productos(pedido)])
+        return True
+
+    # Se leen las líneas, se cambian y se guardan en la misma transacción. En el
+    # índice de productos solo se tocan los productos indicados.
+    def modificar_lineas(self, pedido_id: int, cambios: dict, nombre_cliente=None) -> Pedido | None:
+        with self.bd.transaccion() as conexion:
+            fila = conexion.execute(
+                "SELECT id, nombre_cliente, lineas FROM pedidos WHERE id = ?", (pedido_id,)).fetchone()
+            if fila is None:
+                return None
+            pedido = self._pedido(fila)
+            pedido.lista_pedidos = LineasPedido(_cambiar_lineas(pedido.lista_pedidos.valores(), cambios))
+            if nombre_cliente is not None:
+                pedido.nombre_cliente = nombre_cliente
+            conexion.execute("UPDATE pedidos SET nombre_cliente = ?, lineas = ? WHERE id = ?",
+                             (pedido.nombre_cliente, self._lineas(pedido), pedido_id))
+            presentes = {producto_id for producto_id, _ in pedido.lista_pedidos.pares()
+                         if isinstance(producto_id, (str, int, float))}
+            conexion.executemany("DELETE FROM pedidos_productos WHERE producto_id = ? AND pedido_id = ?",
+                                 [(producto_id, pedido_id) for producto_id in cambios
+                                  if producto_id not in presentes])
+            conexion.executemany("INSERT OR IGNORE INTO pedidos_productos (producto_id, pedido_id) VALUES (?, ?)",
+                                 [(producto_id, pedido_id) for producto_id in cambios
+                                  if producto_id in presentes])
+        return pedido
+
+    def eliminar_pedido(self, pedido_id: int) -> bool:
+        with self.bd.transaccion() as conexion:
+            cursor = conexion.execute("DELETE FROM pedidos WHERE id = ?", (pedido_id,))
+            conexion.execute("DELETE FROM pedidos_productos WHERE pedido_id = ?", (pedido_id,))
+        return cursor.rowcount > 0
+
+    def listar_pedidos(self) -> list[Pedido]:
+        return list(self.iterar_pedidos())
+
+    def iterar_pedidos(self, despues_de: int | None = None) -> Iterator[Pedido]:
+        return self._recorrer("", (), despues_de)
+
+    def filtrar_pedidos(self, nombre_cliente=None, producto_id=None,
+                        despues_de: int | None = None) -> Iterator[Pedido]:
+        condiciones = ""
+        parametros = ()
+        if nombre_cliente is not None:
+            condiciones += " AND nombre_cliente = ?"
+            parametros += (nombre_cliente,)
+        if producto_id is not None:
+            condiciones += " AND id IN (SELECT pedido_id FROM pedidos_productos WHERE producto_id = ?)"
+            parametros += (producto_id,)
+        return self._recorrer(condiciones, parametros, despues_de)
+
+    # Se lee la tabla por bloques (paginación por clave) para no cargar
+    # todos los pedidos en memoria a la vez.
+    def _recorrer(self, condiciones: str, parametros: tuple, despues_de: int | None) -> Iterator[Pedido]:
+        ultimo_id = despues_de if despues_de is not None else -2**63
+        while True:
+            filas = self.bd.conexion().execute(
+                f"SELECT id, nombre_cliente, lineas FROM pedidos WHERE id > ?{condiciones} ORDER BY id LIMIT ?",
+                (ultimo_id, *parametros, FILAS_POR_BLOQUE)).fetchall()
+            for fila in filas:
+                yield self._pedido(fila)
+            if len(filas) < FILAS_POR_BLOQUE:
+                return
+            ultimo_id = filas[-1][0]
+
+    # Los agregados se calculan con SQLite (GROUP BY sobre las líneas JSON de los
+    # pedidos): otros procesos pueden modificar los pedidos, así que no se pueden
+    # mantener en la memoria de este proceso. Como en la lista de pedidos, solo
+    # se suman las cantidades numéricas.
+    LINEAS_NUMERICAS = ("FROM pedidos, json_each(pedidos.lineas) AS linea "
+                        "WHERE json_type(linea.value, '$[1]') IN ('integer', 'real') "
+                        "AND json_type(linea.value, '$[0]') IN ('integer', 'real', 'text')")
+
+    def top_productos(self, n: int) -> list[tuple]:
+        return self.bd.conexion().execute(
+            "SELECT json_extract(linea.value, '$[0]') AS producto_id, "
+            f"SUM(json_extract(linea.value, '$[1]')) AS unidades {self.LINEAS_NUMERICAS} "
+            "GROUP BY producto_id HAVING unidades != 0 ORDER BY unidades DESC LIMIT ?", (n,)).fetchall()
+
+    def resumen_cliente(self, nombre_cliente) -> tuple[int, dict]:
+        conexion = self.bd.conexion()
+        numero_pedidos = conexion.execute("SELECT COUNT(*) FROM pedidos WHERE nombre_cliente = ?",
+                                          (nombre_cliente,)).fetchone()[0]
+        filas = conexion.execute(
+            "SELECT json_extract(linea.value, '$[0]') AS producto_id, "
+            f"SUM(json_extract(linea.value, '$[1]')) AS unidades {self.LINEAS_NUMERICAS} "
+            "AND nombre_cliente = ? GROUP BY producto_id HAVING unidades != 0", (nombre_cliente,)).fetchall()
+        return numero_pedidos, dict(filas)
+
+
+# ------------------------------------------------------------
+#                        CONTADORSQLITE
+# Contador de identificadores compartido por todos los procesos.
+# La reserva se hace con una única sentencia UPDATE, que SQLite
+# ejecuta de forma atómica.
+# ------------------------------------------------------------
+class ContadorSQLite:
+    def __init__(self, ruta: str, nombre: str, inicial: int = 1):
+        self.bd = _obtener_conexion(ruta)
+        self.nombre = nombre
+        self.bd.conexion().execute("INSERT OR IGNORE INTO contadores (nombre, valor) VALUES (?, ?)",
+                                   (nombre, inicial))
+
+    @property
+    def valor(self) -> int:
+        return self.bd.conexion().execute(
+            "SELECT valor FROM contadores WHERE nombre = ?", (self.nombre,)).fetchone()[0]
+
+    def siguiente(self, cantidad: int = 1) -> int:
+        return self.bd.conexion().execute(
+            "UPDATE contadores SET valor = valor + ? WHERE nombre = ? RETURNING valor - ?",
+            (cantidad, self.nombre, cantidad)).fetchall()[0][0]
+
+    def ajustar(self, minimo: int):
+        self.bd.conexion().execute(
+            "UPDATE contadores SET valor = MAX(valor, ?) WHERE nombre = ?", (minimo, self.nombre))
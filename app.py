@@ -1,15 +1,287 @@
-from flask import Flask, request
+import io
+import json
+import math
+import os
+import sys
+import time
+from functools import wraps
+from itertools import islice, takewhile
+
+from flask import Flask, Response, g, request, stream_with_context
 from productos import Producto, ProductosTreeBST # Árbol de productos
-from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido # Lista enlazada de pedidos
+from lista_enlazada_pedidos import LineasPedido, ListaPedidos, Pedido # Lista enlazada de pedidos
+from persistencia import Persistencia # Registro de operaciones y snapshots en disco
+from concurrencia import CerrojoLectorEscritor, ContadorAtomico # Acceso concurrente a los datos
+from almacenamiento import ContadorSQLite, PedidosSQLite, ProductosSQLite # Almacenamiento compartido entre procesos
+from cache import CacheRespuestas # Caché de respuestas ya serializadas
+from agregados import ingresos_productos, total_pedido # Totales e ingresos (unión con los precios)
+from archivo import ArchivoPedidos # Archivo en disco de los pedidos antiguos
+import catalogo # Carga inicial del catálogo de productos desde un fichero
+import ingesta # Lectura rápida de los body JSON (orjson opcional) y de las líneas de pedido
+import idempotencia # Respuestas guardadas por "Idempotency-Key" (reintentos de POST/PUT/PATCH)
+import metricas as modulo_metricas # Métricas en formato Prometheus y perfilador de peticiones lentas
+import cambios as modulo_cambios # Registro de cambios de los pedidos y los productos (GET /cambios)
 
 app = Flask(__name__)
+app.json = ingesta.ProveedorJSONRapido(app)
+
+# Tamaño máximo del body de las peticiones (GESTION_PEDIDOS_MAX_BODY_BYTES, por defecto 64 MiB;
+# 0 lo desactiva). Las peticiones más grandes se rechazan con 413 antes de leer el body.
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("GESTION_PEDIDOS_MAX_BODY_BYTES", 64 * 1024 * 1024)) or None
+
+# Almacenamiento compartido (opcional): si se indica la variable de entorno GESTION_PEDIDOS_SQLITE,
+# los productos y pedidos se guardan en esa base de datos SQLite, que pueden compartir varios
+# procesos (por ejemplo, varios workers de gunicorn). Si no, se guardan en memoria.
+ruta_sqlite = os.environ.get("GESTION_PEDIDOS_SQLITE")
+
+if ruta_sqlite is None:
+    # Se crean las variables para almacenar un árbol de productos y un listado de pedidos
+    arbol_productos = ProductosTreeBST()
+    lista_pedidos = ListaPedidos()
+
+    # Persistencia en disco (opcional): si se indica la variable de entorno GESTION_PEDIDOS_DATOS,
+    # los datos se guardan en ese directorio y se recuperan al arrancar.
+    persistencia = Persistencia(directorio=os.environ.get("GESTION_PEDIDOS_DATOS"),
+                                arbol=arbol_productos,
+                                lista=lista_pedidos,
+                                operaciones_por_snapshot=int(os.environ.get("GESTION_PEDIDOS_SNAPSHOT", 10_000)),
+                                sincronizar=os.environ.get("GESTION_PEDIDOS_FSYNC") == "1")
+
+    siguiente_id_producto, siguiente_id_pedido = persistencia.cargar()
+
+    # Archivo de pedidos antiguos (opcional): si se indica la variable de entorno GESTION_PEDIDOS_ARCHIVO
+    # con un directorio, los pedidos más antiguos se pueden pasar a ese archivo comprimido en disco
+    # (POST /pedidos/archivar) y siguen pudiéndose consultar por su identificador. Con
+    # GESTION_PEDIDOS_ARCHIVO_VIVOS se archivan automáticamente cuando la lista supera ese número.
+    archivo_pedidos = None
+    if os.environ.get("GESTION_PEDIDOS_ARCHIVO"):
+        archivo_pedidos = ArchivoPedidos(os.environ["GESTION_PEDIDOS_ARCHIVO"],
+                                         bloques_en_cache=int(os.environ.get("GESTION_PEDIDOS_ARCHIVO_BLOQUES", 64)))
+        archivados = archivo_pedidos.cargar()
+        lista_pedidos.agregados.sumar_resumen(archivados.unidades_productos, archivados.clientes)
+        # Si el proceso se detuvo después de archivar unos pedidos pero antes de guardar
+        # la snapshot, esos pedidos siguen en la snapshot o en el registro: se quitan
+        # de la lista (sus unidades ya se han sumado con las del archivo).
+        for pedido in lista_pedidos.extraer_antiguos(archivo_pedidos.ultimo_id):
+            lista_pedidos.agregados.restar(pedido)
+        siguiente_id_pedido = max(siguiente_id_pedido, archivo_pedidos.ultimo_id + 1)
+    maximo_pedidos_vivos = (int(os.environ["GESTION_PEDIDOS_ARCHIVO_VIVOS"])
+                            if archivo_pedidos is not None and "GESTION_PEDIDOS_ARCHIVO_VIVOS" in os.environ else None)
+
+    # Los identificadores se reparten con contadores atómicos, para que dos peticiones
+    # simultáneas nunca obtengan el mismo identificador.
+    contador_productos = ContadorAtomico(siguiente_id_producto)
+    contador_pedidos = ContadorAtomico(siguiente_id_pedido)
+else:
+    arbol_productos = ProductosSQLite(ruta_sqlite)
+    lista_pedidos = PedidosSQLite(ruta_sqlite)
+    # SQLite ya guarda los datos en disco, no hace falta el registro de operaciones
+    persistencia = Persistencia(directorio=None, arbol=arbol_productos, lista=lista_pedidos)
+
+    # Los contadores se guardan en la propia base de datos para que todos los procesos
+    # repartan identificadores del mismo rango.
+    contador_productos = ContadorSQLite(ruta_sqlite, "productos")
+    contador_pedidos = ContadorSQLite(ruta_sqlite, "pedidos")
+    archivo_pedidos = None # El archivo solo se usa con la lista en memoria
+    maximo_pedidos_vivos = None
+
+# Catálogo inicial (opcional): si se indica GESTION_PEDIDOS_CATALOGO con un fichero de productos
+# (CSV o binario, ver "catalogo.py") y todavía no hay ningún producto, se cargan todos de una vez
+# antes de empezar a atender peticiones (GESTION_PEDIDOS_CATALOGO_PROCESOS: procesos que leen el
+# fichero, por defecto uno por núcleo). Con la persistencia activa se guarda una snapshot, así que
+# en los siguientes arranques los productos ya están cargados. GESTION_PEDIDOS_CATALOGO_CONGELAR=1
+# (lo activa "servidor.py") congela los objetos cargados con gc.freeze.
+if os.environ.get("GESTION_PEDIDOS_CATALOGO") and len(arbol_productos) == 0:
+    catalogo.sembrar(arbol_productos, contador_productos, os.environ["GESTION_PEDIDOS_CATALOGO"],
+                     procesos=int(os.environ.get("GESTION_PEDIDOS_CATALOGO_PROCESOS", 0)) or None,
+                     congelar=os.environ.get("GESTION_PEDIDOS_CATALOGO_CONGELAR") == "1")
+    persistencia.siguiente_id_producto = contador_productos.valor
+    persistencia.guardar_snapshot()
+
+PEDIDOS_POR_SEGMENTO = 10_000 # Mínimo de pedidos que se archivan automáticamente de una vez
+
+# Cerrojo lector-escritor que protege el árbol de productos y la lista de pedidos:
+# las consultas (GET) se ejecutan en paralelo y las modificaciones de una en una
+# (entre procesos distintos, con SQLite, es la propia base de datos la que se encarga).
+# Los identificadores se reservan con el cerrojo de escritura, para que el orden de
+# la lista de pedidos coincida siempre con el orden de sus identificadores.
+cerrojo_datos = CerrojoLectorEscritor()
+
+# Caché de las respuestas de los GET (body JSON ya codificado + ETag). Su tamaño máximo en bytes
+# se indica con GESTION_PEDIDOS_CACHE_BYTES (0 la desactiva). Con SQLite otros procesos pueden
+# modificar los datos sin que este proceso se entere, así que la caché se desactiva.
+cache = CacheRespuestas(max_bytes=0 if ruta_sqlite is not None
+                        else int(os.environ.get("GESTION_PEDIDOS_CACHE_BYTES", 64 * 1024 * 1024)))
+
+# Registro de cambios (GET /cambios): guarda en memoria los últimos GESTION_PEDIDOS_CAMBIOS cambios
+# (por defecto 10.000; 0 lo desactiva). Se instala después de cargar los datos, para que la
+# recuperación del disco y el catálogo inicial no generen cambios. Con SQLite solo incluye los
+# cambios hechos por este proceso.
+registro_cambios = modulo_cambios.RegistroCambios(capacidad=int(os.environ.get("GESTION_PEDIDOS_CAMBIOS", 10_000)))
+if registro_cambios.activa:
+    modulo_cambios.instrumentar_productos(arbol_productos, registro_cambios)
+    modulo_cambios.instrumentar_pedidos(lista_pedidos, registro_cambios)
+
+# Métricas (GET /metrics). Con GESTION_PEDIDOS_METRICAS=0 no se instala ninguna medición.
+# Si se indica GESTION_PEDIDOS_PERFILADOR con un directorio, las pilas de las peticiones que
+# tardan más de GESTION_PEDIDOS_PERFILADOR_MS milisegundos (por defecto 100) se guardan ahí.
+metricas = modulo_metricas.Metricas()
+if os.environ.get("GESTION_PEDIDOS_METRICAS", "1") != "0":
+    modulo_metricas.instrumentar_productos(arbol_productos, metricas)
+    modulo_metricas.instrumentar_pedidos(lista_pedidos, metricas)
+    modulo_metricas.instrumentar_to_dict(Producto, metricas)
+    modulo_metricas.instrumentar_to_dict(Pedido, metricas)
+    perfilador = None
+    if os.environ.get("GESTION_PEDIDOS_PERFILADOR"):
+        perfilador = modulo_metricas.PerfiladorMuestreo(
+            os.environ["GESTION_PEDIDOS_PERFILADOR"],
+            umbral=float(os.environ.get("GESTION_PEDIDOS_PERFILADOR_MS", 100)) / 1000)
+    modulo_metricas.instalar(app, metricas, perfilador)
+
 
-# Se crean las variables para almacenar un árbol de productos y un listado de pedidos
-arbol_productos = ProductosTreeBST()
-lista_pedidos = ListaPedidos()
+# Devuelve la respuesta de un GET usando la caché. "construir" genera la respuesta
+# (diccionario, código) si no está guardada; solo se guardan las respuestas 200.
+# Si el cliente envía "If-None-Match" con el ETag actual, se responde 304 sin body.
+# Se debe llamar con el cerrojo de lectura adquirido, para que ninguna escritura
+# pueda invalidar la entrada mientras se genera y se guarda.
+def _respuesta_cacheada(clave, construir):
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        cuerpo, codigo = construir()
+        if codigo != 200:
+            return cuerpo, codigo
+        # Se codifica igual que las respuestas que no pasan por la caché (mismos separadores
+        # y orden de las claves), para que el body no dependa de si estaba guardado
+        entrada = cache.guardar(clave, app.json.response(cuerpo).get_data())
 
-siguiente_id_producto = 1
-siguiente_id_pedido = 1
+    etag = f'"{entrada.etag}"'
+    if request.if_none_match.contains_weak(entrada.etag):
+        return Response(status=304, headers={"ETag": etag})
+    return Response(entrada.cuerpo, status=200, mimetype="application/json", headers={"ETag": etag})
+
+# Respuestas de los POST/PUT/PATCH guardadas por "Idempotency-Key", para que los reintentos
+# no repitan la operación. GESTION_PEDIDOS_IDEMPOTENCIA_BYTES indica el tamaño máximo en bytes
+# (0 la desactiva) y GESTION_PEDIDOS_IDEMPOTENCIA_SEGUNDOS cuánto tiempo se guarda cada respuesta.
+# Las claves se guardan en la memoria de cada proceso (con varios workers, cada uno tiene las suyas).
+cache_idempotencia = idempotencia.CacheIdempotencia(
+    max_bytes=int(os.environ.get("GESTION_PEDIDOS_IDEMPOTENCIA_BYTES", 16 * 1024 * 1024)),
+    duracion=float(os.environ.get("GESTION_PEDIDOS_IDEMPOTENCIA_SEGUNDOS", 24 * 3600)))
+
+
+# Decorador para las vistas que modifican datos. Si la petición trae la cabecera
+# "Idempotency-Key" y ya hay una respuesta guardada con esa clave para la misma
+# petición, se devuelve esa respuesta (con la cabecera "Idempotent-Replayed: true")
+# sin volver a ejecutar la vista.
+#
+# La huella de la petición se calcula con el body completo. Los body NDJSON no se
+# leen aquí (se procesan por partes, sin guardarlos enteros en memoria): la vista
+# calcula la huella mientras lee el stream (idempotencia.LectorConHuella) y llama a
+# "_empezar_idempotente" antes de modificar nada (ver POST /productos/bulk).
+def _idempotente(vista):
+    @wraps(vista)
+    def envoltorio(*args, **kwargs):
+        clave = request.headers.get("Idempotency-Key")
+        if clave is None or not cache_idempotencia.activa:
+            return vista(*args, **kwargs)
+
+        if request.mimetype == "application/x-ndjson":
+            g.clave_idempotencia = clave
+        else:
+            cuerpo = request.get_data()
+            # Sin "Content-Length" (body "chunked") get_data se detiene en el tamaño máximo
+            # sin avisar: si todavía queda algo por leer, la lectura lanza el error 413
+            request.stream.read(1)
+            rechazo = _empezar_idempotente(clave, idempotencia.huella(request.method, request.full_path, cuerpo))
+            if rechazo is not None:
+                return rechazo
+
+        try:
+            respuesta = app.make_response(vista(*args, **kwargs))
+        except BaseException:
+            if g.get("idempotencia_empezada"):
+                cache_idempotencia.cancelar(clave)
+            raise
+        # Si la vista ha respondido sin llegar a reservar la clave (un rechazo de
+        # "_empezar_idempotente"), la respuesta no se guarda
+        if not g.get("idempotencia_empezada"):
+            return respuesta
+        if respuesta.status_code >= 500 or respuesta.is_streamed:
+            cache_idempotencia.cancelar(clave)
+        else:
+            cache_idempotencia.guardar(clave, respuesta.status_code, respuesta.mimetype, respuesta.get_data())
+        return respuesta
+    return envoltorio
+
+
+# Reserva la "Idempotency-Key" para la petición con esa huella. Devuelve None si la
+# petición se debe ejecutar, o la respuesta que hay que devolver sin ejecutarla.
+def _empezar_idempotente(clave: str, huella: bytes):
+    estado, guardada = cache_idempotencia.empezar(clave, huella)
+    if estado == idempotencia.REPETIDA:
+        return Response(guardada.cuerpo, status=guardada.codigo, mimetype=guardada.mimetype,
+                        headers={"Idempotent-Replayed": "true"})
+    if estado == idempotencia.EN_CURSO:
+        return {
+            "message": "ERROR: Ya se está procesando una petición con esa 'Idempotency-Key'."
+        }, 409
+    if estado == idempotencia.DISTINTA:
+        return {
+            "message": "ERROR: La 'Idempotency-Key' ya se ha usado con una petición distinta."
+        }, 422
+    g.idempotencia_empezada = True
+    return None
+
+# Body más grande que MAX_CONTENT_LENGTH (GESTION_PEDIDOS_MAX_BODY_BYTES)
+@app.errorhandler(413)
+def cuerpo_demasiado_grande(error):
+    return {
+        "message": "ERROR: El body de la petición es demasiado grande."
+    }, 413
+
+
+# Busca un pedido en la lista y, si no está, en el archivo de pedidos antiguos
+def _buscar_pedido(id_pedido) -> Pedido | None:
+    pedido = lista_pedidos.buscar_pedido(id_pedido)
+    if pedido is None and archivo_pedidos is not None:
+        pedido = archivo_pedidos.buscar(id_pedido)
+    return pedido
+
+
+# Respuesta para las modificaciones de un pedido que no está en la lista: si está
+# archivado no se puede modificar (409); si no, no existe (None).
+def _respuesta_archivado(id_pedido):
+    if archivo_pedidos is not None and archivo_pedidos.buscar(id_pedido) is not None:
+        return {
+            "message": f"ERROR: El pedido '{id_pedido}' está archivado y no se puede modificar."
+        }, 409
+    return None
+
+
+# Pasa al archivo los pedidos de la lista con identificador menor o igual que "hasta_id".
+# Primero se escribe el segmento del archivo y después se quitan de la lista y se guarda
+# una snapshot (si el proceso se detiene entre medias, se quitan al arrancar).
+# Se debe llamar con el cerrojo de escritura adquirido. Devuelve cuántos se han archivado.
+def _archivar_pedidos(hasta_id: int) -> int:
+    pedidos = list(takewhile(lambda pedido: pedido.id <= hasta_id, lista_pedidos.iterar_pedidos()))
+    if not pedidos:
+        return 0
+    archivo_pedidos.archivar(pedidos)
+    lista_pedidos.extraer_antiguos(hasta_id)
+    persistencia.guardar_snapshot()
+    cache.nueva_generacion("pedidos")
+    return len(pedidos)
+
+
+# Archivado automático (GESTION_PEDIDOS_ARCHIVO_VIVOS): cuando la lista tiene al menos
+# PEDIDOS_POR_SEGMENTO pedidos de más, se archivan los más antiguos de una vez (así cada
+# segmento del archivo tiene varios bloques). Se debe llamar con el cerrojo de escritura adquirido.
+def _archivar_si_hace_falta():
+    if maximo_pedidos_vivos is None:
+        return
+    sobrantes = len(lista_pedidos) - maximo_pedidos_vivos
+    if sobrantes >= PEDIDOS_POR_SEGMENTO:
+        ultimo = next(islice(lista_pedidos.iterar_pedidos(), sobrantes - 1, None))
+        _archivar_pedidos(ultimo.id)
 
 @app.route('/') # Vamos a crear un endpoint raíz.
 def home(): # Cada vez que alguien llame a este endpoint muestre el mensaje "Hello word"
@@ -30,8 +302,8 @@ def home(): # Cada vez que alguien llame a este endpoint muestre el mensaje "Hel
 #   "precio": 13
 # }
 @app.route('/productos', methods=['POST'])
+@_idempotente
 def post_producto():
-    global siguiente_id_producto 
     # Se obtiene los datos del JSON.
     data = request.get_json()
 
@@ -43,16 +315,17 @@ def post_producto():
             "message": "ERROR: Los campos 'nombre_producto' y 'precio_producto' son obligatorios."
         }, 400
     
-    # Se crea un producto 
-    producto = Producto(producto_id=siguiente_id_producto, 
-                        nombre_producto=nombre_producto, 
-                        precio_producto=precio_producto)
-    
-    # Se inserta el producto en el árbol de productos.
-    arbol_productos.insertar(producto)
-    # Se incrementa el identificador del producto para que se pueda 
-    # usar el identificador correcto cuando se añada un nuevo producto
-    siguiente_id_producto += 1
+    with cerrojo_datos.escritura():
+        # Se crea un producto con el siguiente identificador disponible
+        producto = Producto(producto_id=contador_productos.siguiente(), 
+                            nombre_producto=nombre_producto, 
+                            precio_producto=precio_producto)
+        
+        # Se anota en el registro y después se inserta el producto en el árbol de productos.
+        persistencia.registrar_producto(producto)
+        arbol_productos.insertar(producto)
+        cache.invalidar(("producto", producto.id))
+        cache.nueva_generacion("productos")
 
     return {
         "message": f"Se ha añadido el producto correctamente",
@@ -60,6 +333,115 @@ def post_producto():
     }, 201
 
 
+# A.2) Crear productos en bloque.
+
+# Método POST --> añadir muchos productos al árbol de productos en una sola petición
+# Estructura:
+# POST /productos/bulk
+# Body JSON (array):
+# [
+#   {"nombre": "Falda", "precio": 13},
+#   {"nombre": "Vestido", "precio": 12.25}
+# ]
+# o bien Body NDJSON (cabecera "Content-Type: application/x-ndjson"), un producto por línea:
+# {"nombre": "Falda", "precio": 13}
+# {"nombre": "Vestido", "precio": 12.25}
+#
+# Las filas con errores se indican en "errores" (con su número de fila) y no impiden
+# que se creen el resto de productos. A los productos válidos se les asigna un rango
+# contiguo de identificadores y el árbol se construye de una sola vez.
+@app.route('/productos/bulk', methods=['POST'])
+@_idempotente
+def post_productos_bulk():
+    # Se obtienen las filas del body (array JSON o NDJSON)
+    lector_huella = None
+    if request.mimetype == "application/x-ndjson":
+        # El stream se procesa por líneas sin guardarlo entero en memoria: no se le aplica
+        # el tamaño máximo del body (con None se usaría el de la configuración)
+        request.max_content_length = sys.maxsize
+        stream = request.stream
+        if g.get("clave_idempotencia") is not None:
+            # Con "Idempotency-Key" la huella del body se calcula mientras se lee
+            stream = lector_huella = idempotencia.LectorConHuella(request.method, request.full_path, stream)
+        # Se envuelve el stream en un buffer para leer las líneas por bloques
+        filas = _leer_filas_ndjson(io.BufferedReader(stream, buffer_size=1 << 16))
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return {
+                "message": "ERROR: El body debe ser un array JSON de productos o un stream NDJSON."
+            }, 400
+        filas = enumerate(data, start=1)
+
+    # Se validan todas las filas en una única pasada
+    productos = []
+    errores = []
+    for numero_fila, fila in filas:
+        if not isinstance(fila, dict):
+            errores.append({"fila": numero_fila,
+                            "message": "ERROR: La fila no es un objeto JSON válido."})
+            continue
+
+        nombre_producto = fila.get("nombre")
+        precio_producto = fila.get("precio")
+        if nombre_producto is None or precio_producto is None:
+            errores.append({"fila": numero_fila,
+                            "message": "ERROR: Los campos 'nombre_producto' y 'precio_producto' son obligatorios."})
+            continue
+
+        # El identificador definitivo se asigna al reservar el rango de identificadores
+        productos.append(Producto(producto_id=None,
+                                  nombre_producto=nombre_producto,
+                                  precio_producto=precio_producto))
+
+    # Ya se ha leído todo el body: antes de crear nada se comprueba la "Idempotency-Key"
+    if lector_huella is not None:
+        rechazo = _empezar_idempotente(g.clave_idempotencia, lector_huella.huella())
+        if rechazo is not None:
+            return rechazo
+
+    if not productos:
+        return {
+            "message": "ERROR: No se ha podido crear ningún producto.",
+            "errores": errores
+        }, 400
+
+    with cerrojo_datos.escritura():
+        # Se reserva un rango contiguo de identificadores para todo el lote
+        primer_id = contador_productos.siguiente(len(productos))
+        for posicion, producto in enumerate(productos):
+            producto.id = primer_id + posicion
+
+        # Se insertan todos los productos a la vez (los identificadores ya están ordenados)
+        persistencia.registrar_productos(productos)
+        arbol_productos.insertar_lote(productos)
+        for producto in productos:
+            cache.invalidar(("producto", producto.id))
+        cache.nueva_generacion("productos")
+
+    return {
+        "message": f"Se han añadido {len(productos)} productos correctamente",
+        "creados": len(productos),
+        "primer_id": productos[0].id,
+        "ultimo_id": productos[-1].id,
+        "errores": errores
+    }, 201
+
+
+# Recorre un stream NDJSON devolviendo (número de fila, objeto). Las líneas que
+# no son JSON válido se devuelven como None para que se informe del error.
+def _leer_filas_ndjson(stream):
+    numero_fila = 0
+    for linea in stream:
+        if not linea.strip():
+            continue
+        numero_fila += 1
+        try:
+            yield numero_fila, ingesta.leer_json(linea)
+        except ValueError:
+            yield numero_fila, None
+
+
 # B) Consultar información de producto por ID.
 
 # Método GET  --> visualizar un producto al árbol de productos
@@ -69,17 +451,111 @@ def post_producto():
 @app.route('/productos/<int:id_producto>/', methods=['GET'])
 def get_producto(id_producto):
 
-    # Se busca el identificador del producto en el árbol de productos existentes.
-    producto = arbol_productos.buscar(id_producto)
-    if producto is None:
-        return{
-            "message": f"El producto '{id_producto}' no se ha encontrado"
-        }, 404
-    else:
-        return{
-            "message": f"El producto '{id_producto}' se ha encontrado",
-            "producto": producto.to_dict()
-        }, 200
+    def construir():
+        # Se busca el identificador del producto en el árbol de productos existentes.
+        producto = arbol_productos.buscar(id_producto)
+        if producto is None:
+            return{
+                "message": f"El producto '{id_producto}' no se ha encontrado"
+            }, 404
+        else:
+            return{
+                "message": f"El producto '{id_producto}' se ha encontrado",
+                "producto": producto.to_dict()
+            }, 200
+
+    with cerrojo_datos.lectura():
+        return _respuesta_cacheada(("producto", id_producto), construir)
+
+# B.2) Listar productos (por rango de identificadores y/o de precios).
+
+# Método GET  --> obtener los productos existentes
+# Estructura:
+# GET /productos
+# GET /productos?desde=<id_producto>&hasta=<id_producto>          (rango de identificadores)
+# GET /productos?precio_min=<precio>&precio_max=<precio>          (rango de precios)
+# GET /productos?limit=<numero_productos>&after=<id_producto>     (paginación por cursor)
+# Body JSON: Vacío.
+#
+# - Sin filtro de precio, los productos se devuelven ordenados por identificador.
+# - Con filtro de precio, se devuelven ordenados por precio (usando el índice de precios)
+#   y el rango de identificadores se aplica además como filtro.
+# - En la respuesta, "siguiente" indica el cursor ("after") para pedir la siguiente página.
+@app.route('/productos', methods=['GET'])
+def get_productos():
+    # Se comprueba que los parámetros sean números válidos
+    try:
+        desde = _parametro_numerico("desde", int)
+        hasta = _parametro_numerico("hasta", int)
+        precio_min = _parametro_numerico("precio_min", float)
+        precio_max = _parametro_numerico("precio_max", float)
+        limite = _parametro_numerico("limit", int)
+        cursor = _parametro_numerico("after", int)
+    except ValueError as error:
+        return {
+            "message": f"ERROR: {error}"
+        }, 400
+    if limite is not None and limite < 1:
+        return {
+            "message": "ERROR: El parámetro 'limit' debe ser mayor que 0."
+        }, 400
+
+    def construir():
+        nonlocal desde
+        if precio_min is None and precio_max is None:
+            # El cursor indica el último identificador recibido
+            if cursor is not None:
+                desde = cursor + 1 if desde is None else max(desde, cursor + 1)
+            productos = arbol_productos.iterar_rango(desde=desde, hasta=hasta)
+        else:
+            productos = arbol_productos.iterar_por_precio(precio_min=precio_min,
+                                                          precio_max=precio_max,
+                                                          despues_de=cursor)
+            if desde is not None or hasta is not None:
+                productos = (producto for producto in productos
+                             if (desde is None or producto.id >= desde) and (hasta is None or producto.id <= hasta))
+
+        if limite is None:
+            listado_productos = [producto.to_dict() for producto in productos]
+            siguiente = None
+        else:
+            # Se pide un producto más de los necesarios para saber si hay otra página.
+            listado_productos = [producto.to_dict() for producto in islice(productos, limite + 1)]
+            siguiente = None
+            if len(listado_productos) > limite:
+                listado_productos = listado_productos[:limite]
+                siguiente = listado_productos[-1]["id"]
+
+        if not listado_productos:
+            return {
+                "message": "No hay ningún producto que cumpla los criterios de búsqueda."
+            }, 200
+        else:
+            return {
+                "message": "Se ha encontrado una lista de productos.",
+                "listado_productos": listado_productos,
+                "siguiente": siguiente
+            }, 200
+
+    # Cada página del listado se guarda en la caché según sus parámetros
+    with cerrojo_datos.lectura():
+        clave = ("productos", cache.generacion("productos"), request.query_string)
+        return _respuesta_cacheada(clave, construir)
+
+
+# Lee un parámetro opcional de la URL y lo convierte al tipo indicado (None si no se ha enviado)
+def _parametro_numerico(nombre: str, tipo):
+    valor = request.args.get(nombre)
+    if valor is None:
+        return None
+    try:
+        numero = tipo(valor)
+    except ValueError:
+        raise ValueError(f"El parámetro '{nombre}' debe ser un número.") from None
+    # float() acepta "nan" e "inf", que no sirven como límite (NaN no se puede comparar)
+    if not math.isfinite(numero):
+        raise ValueError(f"El parámetro '{nombre}' debe ser un número finito.")
+    return numero
 # ---------------------------------------------------------- END POINT PRODUCTOS  ----------------------------------------------------------
 
 
@@ -99,10 +575,14 @@ def get_producto(id_producto):
 #    ]
 # }
 @app.route('/pedidos', methods=['POST'])
+@_idempotente
 def post_pedido():
-    global siguiente_id_pedido 
     # Se obtiene los datos del JSON.
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {
+            "message": "ERROR: El body debe ser un objeto JSON."
+        }, 400
 
     nombre_cliente = data.get("nombre_cliente")
     lista_pedidos_json = data.get("lista_pedidos", [])
@@ -112,41 +592,33 @@ def post_pedido():
         return {
             "message": "ERROR: Los campos 'nombre_cliente' y 'lista_pedidos' son obligatorios."
         }, 400
-    
-    res_lista_pedidos = []
-    # Se recorre la lista de pedidos para añadirlo a una "Lista[LíneaPedido]"
-    for linea in lista_pedidos_json:
-         # {"id_producto": 4, "cantidad": 20},
-        id_producto = linea.get("id_producto")
-        cantidad_producto = linea.get("cantidad")
 
-        # Se comprueba que se hayan obtenido los datos correctos en la línea de pedidos
-        if id_producto is None or cantidad_producto is None:
-            return {
-                "message": "ERROR: Los campos 'id_producto' y 'cantidad_producto' "
-                            " son obligatorios en la línea de pedidos."
-            }, 400
-        # Se busca si el identificador del producto existe en el árbol de los productos
-        producto = arbol_productos.buscar(producto_id=id_producto)
-        if producto is None:
-            return {
-                "message": f"ERROR: El producto '{id_producto}' no ha sido encontrado en los productos existentes "
-            }, 404
+    # Se validan las líneas y se empaquetan directamente en el array compacto del pedido
+    try:
+        res_lista_pedidos, ids_productos = ingesta.empaquetar_lineas(lista_pedidos_json)
+    except ingesta.LineasInvalidas as error:
+        return {"message": str(error)}, 400
+
+    # Se buscan todos los productos del pedido en un único recorrido del árbol
+    with cerrojo_datos.lectura():
+        productos = arbol_productos.buscar_varios(ids_productos)
+    if len(productos) < len(ids_productos):
+        id_producto = next(producto_id for producto_id in res_lista_pedidos[::2] if producto_id not in productos)
+        return {
+            "message": f"ERROR: El producto '{id_producto}' no ha sido encontrado en los productos existentes "
+        }, 404
+
+    with cerrojo_datos.escritura():
+        # Se crea el pedido con el siguiente identificador disponible.
+        pedido = Pedido(pedido_id = contador_pedidos.siguiente(),
+                        nombre_cliente = nombre_cliente,
+                        lista_pedidos = LineasPedido(res_lista_pedidos))
         
-        # Se crea la lista con todas las líneas de pedidos.
-        linea_pedido = LineaPedido(producto_id= id_producto, cantidad= cantidad_producto)
-        res_lista_pedidos.append(linea_pedido)
-
-    # Se crea el pedido.
-    pedido = Pedido(pedido_id = siguiente_id_pedido,
-                    nombre_cliente = nombre_cliente,
-                    lista_pedidos = res_lista_pedidos)
-    
-    # Se añade el pedido a la lista de pedidos existentes.
-    lista_pedidos.agregar_pedido(pedido)
-    # Se incrementa el identificador del pedido para que se pueda 
-    # usar el identificador correcto cuando se añada un nuevo pedido
-    siguiente_id_pedido += 1
+        # Se anota en el registro y después se añade el pedido a la lista de pedidos existentes.
+        persistencia.registrar_pedido(pedido)
+        lista_pedidos.agregar_pedido(pedido)
+        cache.nueva_generacion("pedidos")
+        _archivar_si_hace_falta()
 
     return {
         "message": f"Se ha añadido el pedido correctamente",
@@ -156,6 +628,93 @@ def post_pedido():
 
 
 
+# C.2) Crear muchos pedidos en una sola petición.
+
+# Método POST --> añadir varios pedidos
+# Estructura:
+# POST /pedidos/batch
+# Body JSON: (ejemplo)
+# [
+#   {"nombre_cliente": "Pepe", "lista_pedidos": [{"id_producto": 4, "cantidad": 20}]},
+#   {"nombre_cliente": "Laura", "lista_pedidos": [{"id_producto": 2, "cantidad": 8}]}
+# ]
+#
+# Los identificadores de producto de todo el lote se buscan una sola vez (sin
+# repetidos y en un único recorrido del árbol). Cada pedido se valida por separado:
+# en "resultados" se indica, para cada posición del lote, si se ha creado o el error.
+@app.route('/pedidos/batch', methods=['POST'])
+@_idempotente
+def post_pedidos_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        return {
+            "message": "ERROR: El body debe ser un array JSON de pedidos."
+        }, 400
+
+    # 1) Se validan los campos de todos los pedidos y se reúnen los identificadores de producto
+    resultados = [None] * len(data)
+    validos = [] # (posición en el lote, nombre_cliente, líneas ya empaquetadas)
+    ids_productos = set()
+    for posicion, pedido_json in enumerate(data):
+        if not isinstance(pedido_json, dict):
+            resultados[posicion] = {"status": 400,
+                                    "message": "ERROR: El pedido no es un objeto JSON válido."}
+            continue
+
+        nombre_cliente = pedido_json.get("nombre_cliente")
+        lista_pedidos_json = pedido_json.get("lista_pedidos", [])
+        if nombre_cliente is None or not lista_pedidos_json or not isinstance(lista_pedidos_json, list):
+            resultados[posicion] = {"status": 400,
+                                    "message": "ERROR: Los campos 'nombre_cliente' y 'lista_pedidos' son obligatorios."}
+            continue
+
+        try:
+            lineas, ids_pedido = ingesta.empaquetar_lineas(lista_pedidos_json)
+        except ingesta.LineasInvalidas as error:
+            resultados[posicion] = {"status": 400, "message": str(error)}
+            continue
+        ids_productos |= ids_pedido
+
+        validos.append((posicion, nombre_cliente, lineas))
+
+    # 2) Se resuelven todos los productos del lote en un único recorrido del árbol
+    with cerrojo_datos.lectura():
+        productos = arbol_productos.buscar_varios(ids_productos)
+
+    # 3) Se crean los pedidos cuyos productos existen
+    nuevos_pedidos = []
+    for posicion, nombre_cliente, lineas in validos:
+        no_encontrado = next((producto_id for producto_id in lineas[::2] if producto_id not in productos), None)
+        if no_encontrado is not None:
+            resultados[posicion] = {"status": 404,
+                                    "message": f"ERROR: El producto '{no_encontrado}' no ha sido encontrado en los productos existentes "}
+            continue
+
+        # El identificador definitivo se asigna al reservar el rango de identificadores
+        pedido = Pedido(pedido_id=None,
+                        nombre_cliente=nombre_cliente,
+                        lista_pedidos=LineasPedido(lineas))
+        nuevos_pedidos.append((posicion, pedido))
+
+    # 4) Se añaden todos los pedidos a la lista de una sola vez
+    with cerrojo_datos.escritura():
+        primer_id = contador_pedidos.siguiente(len(nuevos_pedidos))
+        for desplazamiento, (posicion, pedido) in enumerate(nuevos_pedidos):
+            pedido.id = primer_id + desplazamiento
+            resultados[posicion] = {"status": 201, "pedido": pedido.to_dict()}
+        nuevos_pedidos = [pedido for _, pedido in nuevos_pedidos]
+        persistencia.registrar_pedidos(nuevos_pedidos)
+        lista_pedidos.agregar_pedidos(nuevos_pedidos)
+        cache.nueva_generacion("pedidos")
+        _archivar_si_hace_falta()
+
+    return {
+        "message": f"Se han añadido {len(nuevos_pedidos)} de {len(data)} pedidos correctamente",
+        "creados": len(nuevos_pedidos),
+        "resultados": resultados
+    }, 201 if nuevos_pedidos else 400
+
+
 # D) Consultar información de pedido por ID.
 
 # Método GET  --> visualizar un pedido 
@@ -165,17 +724,44 @@ def post_pedido():
 
 @app.route('/pedidos/<int:id_pedido>/', methods=['GET'])
 def get_pedido(id_pedido):
-    # Se busca el identificador del pedido en la lista de pedidos existentes.
-    pedido = lista_pedidos.buscar_pedido(id_pedido)
-    if pedido is None:
-        return{
-            "message": f"El pedido '{id_pedido}' no se ha encontrado"
-        }, 404
-    else:
-        return{
-            "message": f"El pedido '{id_pedido}' se ha encontrado",
-            "pedido": pedido.to_dict()
-        }, 200
+    def construir():
+        # Se busca el identificador del pedido en la lista de pedidos existentes (o en el archivo).
+        pedido = _buscar_pedido(id_pedido)
+        if pedido is None:
+            return{
+                "message": f"El pedido '{id_pedido}' no se ha encontrado"
+            }, 404
+        else:
+            return{
+                "message": f"El pedido '{id_pedido}' se ha encontrado",
+                "pedido": pedido.to_dict()
+            }, 200
+
+    with cerrojo_datos.lectura():
+        return _respuesta_cacheada(("pedido", id_pedido), construir)
+
+# D.2) Consultar el total de un pedido.
+
+# Método GET  --> cada línea del pedido con el precio actual del producto y su subtotal,
+#                 y el total del pedido (la unión con los productos se hace en el servidor)
+# Estructura:
+# GET /pedidos/<id_pedido>/total
+# Body JSON: Vacío.
+@app.route('/pedidos/<int:id_pedido>/total', methods=['GET'])
+def get_total_pedido(id_pedido):
+    with cerrojo_datos.lectura():
+        pedido = _buscar_pedido(id_pedido)
+        if pedido is None:
+            return{
+                "message": f"El pedido '{id_pedido}' no se ha encontrado"
+            }, 404
+        productos = arbol_productos.buscar_varios(
+            [producto_id for producto_id, _ in pedido.lista_pedidos.pares() if type(producto_id) is int])
+        total = total_pedido(pedido, productos)
+    return{
+        "message": f"Se ha calculado el total del pedido '{id_pedido}'",
+        "pedido": total
+    }, 200
 
 # E) Actualizar un pedido existente
 
@@ -190,10 +776,15 @@ def get_pedido(id_pedido):
 #    }
 # }
 @app.route('/pedidos/<int:id_pedido>/', methods=['PUT'])
+@_idempotente
 def put_pedido(id_pedido):
 
     # Se obtiene los datos del JSON.
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {
+            "message": "ERROR: El body debe ser un objeto JSON."
+        }, 400
 
     nombre_cliente = data.get("nombre_cliente")
     lista_pedidos_json = data.get("lista_pedidos", [])
@@ -203,45 +794,126 @@ def put_pedido(id_pedido):
         return {
             "message": "ERROR: Los campos 'nombre_cliente' y 'lista_pedidos' son obligatorios."
         }, 400
-    
-    res_lista_pedidos = []
 
-    for linea in lista_pedidos_json:
-        id_producto = linea.get("id_producto")
-        cantidad_producto = linea.get("cantidad")
+    try:
+        res_lista_pedidos, ids_productos = ingesta.empaquetar_lineas(lista_pedidos_json)
+    except ingesta.LineasInvalidas as error:
+        return {"message": str(error)}, 400
 
-        if id_producto is None or cantidad_producto is None:
-            return {
-                "message": "ERROR: Los campos 'id_producto' y 'cantidad' "
-                           "son obligatorios en cada línea de pedido."
-            }, 400
-        
-        producto = arbol_productos.buscar(id_producto)
-        if producto is None:
-            return {
-                "message": f"ERROR: El producto '{id_producto}' no ha sido encontrado en los productos existentes."
-            }, 400
-        
-        linea_pedido = LineaPedido(producto_id=id_producto, cantidad=cantidad_producto)
-        res_lista_pedidos.append(linea_pedido)
+    with cerrojo_datos.lectura():
+        productos = arbol_productos.buscar_varios(ids_productos)
+    if len(productos) < len(ids_productos):
+        id_producto = next(producto_id for producto_id in res_lista_pedidos[::2] if producto_id not in productos)
+        return {
+            "message": f"ERROR: El producto '{id_producto}' no ha sido encontrado en los productos existentes."
+        }, 400
 
     act_pedido = Pedido(pedido_id=id_pedido, 
                         nombre_cliente=nombre_cliente,
-                        lista_pedidos=res_lista_pedidos
+                        lista_pedidos=LineasPedido(res_lista_pedidos)
                         )
-    actualizado = lista_pedidos.actualizar_pedido(pedido_id=id_pedido, pedido=act_pedido)
+    with cerrojo_datos.escritura():
+        # Solo se anota en el registro si el pedido está en la lista (y antes de actualizarlo)
+        actualizado = lista_pedidos.buscar_pedido(id_pedido) is not None
+        if actualizado is True:
+            persistencia.registrar_actualizacion(act_pedido)
+            lista_pedidos.actualizar_pedido(pedido_id=id_pedido, pedido=act_pedido)
+            cache.invalidar(("pedido", id_pedido))
+            cache.nueva_generacion("pedidos")
+        # La respuesta se genera con el cerrojo adquirido: las líneas del pedido guardado se
+        # comparten con "act_pedido" y un PATCH posterior podría cambiarlas
+        respuesta = act_pedido.to_dict()
 
     if actualizado is True:
         return {
             "message": f"El pedido '{id_pedido}' ha sido actualizado correctamente.",
-            "pedido": act_pedido.to_dict()
+            "pedido": respuesta
         }, 200
     else:
-        return {
+        return _respuesta_archivado(id_pedido) or ({
             "message": f"El pedido '{id_pedido}' no se ha actualizado correctamente.",
-            "pedido": act_pedido.to_dict()
-        }, 404
+            "pedido": respuesta
+        }, 404)
     
+# E.2) Modificar algunas líneas de un pedido.
+
+# Método PATCH  --> añadir, cambiar o eliminar líneas sueltas de un pedido (y/o cambiar el cliente)
+# Estructura:
+# PATCH /pedidos/<id_pedido>
+# Body JSON: (ejemplo)
+# {
+#   "nombre_cliente": "Pepe",                    (opcional)
+#   "lista_pedidos": [
+#       {"id_producto": 4, "cantidad": 25},      --> cambia la cantidad (o añade la línea si no estaba)
+#       {"id_producto": 2, "cantidad": 0}        --> elimina la línea
+#    ]
+# }
+#
+# Solo se comprueba que existan los productos que se añaden o cambian. Las líneas
+# se modifican en el propio pedido, sin volver a enviar ni validar el resto.
+@app.route('/pedidos/<int:id_pedido>/', methods=['PATCH'])
+@_idempotente
+def patch_pedido(id_pedido):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {
+            "message": "ERROR: El body debe ser un objeto JSON."
+        }, 400
+
+    nombre_cliente = data.get("nombre_cliente")
+    lista_pedidos_json = data.get("lista_pedidos", [])
+    if not isinstance(lista_pedidos_json, list) or (nombre_cliente is None and not lista_pedidos_json):
+        return {
+            "message": "ERROR: Se debe indicar 'nombre_cliente' y/o las líneas a cambiar en 'lista_pedidos'."
+        }, 400
+
+    cambios = {} # producto_id --> nueva cantidad (0 para eliminar la línea)
+    for linea in lista_pedidos_json:
+        id_producto = linea.get("id_producto") if isinstance(linea, dict) else None
+        cantidad_producto = linea.get("cantidad") if isinstance(linea, dict) else None
+        if type(id_producto) is not int or cantidad_producto is None:
+            return {
+                "message": "ERROR: Los campos 'id_producto' (entero) y 'cantidad' "
+                           "son obligatorios en cada línea de pedido."
+            }, 400
+        cambios[id_producto] = cantidad_producto
+
+    with cerrojo_datos.escritura():
+        pedido = lista_pedidos.buscar_pedido(id_pedido)
+        if pedido is None:
+            return _respuesta_archivado(id_pedido) or ({
+                "message": f"El pedido '{id_pedido}' no se ha encontrado"
+            }, 404)
+
+        # Solo se buscan los productos que se añaden o cambian
+        productos = arbol_productos.buscar_varios([producto_id for producto_id, cantidad in cambios.items()
+                                                   if cantidad != 0])
+        no_encontrado = next((producto_id for producto_id, cantidad in cambios.items()
+                              if cantidad != 0 and producto_id not in productos), None)
+        if no_encontrado is not None:
+            return {
+                "message": f"ERROR: El producto '{no_encontrado}' no ha sido encontrado en los productos existentes."
+            }, 404
+
+        # El pedido no se puede quedar sin líneas
+        restantes = {producto_id for producto_id, _ in pedido.lista_pedidos.pares()
+                     if not isinstance(producto_id, (str, int, float)) or cambios.get(producto_id) != 0}
+        if not restantes and not any(cantidad != 0 for cantidad in cambios.values()):
+            return {
+                "message": "ERROR: El pedido debe tener al menos una línea."
+            }, 400
+
+        persistencia.registrar_modificacion(id_pedido, cambios, nombre_cliente)
+        pedido = lista_pedidos.modificar_lineas(id_pedido, cambios, nombre_cliente)
+        cache.invalidar(("pedido", id_pedido))
+        cache.nueva_generacion("pedidos")
+        respuesta = pedido.to_dict()
+
+    return {
+        "message": f"El pedido '{id_pedido}' ha sido modificado correctamente.",
+        "pedido": respuesta
+    }, 200
+
 # F) Eliminar un pedido.
 
 # Método DELETE  --> eliminar un pedido existente
@@ -252,38 +924,332 @@ def put_pedido(id_pedido):
 @app.route('/pedidos/<int:id_pedido>/', methods=['DELETE'])
 def delete_pedido(id_pedido):
     # Se busca el identificador del pedido en la lista de pedidos existentes.
-    eliminado = lista_pedidos.eliminar_pedido(id_pedido)
+    with cerrojo_datos.escritura():
+        eliminado = lista_pedidos.buscar_pedido(id_pedido) is not None
+        if eliminado is True:
+            persistencia.registrar_eliminacion(id_pedido)
+            lista_pedidos.eliminar_pedido(id_pedido)
+            cache.invalidar(("pedido", id_pedido))
+            cache.nueva_generacion("pedidos")
+
     if eliminado is True:
         return{
             "message": f"El pedido '{id_pedido}' se ha eliminado correctamente."
         }, 200
     else:
-        return{
+        return _respuesta_archivado(id_pedido) or ({
             "message": f"El pedido '{id_pedido}' no se ha eliminado correctamente."
-        }, 404
+        }, 404)
+
+# F.2) Archivar los pedidos antiguos.
+
+# Método POST  --> pasar al archivo en disco los pedidos con identificador menor o igual que "hasta"
+#                  (necesita GESTION_PEDIDOS_ARCHIVO). Se pueden seguir consultando con GET /pedidos/<id>,
+#                  pero ya no se pueden modificar ni aparecen en los listados.
+# Estructura:
+# POST /pedidos/archivar
+# Body JSON:
+# {
+#   "hasta": 1000
+# }
+@app.route('/pedidos/archivar', methods=['POST'])
+def post_archivar_pedidos():
+    if archivo_pedidos is None:
+        return {
+            "message": "ERROR: El archivo de pedidos no está activado (GESTION_PEDIDOS_ARCHIVO)."
+        }, 400
+    data = request.get_json(silent=True)
+    hasta = data.get("hasta") if isinstance(data, dict) else None
+    if type(hasta) is not int:
+        return {
+            "message": "ERROR: El campo 'hasta' (identificador de pedido) es obligatorio."
+        }, 400
+
+    with cerrojo_datos.escritura():
+        archivados = _archivar_pedidos(hasta)
+    return {
+        "message": f"Se han archivado {archivados} pedidos.",
+        "archivados": archivados,
+        "archivo": archivo_pedidos.estadisticas()
+    }, 200
 
 # G) Listar todos los pedidos.
 
+PEDIDOS_POR_BLOQUE = 100 # Pedidos que se envían en cada bloque del modo NDJSON
+
 # Método GET  --> obtener todos los pedidos existentes 
 # Estructura:
 # GET /pedidos
+# GET /pedidos?limit=<numero_pedidos>&after=<id_pedido>   (paginación por cursor)
+# GET /pedidos?formato=ndjson                              (streaming, un pedido por línea)
+# GET /pedidos?nombre_cliente=<nombre>                     (pedidos de un cliente)
+# GET /pedidos?producto_id=<id_producto>                   (pedidos que contienen un producto)
 # Body JSON: Vacío.
+#
+# - "limit": número máximo de pedidos que se devuelven.
+# - "after": identificador del último pedido recibido; se devuelven los pedidos siguientes.
+#   En la respuesta, "siguiente" indica el cursor que hay que usar para pedir la siguiente página.
+# - "formato=ndjson" (o la cabecera "Accept: application/x-ndjson"): los pedidos se envían
+#   uno a uno en una respuesta "chunked", sin construir el listado completo en memoria.
+# - "nombre_cliente" y "producto_id": filtros (se pueden combinar con los anteriores). Se
+#   resuelven con los índices secundarios de la lista, sin recorrer todos los pedidos.
 
 @app.route('/pedidos', methods=['GET'])
 def get_todos_pedidos():
-    # Se obtienen todos los pedidos del listado
-    listado_pedidos = lista_pedidos.listar_pedidos()
-    if not listado_pedidos :
-        return{
-            "message": f"No hay ninguna lista de pedidos existentes."
-        }, 200
+    limite = request.args.get("limit")
+    cursor = request.args.get("after")
+    nombre_cliente = request.args.get("nombre_cliente")
+    producto_id = request.args.get("producto_id")
+
+    # Se comprueba que los parámetros de paginación sean números enteros válidos
+    try:
+        limite = int(limite) if limite is not None else None
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return {
+            "message": "ERROR: Los parámetros 'limit' y 'after' deben ser números enteros."
+        }, 400
+    try:
+        producto_id = int(producto_id) if producto_id is not None else None
+    except ValueError:
+        return {
+            "message": "ERROR: El parámetro 'producto_id' debe ser un número entero."
+        }, 400
+    if limite is not None and limite < 1:
+        return {
+            "message": "ERROR: El parámetro 'limit' debe ser mayor que 0."
+        }, 400
+
+    # Se recorren los pedidos de forma perezosa (generador sobre la lista enlazada).
+    # El generador solo avanza con el cerrojo de lectura adquirido.
+    if nombre_cliente is None and producto_id is None:
+        pedidos = lista_pedidos.iterar_pedidos(despues_de=cursor)
     else:
-        return{
-            "message": f"Se ha encontrado una lista de pedidos.",
-            "listado_pedidos": [p.to_dict() for p in listado_pedidos] 
-        }, 200
+        pedidos = lista_pedidos.filtrar_pedidos(nombre_cliente=nombre_cliente,
+                                                producto_id=producto_id,
+                                                despues_de=cursor)
+
+    if request.args.get("formato") == "ndjson" or \
+            request.accept_mimetypes.best == "application/x-ndjson":
+        if limite is not None:
+            pedidos = islice(pedidos, limite)
+
+        # El cerrojo de lectura se adquiere para cada bloque de pedidos y no durante
+        # todo el envío, para no bloquear las escrituras mientras el cliente descarga.
+        def generar_ndjson():
+            while True:
+                with cerrojo_datos.lectura():
+                    bloque = [pedido.to_dict() for pedido in islice(pedidos, PEDIDOS_POR_BLOQUE)]
+                if not bloque:
+                    break
+                yield "".join(json.dumps(pedido, ensure_ascii=False) + "\n" for pedido in bloque)
+
+        return Response(stream_with_context(generar_ndjson()), mimetype="application/x-ndjson")
+
+    def construir():
+        if limite is None:
+            listado_pedidos = [p.to_dict() for p in pedidos]
+            siguiente = None
+        else:
+            # Se pide un pedido más de los necesarios para saber si hay otra página.
+            listado_pedidos = [p.to_dict() for p in islice(pedidos, limite + 1)]
+            siguiente = None
+            if len(listado_pedidos) > limite:
+                listado_pedidos = listado_pedidos[:limite]
+                siguiente = listado_pedidos[-1]["pedido_id"]
+
+        if not listado_pedidos :
+            return{
+                "message": f"No hay ninguna lista de pedidos existentes."
+            }, 200
+        else:
+            return{
+                "message": f"Se ha encontrado una lista de pedidos.",
+                "listado_pedidos": listado_pedidos,
+                "siguiente": siguiente
+            }, 200
+
+    # Cada página del listado se guarda en la caché según sus parámetros
+    with cerrojo_datos.lectura():
+        clave = ("pedidos", cache.generacion("pedidos"), request.query_string)
+        return _respuesta_cacheada(clave, construir)
 # ---------------------------------------------------------- END ENDPOINT PEDIDOS  ----------------------------------------------------------
 
 
+# ---------------------------------------------------------- ENDPOINT INGRESOS  ----------------------------------------------------------
+# Las unidades vendidas se mantienen actualizadas al crear, modificar o eliminar pedidos
+# (no se recorre la lista de pedidos). Los ingresos se calculan con el precio actual.
+
+# G) Productos más vendidos.
+
+# Método GET  --> los N productos con más unidades vendidas y sus ingresos
+# Estructura:
+# GET /ingresos/productos?top=<N>           (por defecto, 10)
+# Body JSON: Vacío.
+@app.route('/ingresos/productos', methods=['GET'])
+def get_ingresos_productos():
+    try:
+        top = _parametro_numerico("top", int)
+    except ValueError as error:
+        return {"message": f"ERROR: {error}"}, 400
+    if top is None:
+        top = 10
+    if top < 1:
+        return {"message": "ERROR: El parámetro 'top' debe ser mayor que 0."}, 400
+
+    with cerrojo_datos.lectura():
+        unidades = lista_pedidos.top_productos(top)
+        productos = arbol_productos.buscar_varios([producto_id for producto_id, _ in unidades
+                                                   if type(producto_id) is int])
+        listado_productos = ingresos_productos(unidades, productos)
+    return {
+        "message": "Productos con más unidades vendidas.",
+        "listado_productos": listado_productos
+    }, 200
+
+# H) Totales de un cliente.
+
+# Método GET  --> número de pedidos, unidades e importe total de los pedidos de un cliente
+# Estructura:
+# GET /ingresos/clientes/<nombre_cliente>
+# Body JSON: Vacío.
+@app.route('/ingresos/clientes/<nombre_cliente>', methods=['GET'])
+def get_ingresos_cliente(nombre_cliente):
+    with cerrojo_datos.lectura():
+        numero_pedidos, unidades = lista_pedidos.resumen_cliente(nombre_cliente)
+        if numero_pedidos == 0:
+            return {
+                "message": f"El cliente '{nombre_cliente}' no tiene pedidos."
+            }, 404
+        productos = arbol_productos.buscar_varios([producto_id for producto_id in unidades
+                                                   if type(producto_id) is int])
+        listado_productos = ingresos_productos(sorted(unidades.items(), key=lambda par: str(par[0])), productos)
+
+    importes = [producto["ingresos"] for producto in listado_productos if producto["ingresos"] is not None]
+    return {
+        "message": f"Totales del cliente '{nombre_cliente}'.",
+        "nombre_cliente": nombre_cliente,
+        "pedidos": numero_pedidos,
+        "unidades": sum(producto["unidades"] for producto in listado_productos),
+        "total": sum(importes),
+        "listado_productos": listado_productos
+    }, 200
+# ---------------------------------------------------------- END ENDPOINT INGRESOS  ----------------------------------------------------------
+
+
+# ---------------------------------------------------------- ENDPOINT CAMBIOS  ----------------------------------------------------------
+# Método GET  --> cambios de los pedidos y de los productos posteriores a una secuencia, para no tener
+#                 que descargar y comparar el listado completo (ver "cambios.py")
+# Estructura:
+# GET /cambios?desde=<secuencia>&limit=<numero_cambios>&espera=<segundos>
+# GET /cambios?desde=<secuencia>           con la cabecera "Accept: text/event-stream" (SSE)
+# Body JSON: Vacío.
+#
+# - "desde": secuencia del último cambio recibido (en la respuesta, "siguiente"). Es un texto
+#   que el cliente no debe interpretar. Con 0 (por defecto) se empieza por el cambio más antiguo
+#   que se conserva.
+# - "limit": número máximo de cambios que se devuelven (por defecto 1000, como mucho 10000).
+# - "espera": si no hay cambios nuevos, la respuesta espera hasta "espera" segundos a que los
+#   haya (long polling; por defecto 30, como mucho 60; con 0 se responde enseguida).
+# - Si el cliente se ha perdido cambios (ya se han descartado del registro o el servidor se ha
+#   reiniciado) se responde 410: hay que volver a descargar los pedidos (GET /pedidos) y seguir
+#   con "desde" igual a "ultima".
+# - Con "Accept: text/event-stream" los cambios se envían como Server-Sent Events según se
+#   producen ("id" es la secuencia y "event" el tipo de cambio). El stream se cierra al cabo de
+#   unos minutos y el navegador se vuelve a conectar con la cabecera "Last-Event-ID".
+@app.route('/cambios', methods=['GET'])
+def get_cambios():
+    if not registro_cambios.activa:
+        return {
+            "message": "ERROR: El registro de cambios no está activado (GESTION_PEDIDOS_CAMBIOS)."
+        }, 400
+    try:
+        desde, limite, espera = modulo_cambios.leer_parametros(request.args, request.headers)
+    except ValueError as error:
+        return {"message": str(error)}, 400
+
+    if request.accept_mimetypes.best == "text/event-stream":
+        return Response(_generar_sse(desde), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    # Si no hay cambios nuevos, se espera a que los haya (con el servidor ASGI la espera ya se
+    # ha hecho antes, sin bloquear el bucle de eventos)
+    if espera > 0 and not request.environ.get("gestion_pedidos.espera_hecha"):
+        registro_cambios.esperar(desde, espera)
+
+    leidos, siguiente = registro_cambios.leer(desde, limite)
+    if siguiente is None:
+        return {
+            "message": "ERROR: Se han perdido cambios posteriores a 'desde'. Hay que volver a descargar los pedidos.",
+            "primera": registro_cambios.primera,
+            "ultima": registro_cambios.ultima
+        }, 410
+    # El JSON de cada cambio se genera una sola vez aunque lo pidan muchos clientes
+    cuerpo = (f'{{"message": {json.dumps(f"Se han encontrado {len(leidos)} cambios.", ensure_ascii=False)}, '
+              f'"cambios": [{", ".join(cambio.json() for cambio in leidos)}], '
+              f'"siguiente": "{siguiente}", "ultima": "{registro_cambios.ultima}"}}\n')
+    return Response(cuerpo, status=200, mimetype="application/json")
+
+
+# Stream SSE con hilos: cada hilo espera con "esperar" (bloqueando) y, si no hay cambios,
+# envía un comentario de vez en cuando para que no se cierre la conexión
+def _generar_sse(desde: str):
+    fin = time.monotonic() + modulo_cambios.SSE_DURACION
+    yield modulo_cambios.SSE_INICIO
+    while desde is not None:
+        texto, desde = modulo_cambios.paso_sse(registro_cambios, desde)
+        if texto:
+            yield texto
+            continue
+        restante = fin - time.monotonic()
+        if restante <= 0:
+            return
+        if not registro_cambios.esperar(desde, min(modulo_cambios.SSE_LATIDO, restante)):
+            yield modulo_cambios.SSE_LATIDO_TEXTO
+# ---------------------------------------------------------- END ENDPOINT CAMBIOS  ----------------------------------------------------------
+
+
+# ---------------------------------------------------------- ENDPOINT CACHÉ  ----------------------------------------------------------
+# Método GET  --> estadísticas de la caché de respuestas (aciertos, fallos, tamaño, ...), de las
+#                 respuestas guardadas por "Idempotency-Key" y del registro de cambios
+# Estructura:
+# GET /cache
+# Body JSON: Vacío.
+@app.route('/cache', methods=['GET'])
+def get_cache():
+    return {
+        "message": "Estadísticas de la caché de respuestas.",
+        "cache": cache.estadisticas(),
+        "idempotencia": cache_idempotencia.estadisticas(),
+        "cambios": registro_cambios.estadisticas()
+    }, 200
+# ---------------------------------------------------------- END ENDPOINT CACHÉ  ----------------------------------------------------------
+
+
+# ---------------------------------------------------------- ENDPOINT MÉTRICAS  ----------------------------------------------------------
+# Método GET  --> métricas en formato de texto de Prometheus (latencias por ruta, operaciones
+#                 del árbol y de la lista, JSON, tamaño de los datos y de la caché)
+# Estructura:
+# GET /metrics
+# Body JSON: Vacío.
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    with cerrojo_datos.lectura():
+        indicadores = [
+            ("gestion_pedidos_productos", "Número de productos.", len(arbol_productos)),
+            ("gestion_pedidos_pedidos", "Número de pedidos.", len(lista_pedidos)),
+        ]
+        if archivo_pedidos is not None:
+            indicadores.append(("gestion_pedidos_archivados", "Número de pedidos archivados.",
+                                archivo_pedidos.pedidos))
+        if hasattr(arbol_productos, "altura"):
+            indicadores.append(("gestion_pedidos_arbol_altura", "Altura del árbol de productos.",
+                                arbol_productos.altura()))
+    estadisticas = cache.estadisticas()
+    for nombre in ("entradas", "bytes", "aciertos", "fallos", "expulsiones", "invalidaciones"):
+        indicadores.append((f"gestion_pedidos_cache_{nombre}", f"Caché de respuestas: {nombre}.", estadisticas[nombre]))
+    return Response(metricas.texto(indicadores), mimetype="text/plain; version=0.0.4")
+# ---------------------------------------------------------- END ENDPOINT MÉTRICAS  ----------------------------------------------------------
+
+
 if __name__ == '__main__':  # Va al final
     app.run(debug=True)
\ No newline at end of file
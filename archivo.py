@@ -0,0 +1,207 @@
+# --------------------------------------------------------------------------------
+#                                     ARCHIVO.PY
+#
+# Archivo en disco de los pedidos antiguos, para que la lista enlazada en
+# memoria solo guarde los pedidos recientes.
+#
+# Los pedidos más antiguos (los de identificador más bajo, que están al
+# principio de la lista) se sacan de la lista y se escriben en un "segmento"
+# del archivo. Cada segmento son dos ficheros:
+#
+# - "segmento-NNNNNN.bin": bloques de PEDIDOS_POR_BLOQUE pedidos en NDJSON
+#   (una línea JSON por pedido), cada bloque comprimido con zlib.
+# - "segmento-NNNNNN.json": índice disperso del segmento (primer y último
+#   identificador de cada bloque, su posición y su tamaño en el fichero) y las
+#   unidades vendidas de sus pedidos (para que los agregados de ingresos sigan
+#   incluyendo los pedidos archivados después de reiniciar).
+#
+# El índice se escribe el último: un segmento sin índice no llegó a terminarse
+# y se descarta. Los pedidos archivados son de solo lectura.
+#
+# Para buscar un pedido archivado se localiza su bloque en el índice (búsqueda
+# binaria) y se descomprime el bloque entero. De cada bloque solo se separan las
+# líneas por identificador (sin decodificar el JSON); los últimos bloques
+# descomprimidos se guardan en una caché LRU y solo se decodifica la línea del
+# pedido buscado.
+# --------------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+
+from agregados import AgregadosPedidos
+from lista_enlazada_pedidos import Pedido
+from persistencia import _lineas_a_json, _lineas_desde_json
+
+PEDIDOS_POR_BLOQUE = 1000 # Pedidos de cada bloque comprimido
+NIVEL_COMPRESION = 6
+
+
+class BloqueArchivo:
+    __slots__ = ("primer_id", "ultimo_id", "segmento", "posicion", "longitud")
+
+    def __init__(self, primer_id: int, ultimo_id: int, segmento: int, posicion: int, longitud: int):
+        self.primer_id = primer_id
+        self.ultimo_id = ultimo_id
+        self.segmento = segmento
+        self.posicion = posicion
+        self.longitud = longitud
+
+
+class ArchivoPedidos:
+    def __init__(self, directorio: str, bloques_en_cache: int = 64):
+        self.directorio = directorio
+        self.bloques_en_cache = bloques_en_cache
+        self.pedidos = 0 # Número de pedidos archivados
+        self.ultimo_id = 0 # Identificador más alto archivado
+        self._bloques = [] # BloqueArchivo ordenados por identificador
+        self._primeros = [] # primer_id de cada bloque (para la búsqueda binaria)
+        self._ficheros = {} # segmento --> descriptor del fichero ".bin"
+        self._cache = OrderedDict() # (segmento, posición) --> {pedido_id: línea JSON (bytes)}
+        self._cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, segmento: int, extension: str) -> str:
+        return os.path.join(self.directorio, f"segmento-{segmento:06d}.{extension}")
+
+    # Carga los índices de todos los segmentos. Devuelve las unidades vendidas de
+    # los pedidos archivados (un AgregadosPedidos) para sumarlas a las de la lista.
+    def cargar(self) -> AgregadosPedidos:
+        agregados = AgregadosPedidos()
+        for nombre in sorted(os.listdir(self.directorio)):
+            if not (nombre.startswith("segmento-") and nombre.endswith(".json")):
+                continue
+            segmento = int(nombre[len("segmento-"):-len(".json")])
+            with open(os.path.join(self.directorio, nombre), encoding="utf-8") as fichero:
+                indice = json.load(fichero)
+            self._añadir_segmento(segmento, indice)
+            _sumar_resumen(agregados, indice["agregados"])
+        # Segmentos a medio escribir (sin índice)
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(".bin") and not os.path.exists(os.path.join(self.directorio, nombre[:-4] + ".json")):
+                os.remove(os.path.join(self.directorio, nombre))
+        return agregados
+
+    def _añadir_segmento(self, segmento: int, indice: dict):
+        for primer_id, ultimo_id, posicion, longitud in indice["bloques"]:
+            self._bloques.append(BloqueArchivo(primer_id, ultimo_id, segmento, posicion, longitud))
+            self._primeros.append(primer_id)
+            self.ultimo_id = max(self.ultimo_id, ultimo_id)
+        self.pedidos += indice["pedidos"]
+
+    # Escribe un segmento nuevo con los pedidos indicados (ordenados por identificador
+    # y con identificadores mayores que los ya archivados).
+    def archivar(self, pedidos: list[Pedido]):
+        if not pedidos:
+            return
+        segmento = self._bloques[-1].segmento + 1 if self._bloques else 1
+        bloques = []
+        posicion = 0
+        with open(self._ruta(segmento, "bin"), "wb") as fichero:
+            for inicio in range(0, len(pedidos), PEDIDOS_POR_BLOQUE):
+                bloque = pedidos[inicio:inicio + PEDIDOS_POR_BLOQUE]
+                datos = zlib.compress("".join(
+                    json.dumps({"id": pedido.id, "nombre_cliente": pedido.nombre_cliente,
+                                "lineas": _lineas_a_json(pedido)}, ensure_ascii=False) + "\n"
+                    for pedido in bloque).encode("utf-8"), NIVEL_COMPRESION)
+                fichero.write(datos)
+                bloques.append([bloque[0].id, bloque[-1].id, posicion, len(datos)])
+                posicion += len(datos)
+            fichero.flush()
+            os.fsync(fichero.fileno())
+
+        resumen = AgregadosPedidos()
+        resumen.sumar_lote(pedidos)
+        indice = {"pedidos": len(pedidos), "bloques": bloques, "agregados": _resumen_a_json(resumen)}
+        ruta = self._ruta(segmento, "json")
+        with open(ruta + ".tmp", "w", encoding="utf-8") as fichero:
+            json.dump(indice, fichero, ensure_ascii=False)
+            fichero.flush()
+            os.fsync(fichero.fileno())
+        os.replace(ruta + ".tmp", ruta)
+
+        with self._cerrojo:
+            self._añadir_segmento(segmento, indice)
+
+    # Busca un pedido archivado (None si no está archivado)
+    def buscar(self, pedido_id) -> Pedido | None:
+        if type(pedido_id) is not int:
+            return None
+        with self._cerrojo:
+            posicion = bisect_right(self._primeros, pedido_id) - 1
+            if posicion < 0 or self._bloques[posicion].ultimo_id < pedido_id:
+                return None
+            bloque = self._bloques[posicion]
+            clave = (bloque.segmento, bloque.posicion)
+            lineas = self._cache.get(clave)
+            if lineas is not None:
+                self._cache.move_to_end(clave)
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+                fichero = self._ficheros.get(bloque.segmento)
+                if fichero is None:
+                    fichero = self._ficheros[bloque.segmento] = os.open(self._ruta(bloque.segmento, "bin"),
+                                                                        os.O_RDONLY)
+
+        if lineas is None:
+            # El bloque se lee y se descomprime fuera del cerrojo
+            lineas = _separar_lineas(zlib.decompress(os.pread(fichero, bloque.longitud, bloque.posicion)))
+            with self._cerrojo:
+                self._cache[clave] = lineas
+                self._cache.move_to_end(clave)
+                while len(self._cache) > self.bloques_en_cache:
+                    self._cache.popitem(last=False)
+
+        linea = lineas.get(pedido_id)
+        if linea is None: # El pedido se eliminó antes de archivarse
+            return None
+        pedido = json.loads(linea)
+        return Pedido(pedido_id=pedido["id"], nombre_cliente=pedido["nombre_cliente"],
+                      lista_pedidos=_lineas_desde_json(pedido["lineas"]))
+
+    def estadisticas(self) -> dict:
+        with self._cerrojo:
+            return {
+                "pedidos": self.pedidos,
+                "ultimo_id": self.ultimo_id,
+                "bloques": len(self._bloques),
+                "bloques_en_cache": len(self._cache),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+    def cerrar(self):
+        with self._cerrojo:
+            for fichero in self._ficheros.values():
+                os.close(fichero)
+            self._ficheros = {}
+
+
+# Separa las líneas de un bloque por identificador. Todas las líneas las escribe
+# "archivar" y empiezan por '{"id": <identificador>, ...'.
+def _separar_lineas(datos: bytes) -> dict[int, bytes]:
+    lineas = {}
+    for linea in datos.splitlines():
+        lineas[int(linea[7:linea.index(b",", 7)])] = linea
+    return lineas
+
+
+# Las unidades vendidas se guardan como listas de pares (JSON no admite claves numéricas)
+def _resumen_a_json(agregados: AgregadosPedidos) -> dict:
+    return {
+        "productos": [[producto_id, unidades] for producto_id, unidades in agregados.unidades_productos.items()],
+        "clientes": [[cliente, numero_pedidos, [[producto_id, unidades] for producto_id, unidades in unidades.items()]]
+                     for cliente, (numero_pedidos, unidades) in agregados.clientes.items()],
+    }
+
+
+def _sumar_resumen(agregados: AgregadosPedidos, resumen: dict):
+    agregados.sumar_resumen({producto_id: unidades for producto_id, unidades in resumen["productos"]},
+                            {cliente: [numero_pedidos, {producto_id: unidades for producto_id, unidades in unidades}]
+                             for cliente, numero_pedidos, unidades in resumen["clientes"]})
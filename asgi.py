@@ -0,0 +1,287 @@
+# --------------------------------------------------------------------------------
+#                                       ASGI.PY
+#
+# Aplicación ASGI (asyncio) que sirve las mismas rutas que "app.py" y comparte
+# el mismo árbol de productos y la misma lista de pedidos.
+#
+# - El body de cada petición se recibe de forma asíncrona (sin bloquear el bucle
+#   de eventos mientras llega por la red) y se comprueba su tamaño máximo.
+# - Una vez recibido, la vista de Flask se ejecuta en un conjunto de hilos, nunca
+#   en el bucle de eventos: las vistas esperan al cerrojo de los datos (y a SQLite
+#   o al disco), y mientras tanto el bucle tiene que seguir atendiendo al resto de
+#   conexiones.
+# - Los lotes de productos en NDJSON (POST /productos/bulk) no se reciben
+#   completos: la vista va leyendo el body según llega, sin el tamaño máximo
+#   (igual que con WSGI).
+# - Las respuestas en streaming (NDJSON) se envían bloque a bloque, dejando que
+#   el bucle atienda a otros clientes entre bloque y bloque.
+# - GET /cambios espera a que haya cambios nuevos (long polling y Server-Sent
+#   Events) en el propio bucle, sin ocupar un hilo por cliente (ver "cambios.py").
+#
+# Se puede servir con el servidor incluido ("python servidor.py") o con
+# cualquier servidor ASGI (por ejemplo, "uvicorn asgi:aplicacion").
+# --------------------------------------------------------------------------------
+
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.wrappers import Request
+
+import app as api
+import cambios
+
+
+class CuerpoDemasiadoGrande(Exception):
+    pass
+
+
+class AdaptadorASGI:
+    def __init__(self, aplicacion_wsgi, hilos: int = 8):
+        if hilos < 1:
+            raise ValueError("ERROR: Las vistas necesitan al menos un hilo.")
+        self.aplicacion_wsgi = aplicacion_wsgi
+        self.hilos = hilos
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            await self._peticion(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                api.persistencia.cerrar()
+                self._ejecutor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # Se lee el body completo sin bloquear. Si supera el tamaño máximo de Flask
+    # (MAX_CONTENT_LENGTH), se deja de leer.
+    async def _leer_cuerpo(self, receive) -> bytes:
+        maximo = self.aplicacion_wsgi.config.get("MAX_CONTENT_LENGTH")
+        trozos = []
+        tamaño = 0
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                raise ConnectionError("El cliente se ha desconectado")
+            trozo = mensaje.get("body", b"")
+            tamaño += len(trozo)
+            if maximo is not None and tamaño > maximo:
+                raise CuerpoDemasiadoGrande()
+            trozos.append(trozo)
+            if not mensaje.get("more_body", False):
+                return b"".join(trozos)
+
+    async def _peticion(self, scope, receive, send):
+        if _es_lote_ndjson(scope):
+            await self._peticion_en_streaming(scope, receive, send)
+            return
+        try:
+            cuerpo = await self._leer_cuerpo(receive)
+        except CuerpoDemasiadoGrande:
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body",
+                        "body": '{"message": "ERROR: El body de la petición es demasiado grande."}\n'.encode("utf-8")})
+            return
+        except ConnectionError:
+            return
+
+        environ = _environ(scope, cuerpo)
+        if scope["method"] == "GET" and scope["path"] == "/cambios" and api.registro_cambios.activa:
+            if await self._cambios(environ, send):
+                return
+
+        await self._responder(environ, send)
+
+    # El body se pasa a la vista sin leerlo antes: la vista (en su hilo) pide cada
+    # trozo al bucle de eventos cuando lo necesita
+    async def _peticion_en_streaming(self, scope, receive, send):
+        environ = _environ(scope, b"")
+        # Si el cliente ha indicado el tamaño del body, se mantiene (con el de la cabecera)
+        longitud = dict(scope.get("headers", [])).get(b"content-length")
+        if longitud is not None:
+            environ["CONTENT_LENGTH"] = longitud.decode("latin-1")
+        else:
+            del environ["CONTENT_LENGTH"]
+        environ["wsgi.input"] = io.BufferedReader(EntradaASGI(receive, asyncio.get_running_loop()),
+                                                  buffer_size=1 << 16)
+        environ["wsgi.input_terminated"] = True # El final del body lo indica el propio stream
+        await self._responder(environ, send)
+
+    # Ejecuta la aplicación WSGI y envía su respuesta
+    async def _responder(self, environ, send):
+        # Cada petición usa su propio contexto (Flask guarda ahí la petición actual)
+        contexto = contextvars.copy_context()
+        estado, resultado = await self._ejecutar(contexto, self._llamar_wsgi, environ)
+        await send({"type": "http.response.start", "status": estado[0], "headers": estado[1]})
+
+        # Se adelanta un trozo para saber cuál es el último (así una respuesta de un
+        # solo trozo se envía de una vez, con su "Content-Length")
+        trozos = iter(resultado)
+        try:
+            pendiente = await self._ejecutar(contexto, _siguiente_trozo, trozos)
+            if pendiente is None:
+                await send({"type": "http.response.body", "body": b""})
+            while pendiente is not None:
+                siguiente = await self._ejecutar(contexto, _siguiente_trozo, trozos)
+                await send({"type": "http.response.body", "body": pendiente,
+                            "more_body": siguiente is not None})
+                pendiente = siguiente
+        finally:
+            if hasattr(resultado, "close"):
+                await self._ejecutar(contexto, resultado.close)
+
+    # GET /cambios: la espera se hace aquí, de forma asíncrona. Con long polling, después
+    # se ejecuta la vista de Flask como siempre (ya sin esperar); los streams SSE se
+    # envían directamente. Devuelve True si ya se ha enviado la respuesta.
+    async def _cambios(self, environ, send) -> bool:
+        peticion = Request(environ)
+        try:
+            desde, _, espera = cambios.leer_parametros(peticion.args, peticion.headers)
+        except ValueError:
+            return False # La vista responde con el error
+        if peticion.accept_mimetypes.best == "text/event-stream":
+            await self._enviar_sse(desde, send)
+            return True
+        if espera > 0:
+            await api.registro_cambios.esperar_async(desde, espera)
+        environ["gestion_pedidos.espera_hecha"] = True
+        return False
+
+    # Igual que "_generar_sse" de "app.py", esperando con "esperar_async". Si el cliente
+    # se desconecta, "send" lanza ConnectionError y se deja de enviar.
+    async def _enviar_sse(self, desde: str, send):
+        registro = api.registro_cambios
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                                (b"cache-control", b"no-cache")]})
+        await send({"type": "http.response.body", "body": cambios.SSE_INICIO.encode("utf-8"), "more_body": True})
+        fin = time.monotonic() + cambios.SSE_DURACION
+        while desde is not None:
+            texto, desde = cambios.paso_sse(registro, desde)
+            if not texto:
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    break
+                if await registro.esperar_async(desde, min(cambios.SSE_LATIDO, restante)):
+                    continue
+                texto = cambios.SSE_LATIDO_TEXTO
+            await send({"type": "http.response.body", "body": texto.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    # Ejecuta una función en el contexto de la petición, en uno de los hilos
+    async def _ejecutar(self, contexto, funcion, *argumentos):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._ejecutor, contexto.run, funcion, *argumentos)
+
+    # Llama a la aplicación WSGI. Devuelve ([código, cabeceras], respuesta WSGI)
+    def _llamar_wsgi(self, environ):
+        estado = [500, []]
+
+        def start_response(status, cabeceras, exc_info=None):
+            estado[0] = int(status.split(" ", 1)[0])
+            estado[1] = [(nombre.lower().encode("latin-1"), valor.encode("latin-1"))
+                         for nombre, valor in cabeceras]
+
+        return estado, self.aplicacion_wsgi(environ, start_response)
+
+
+# Body de la petición para "wsgi.input" que se lee según llega: cada lectura (en el hilo
+# de la vista) espera a que el bucle de eventos reciba el siguiente mensaje de ASGI
+class EntradaASGI(io.RawIOBase):
+    def __init__(self, receive, bucle):
+        self._receive = receive
+        self._bucle = bucle
+        self._trozo = memoryview(b"")
+        self._terminado = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, destino) -> int:
+        while not self._trozo and not self._terminado:
+            mensaje = asyncio.run_coroutine_threadsafe(self._receive(), self._bucle).result()
+            if mensaje["type"] == "http.disconnect":
+                raise ConnectionError("El cliente se ha desconectado")
+            self._trozo = memoryview(mensaje.get("body", b""))
+            self._terminado = not mensaje.get("more_body", False)
+        leidos = min(len(destino), len(self._trozo))
+        destino[:leidos] = self._trozo[:leidos]
+        self._trozo = self._trozo[leidos:]
+        return leidos
+
+
+# POST /productos/bulk con un stream NDJSON: se procesa por líneas, sin el tamaño
+# máximo del body (ver "post_productos_bulk" en "app.py")
+def _es_lote_ndjson(scope) -> bool:
+    if scope["method"] != "POST" or scope["path"] != "/productos/bulk":
+        return False
+    for nombre, valor in scope.get("headers", []):
+        if nombre.lower() == b"content-type":
+            return valor.split(b";")[0].strip().lower() == b"application/x-ndjson"
+    return False
+
+
+# Siguiente trozo no vacío de la respuesta (None al terminar)
+def _siguiente_trozo(trozos):
+    for trozo in trozos:
+        if trozo:
+            return trozo
+    return None
+
+
+# Convierte el "scope" ASGI en el diccionario "environ" de WSGI
+def _environ(scope, cuerpo: bytes) -> dict:
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": cliente[0],
+        "REMOTE_PORT": str(cliente[1]),
+        "CONTENT_LENGTH": str(len(cuerpo)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope.get("headers", []):
+        nombre = nombre.decode("latin-1")
+        valor = valor.decode("latin-1")
+        # El body ya se ha recibido completo (y sin codificar "por trozos")
+        if nombre in ("content-length", "transfer-encoding"):
+            continue
+        if nombre == "content-type":
+            environ["CONTENT_TYPE"] = valor
+            continue
+        clave = "HTTP_" + nombre.upper().replace("-", "_")
+        environ[clave] = environ[clave] + "," + valor if clave in environ else valor
+    return environ
+
+
+# Número de hilos que ejecutan las vistas (GESTION_PEDIDOS_ASGI_HILOS, por defecto 8)
+def hilos_por_defecto() -> int:
+    return int(os.environ.get("GESTION_PEDIDOS_ASGI_HILOS", 8))
+
+
+aplicacion = AdaptadorASGI(api.app, hilos=hilos_por_defecto())
@@ -0,0 +1,8 @@
+# --------------------------------------------------------------------------------
+#                                     BENCHMARKS
+#
+# Scripts de medición del rendimiento de las estructuras de datos y de la API.
+# Se ejecutan desde la raíz del proyecto, por ejemplo:
+#
+#   python -m benchmarks.bench_productos
+# --------------------------------------------------------------------------------
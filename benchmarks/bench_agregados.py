@@ -0,0 +1,73 @@
+# --------------------------------------------------------------------------------
+#                                  BENCH_AGREGADOS.PY
+#
+# Mide el coste de los agregados de pedidos (unidades por producto y por cliente):
+# - Recalcular todo desde cero, pedido a pedido (Python) y por lotes (NumPy, si
+#   está instalado).
+# - Mantenerlos al día: tiempo por pedido creado, modificado y eliminado.
+# - Consultar los productos más vendidos.
+#
+# Uso:
+#   python -m benchmarks.bench_agregados [numero_pedidos] [numero_productos]
+# --------------------------------------------------------------------------------
+
+import random
+import sys
+import time
+
+import agregados
+from agregados import AgregadosPedidos
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+
+
+def crear_pedidos(numero_pedidos: int, numero_productos: int) -> list[Pedido]:
+    aleatorio = random.Random(1)
+    return [Pedido(pedido_id, f"Cliente {aleatorio.randrange(1000)}",
+                   [LineaPedido(aleatorio.randint(1, numero_productos), aleatorio.randint(1, 10))
+                    for _ in range(aleatorio.randint(1, 5))])
+            for pedido_id in range(1, numero_pedidos + 1)]
+
+
+def medir(funcion) -> float:
+    inicio = time.perf_counter()
+    funcion()
+    return time.perf_counter() - inicio
+
+
+def main(numero_pedidos: int = 1_000_000, numero_productos: int = 10_000):
+    pedidos = crear_pedidos(numero_pedidos, numero_productos)
+    print(f"Pedidos: {numero_pedidos}, productos: {numero_productos}")
+
+    # Recalcular desde cero
+    python = AgregadosPedidos()
+    segundos = medir(lambda: [python.sumar(pedido) for pedido in pedidos])
+    print(f"Recalcular pedido a pedido (Python): {segundos:8.3f} s")
+    if agregados.np is not None:
+        vectorizado = AgregadosPedidos()
+        segundos = medir(lambda: vectorizado.recalcular(pedidos))
+        print(f"Recalcular por lotes (NumPy):        {segundos:8.3f} s")
+        assert vectorizado.unidades_productos == python.unidades_productos
+    else:
+        print("Recalcular por lotes (NumPy):        NumPy no está instalado")
+
+    # Mantenimiento incremental
+    lista = ListaPedidos()
+    lista.agregar_pedidos(pedidos)
+    muestra = random.Random(2).sample(pedidos, min(10_000, numero_pedidos))
+    nuevos = crear_pedidos(len(muestra), numero_productos)
+    for nuevo, pedido in zip(nuevos, muestra):
+        nuevo.id = pedido.id
+    segundos = medir(lambda: [lista.actualizar_pedido(nuevo.id, nuevo) for nuevo in nuevos])
+    print(f"Actualizar un pedido:                {segundos / len(nuevos) * 1e6:8.2f} µs")
+    segundos = medir(lambda: [lista.eliminar_pedido(pedido.id) for pedido in muestra])
+    print(f"Eliminar un pedido:                  {segundos / len(muestra) * 1e6:8.2f} µs")
+    segundos = medir(lambda: [lista.agregar_pedido(nuevo) for nuevo in nuevos])
+    print(f"Crear un pedido:                     {segundos / len(nuevos) * 1e6:8.2f} µs")
+
+    repeticiones = 100
+    segundos = medir(lambda: [lista.top_productos(10) for _ in range(repeticiones)])
+    print(f"Top 10 productos:                    {segundos / repeticiones * 1e3:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
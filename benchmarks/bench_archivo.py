@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_ARCHIVO.PY
+#
+# Mide el efecto de archivar los pedidos antiguos (ver "archivo.py"):
+#
+# - Tiempo de "listar_pedidos" y memoria de la lista con todos los pedidos en
+#   memoria y con solo los más recientes (el resto archivados).
+# - Tiempo de archivar los pedidos y tamaño del archivo en disco.
+# - Latencia de buscar un pedido: en la lista, en el archivo con el bloque ya
+#   descomprimido (caché LRU) y en el archivo leyendo el bloque del disco.
+#
+# Uso:
+#   python -m benchmarks.bench_archivo [numero_pedidos] [pedidos_en_memoria]
+# --------------------------------------------------------------------------------
+
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from archivo import ArchivoPedidos
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+
+BUSQUEDAS = 2000
+
+
+def crear_lista(numero_pedidos: int) -> ListaPedidos:
+    lista = ListaPedidos()
+    lista.agregar_pedidos([Pedido(pedido_id, f"Cliente {pedido_id % 1000}",
+                                  [LineaPedido(pedido_id % 500 + 1, 2), LineaPedido(pedido_id % 77 + 1, 1)])
+                           for pedido_id in range(1, numero_pedidos + 1)])
+    return lista
+
+
+def tiempo_listar(lista: ListaPedidos) -> float:
+    inicio = time.perf_counter()
+    lista.listar_pedidos()
+    return time.perf_counter() - inicio
+
+
+def latencia(buscar, ids) -> float:
+    inicio = time.perf_counter()
+    for pedido_id in ids:
+        buscar(pedido_id)
+    return (time.perf_counter() - inicio) / len(ids) * 1e6
+
+
+# Memoria ocupada por la lista (MiB) con todos los pedidos y después de extraer los antiguos
+def memoria(numero_pedidos: int, en_memoria: int) -> tuple[float, float]:
+    tracemalloc.start()
+    lista = crear_lista(numero_pedidos)
+    completa = tracemalloc.get_traced_memory()[0]
+    lista.extraer_antiguos(numero_pedidos - en_memoria)
+    gc.collect()
+    reducida = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return completa / 2**20, reducida / 2**20
+
+
+def main(numero_pedidos: int = 500_000, en_memoria: int = 50_000):
+    lista = crear_lista(numero_pedidos)
+    listar_completa = tiempo_listar(lista)
+    ids_lista = [random.randint(1, numero_pedidos) for _ in range(BUSQUEDAS)]
+    buscar_lista = latencia(lista.buscar_pedido, ids_lista)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        archivo = ArchivoPedidos(directorio, bloques_en_cache=64)
+        hasta = numero_pedidos - en_memoria
+        inicio = time.perf_counter()
+        archivo.archivar(lista.extraer_antiguos(hasta))
+        archivar = time.perf_counter() - inicio
+        listar_reducida = tiempo_listar(lista)
+        tamaño = sum(os.path.getsize(os.path.join(directorio, nombre)) for nombre in os.listdir(directorio))
+
+        # Con la caché caliente: ids de unos pocos bloques
+        ids_calientes = [random.randint(1, 30_000) for _ in range(BUSQUEDAS)]
+        archivo.buscar(1)
+        latencia(archivo.buscar, ids_calientes)
+        buscar_caliente = latencia(archivo.buscar, ids_calientes)
+        # Con la caché fría: cada búsqueda en un bloque distinto (más bloques que la caché)
+        ids_frios = [random.randint(1, hasta) for _ in range(BUSQUEDAS)]
+        buscar_frio = latencia(archivo.buscar, ids_frios)
+        archivo.cerrar()
+    del lista
+    memoria_completa, memoria_reducida = memoria(numero_pedidos, en_memoria)
+
+    print(f"Pedidos: {numero_pedidos}, en memoria tras archivar: {en_memoria}")
+    print(f"{'':<28}{'todos en memoria':>18}{'con archivo':>14}")
+    print(f"{'listar_pedidos (ms)':<28}{listar_completa * 1e3:>18.1f}{listar_reducida * 1e3:>14.1f}")
+    print(f"{'memoria de la lista (MiB)':<28}{memoria_completa:>18.1f}{memoria_reducida:>14.1f}")
+    print(f"Archivar {hasta} pedidos: {archivar:.2f} s, {tamaño / 2**20:.1f} MiB en disco")
+    print(f"Buscar (us): lista {buscar_lista:.2f}, archivo con caché {buscar_caliente:.2f}, "
+          f"archivo sin caché {buscar_frio:.1f}")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
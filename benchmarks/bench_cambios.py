@@ -0,0 +1,115 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_CAMBIOS.PY
+#
+# Mide el registro de cambios (ver "cambios.py"):
+#
+# - Coste de generar los cambios: POST /pedidos y PUT /pedidos/<id> con el
+#   registro activado y desactivado (GESTION_PEDIDOS_CAMBIOS=0).
+# - Sincronización de un cliente que quiere saber qué ha cambiado desde la última
+#   vez, con muchos pedidos y pocas modificaciones:
+#     * "listado completo": descarga GET /pedidos y lo compara con la copia anterior;
+#     * "GET /cambios": pide solo los cambios posteriores a su última secuencia.
+#
+# Cada configuración se ejecuta en un proceso nuevo (el registro se configura al
+# importar la aplicación). Se usa el cliente de pruebas de Flask.
+#
+# Uso:
+#   python -m benchmarks.bench_cambios [numero_pedidos] [modificaciones]   (por defecto 20000 100)
+# --------------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import sys
+import time
+
+PRODUCTOS = 100
+PETICIONES = 2000 # Peticiones POST/PUT que se miden
+
+
+def _preparar(capacidad: int):
+    for clave in [clave for clave in os.environ if clave.startswith("GESTION_PEDIDOS_")]:
+        del os.environ[clave]
+    os.environ["GESTION_PEDIDOS_CAMBIOS"] = str(capacidad)
+    import app as api
+    cliente = api.app.test_client()
+    cliente.post("/productos/bulk", json=[{"nombre": f"Producto {numero}", "precio": numero + 1}
+                                          for numero in range(PRODUCTOS)])
+    return cliente
+
+
+def _pedido(numero: int) -> dict:
+    return {"nombre_cliente": f"Cliente {numero % 50}",
+            "lista_pedidos": [{"id_producto": (numero + linea) % PRODUCTOS + 1, "cantidad": linea + 1}
+                              for linea in range(5)]}
+
+
+# Microsegundos por petición de POST /pedidos y de PUT /pedidos/<id> (la mejor de 3 rondas)
+def medir_escrituras(capacidad: int) -> tuple[float, float]:
+    cliente = _preparar(capacidad)
+    post = put = float("inf")
+    for ronda in range(3):
+        inicio = time.perf_counter()
+        for numero in range(PETICIONES):
+            cliente.post("/pedidos", json=_pedido(numero)).get_data()
+        post = min(post, time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        for numero in range(PETICIONES):
+            cliente.put(f"/pedidos/{numero + 1}/", json=_pedido(numero + ronda)).get_data()
+        put = min(put, time.perf_counter() - inicio)
+    return post / PETICIONES * 1e6, put / PETICIONES * 1e6
+
+
+# Milisegundos que tarda el cliente en saber qué pedidos han cambiado
+def medir_sincronizacion(numero_pedidos: int, modificaciones: int) -> tuple[float, float, int, int]:
+    cliente = _preparar(max(10_000, modificaciones))
+    cliente.post("/pedidos/batch", json=[_pedido(numero) for numero in range(numero_pedidos)])
+    anterior = {pedido["pedido_id"]: pedido for pedido in cliente.get("/pedidos").get_json()["listado_pedidos"]}
+    desde = cliente.get("/cambios?espera=0").get_json()["ultima"]
+    for numero in range(modificaciones):
+        cliente.put(f"/pedidos/{numero * 7 % numero_pedidos + 1}/", json=_pedido(numero + 3))
+
+    inicio = time.perf_counter()
+    respuesta = cliente.get("/pedidos")
+    actual = {pedido["pedido_id"]: pedido for pedido in respuesta.get_json()["listado_pedidos"]}
+    cambiados = [pedido_id for pedido_id, pedido in actual.items() if anterior.get(pedido_id) != pedido]
+    listado = (time.perf_counter() - inicio) * 1000
+    bytes_listado = len(respuesta.get_data())
+
+    inicio = time.perf_counter()
+    respuesta = cliente.get(f"/cambios?desde={desde}&espera=0&limit={max(modificaciones, 1)}")
+    ids_cambios = {cambio["id"] for cambio in respuesta.get_json()["cambios"]}
+    delta = (time.perf_counter() - inicio) * 1000
+    assert ids_cambios == set(cambiados)
+    return listado, delta, bytes_listado, len(respuesta.get_data())
+
+
+def _ejecutar(conexion, funcion, argumentos):
+    conexion.send(funcion(*argumentos))
+    conexion.close()
+
+
+def en_proceso_nuevo(funcion, *argumentos):
+    contexto = multiprocessing.get_context("spawn")
+    recibir, enviar = contexto.Pipe(duplex=False)
+    proceso = contexto.Process(target=_ejecutar, args=(enviar, funcion, argumentos))
+    proceso.start()
+    resultado = recibir.recv()
+    proceso.join()
+    return resultado
+
+
+def main(numero_pedidos: int = 20_000, modificaciones: int = 100):
+    print(f"{'Escrituras (us por petición)':<32}{'POST /pedidos':>15}{'PUT /pedidos':>15}")
+    for nombre, capacidad in (("sin registro de cambios", 0), ("con registro de cambios", 10_000)):
+        post, put = en_proceso_nuevo(medir_escrituras, capacidad)
+        print(f"{nombre:<32}{post:>15.1f}{put:>15.1f}")
+
+    listado, delta, bytes_listado, bytes_delta = en_proceso_nuevo(medir_sincronizacion, numero_pedidos, modificaciones)
+    print(f"\nSincronización ({numero_pedidos} pedidos, {modificaciones} modificados)")
+    print(f"{'':<32}{'tiempo (ms)':>15}{'bytes':>15}")
+    print(f"{'listado completo + comparación':<32}{listado:>15.1f}{bytes_listado:>15}")
+    print(f"{'GET /cambios':<32}{delta:>15.1f}{bytes_delta:>15}")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
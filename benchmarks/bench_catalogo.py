@@ -0,0 +1,139 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_CATALOGO.PY
+#
+# Mide el tiempo de arranque con un catálogo de productos ya cargado (ver
+# "catalogo.py") frente a crear los productos uno a uno:
+#
+# - "POST /productos": una petición por producto con el cliente de pruebas de
+#   Flask (estimado a partir de unos miles de peticiones).
+# - "insertar": "ProductosTreeBST.insertar" producto a producto, sin peticiones
+#   (estimado a partir de los primeros productos si el catálogo es muy grande).
+# - "catálogo CSV" y "catálogo binario": lectura del fichero (con 1 proceso y con
+#   uno por núcleo) y construcción del árbol de una vez con "insertar_lote"
+#   ("catalogo.sembrar", el mismo código que se usa al arrancar).
+#
+# Cada medida se ejecuta en un proceso nuevo, que también da su memoria máxima (RSS).
+#
+# Uso:
+#   python -m benchmarks.bench_catalogo [numero_productos ...]   (por defecto 100000 5000000)
+# --------------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import catalogo
+from concurrencia import ContadorAtomico
+from productos import Producto, ProductosTreeBST
+
+PETICIONES = 2000 # Peticiones POST /productos que se miden
+MAXIMO_INSERTAR = 500_000 # Productos que se insertan uno a uno como máximo (el resto se estima)
+
+
+def generar_productos(numero_productos: int):
+    aleatorio = random.Random(numero_productos)
+    for producto_id in range(1, numero_productos + 1):
+        yield Producto(producto_id, f"Producto {producto_id}", round(aleatorio.uniform(1, 500), 2))
+
+
+def generar_ficheros(directorio: str, numero_productos: int) -> tuple[str, str]:
+    ruta_csv = os.path.join(directorio, f"productos-{numero_productos}.csv")
+    with open(ruta_csv, "w", encoding="utf-8") as fichero:
+        fichero.write("id,nombre,precio\n")
+        bloque = []
+        for producto in generar_productos(numero_productos):
+            bloque.append(f"{producto.id},{producto.nombre},{producto.precio}\n")
+            if len(bloque) == 100_000:
+                fichero.write("".join(bloque))
+                bloque = []
+        fichero.write("".join(bloque))
+    ruta_binario = os.path.join(directorio, f"productos-{numero_productos}.bin")
+    catalogo.escribir_binario(ruta_binario, generar_productos(numero_productos), ancho_nombre=24)
+    return ruta_csv, ruta_binario
+
+
+def rss_maximo() -> float:
+    # En Linux "ru_maxrss" está en KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ------------------------------------------------------------
+#                          MEDIDAS
+# Devuelven (total, lectura, construcción del árbol) en segundos
+# (None si no se mide por separado) y si el total es estimado.
+# ------------------------------------------------------------
+def medir_post(numero_productos: int):
+    for clave in [clave for clave in os.environ if clave.startswith("GESTION_PEDIDOS_")]:
+        del os.environ[clave]
+    import app as api
+    cliente = api.app.test_client()
+    inicio = time.perf_counter()
+    for numero in range(PETICIONES):
+        cliente.post("/productos", json={"nombre": f"Producto {numero}", "precio": 1.5}).get_data()
+    por_producto = (time.perf_counter() - inicio) / PETICIONES
+    return por_producto * numero_productos, None, None, True
+
+
+def medir_insertar(numero_productos: int):
+    arbol = ProductosTreeBST()
+    muestra = min(numero_productos, MAXIMO_INSERTAR)
+    productos = list(generar_productos(muestra))
+    inicio = time.perf_counter()
+    for producto in productos:
+        arbol.insertar(producto)
+    return (time.perf_counter() - inicio) * numero_productos / muestra, None, None, muestra < numero_productos
+
+
+def medir_catalogo(ruta: str, procesos: int):
+    inicio = time.perf_counter()
+    resultado = catalogo.sembrar(ProductosTreeBST(), ContadorAtomico(), ruta, procesos)
+    total = time.perf_counter() - inicio
+    return total, resultado.segundos_lectura, total - resultado.segundos_lectura, False
+
+
+def _ejecutar(conexion, funcion, argumentos):
+    conexion.send(funcion(*argumentos) + (rss_maximo(),))
+    conexion.close()
+
+
+# Ejecuta la medida en un proceso nuevo (no en un Pool: sus procesos no pueden crear
+# otros procesos, y la lectura del catálogo usa varios)
+def en_proceso_nuevo(funcion, *argumentos):
+    contexto = multiprocessing.get_context("spawn")
+    recibir, enviar = contexto.Pipe(duplex=False)
+    proceso = contexto.Process(target=_ejecutar, args=(enviar, funcion, argumentos))
+    proceso.start()
+    resultado = recibir.recv()
+    proceso.join()
+    return resultado
+
+
+def main(tamaños: list[int]):
+    nucleos = os.cpu_count() or 1
+    print(f"Núcleos: {nucleos}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for numero_productos in tamaños:
+            ruta_csv, ruta_binario = generar_ficheros(directorio, numero_productos)
+            medidas = [("POST /productos uno a uno", medir_post, (numero_productos,)),
+                       ("insertar uno a uno", medir_insertar, (numero_productos,))]
+            for procesos in sorted({1, nucleos}):
+                medidas += [(f"catálogo CSV ({procesos} proc.)", medir_catalogo, (ruta_csv, procesos)),
+                            (f"catálogo binario ({procesos} proc.)", medir_catalogo, (ruta_binario, procesos))]
+
+            print(f"\nProductos: {numero_productos} (CSV {os.path.getsize(ruta_csv) / 2**20:.0f} MiB, "
+                  f"binario {os.path.getsize(ruta_binario) / 2**20:.0f} MiB)")
+            print(f"{'':<32}{'total (s)':>12}{'lectura (s)':>13}{'árbol (s)':>11}{'RSS (MiB)':>11}")
+            for nombre, funcion, argumentos in medidas:
+                total, lectura, arbol, estimado, rss = en_proceso_nuevo(funcion, *argumentos)
+                print(f"{nombre:<32}{f'{total:.2f}' + ('*' if estimado else ''):>12}"
+                      f"{'' if lectura is None else f'{lectura:.2f}':>13}"
+                      f"{'' if arbol is None else f'{arbol:.2f}':>11}{rss:>11.0f}")
+    print("\n* estimado a partir de los primeros productos")
+
+
+if __name__ == '__main__':
+    main([int(argumento) for argumento in sys.argv[1:]] or [100_000, 5_000_000])
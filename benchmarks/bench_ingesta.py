@@ -0,0 +1,109 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_INGESTA.PY
+#
+# Compara la lectura de los body JSON de los pedidos (ver "ingesta.py"):
+#
+# - "anterior": json.loads, un objeto LineaPedido por línea y después el
+#   empaquetado en el array compacto del pedido (como se hacía antes).
+# - "json": json.loads y validación + empaquetado en una sola pasada.
+# - "orjson": igual, decodificando con orjson (si está instalado).
+#
+# Se mide solo la lectura del body (microbenchmark) y la petición completa
+# POST /pedidos con el cliente de pruebas de Flask, para pedidos de 10, 1.000 y
+# 10.000 líneas. También se mide la lectura de un lote de productos
+# (POST /productos/bulk).
+#
+# Uso:
+#   python -m benchmarks.bench_ingesta [repeticiones]
+# --------------------------------------------------------------------------------
+
+import json
+import sys
+import time
+
+import app as api
+import ingesta
+from lista_enlazada_pedidos import LineaPedido, Pedido
+
+LINEAS = (10, 1000, 10_000)
+PRODUCTOS = 1000 # Productos existentes (los pedidos usan sus identificadores)
+PRODUCTOS_LOTE = 10_000 # Productos del body de POST /productos/bulk
+
+ORJSON = ingesta.orjson
+
+
+def cuerpo_pedido(numero_lineas: int) -> bytes:
+    return json.dumps({"nombre_cliente": "Cliente",
+                       "lista_pedidos": [{"id_producto": linea % PRODUCTOS + 1, "cantidad": linea % 7 + 1}
+                                         for linea in range(numero_lineas)]}).encode("utf-8")
+
+
+def leer_anterior(cuerpo: bytes) -> Pedido:
+    data = json.loads(cuerpo)
+    lineas = []
+    for linea in data.get("lista_pedidos", []):
+        lineas.append(LineaPedido(producto_id=linea.get("id_producto"), cantidad=linea.get("cantidad")))
+    return Pedido(pedido_id=1, nombre_cliente=data.get("nombre_cliente"), lista_pedidos=lineas)
+
+
+def leer_nuevo(cuerpo: bytes):
+    data = ingesta.leer_json(cuerpo)
+    return ingesta.empaquetar_lineas(data.get("lista_pedidos", []))
+
+
+# Microsegundos por llamada (la mejor de 3 rondas)
+def medir(funcion, argumento, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion(argumento)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / repeticiones * 1e6
+
+
+# Ejecuta "funcion" con orjson activado o desactivado
+def con_parser(usar_orjson: bool, funcion, *argumentos):
+    ingesta.orjson = ORJSON if usar_orjson else None
+    try:
+        return funcion(*argumentos)
+    finally:
+        ingesta.orjson = ORJSON
+
+
+def main(repeticiones: int = 200):
+    cliente = api.app.test_client()
+    cliente.post("/productos/bulk", json=[{"nombre": f"Producto {numero}", "precio": numero}
+                                          for numero in range(PRODUCTOS)])
+    parsers = [("json", False)] + ([("orjson", True)] if ORJSON is not None else [])
+    if ORJSON is None:
+        print("orjson no está instalado: solo se mide el módulo json")
+
+    def peticion(cuerpo: bytes):
+        respuesta = cliente.post("/pedidos", data=cuerpo, content_type="application/json")
+        assert respuesta.status_code == 201, respuesta.get_data()
+
+    print(f"{'Lectura del body (us)':<28}{'anterior':>12}" + "".join(f"{nombre:>12}" for nombre, _ in parsers))
+    for numero_lineas in LINEAS:
+        cuerpo = cuerpo_pedido(numero_lineas)
+        veces = max(1, repeticiones * 10 // numero_lineas)
+        fila = [medir(leer_anterior, cuerpo, veces)]
+        fila += [con_parser(usar_orjson, medir, leer_nuevo, cuerpo, veces) for _, usar_orjson in parsers]
+        print(f"{f'pedido de {numero_lineas} líneas':<28}" + "".join(f"{valor:>12.1f}" for valor in fila))
+
+    print(f"\n{'POST /pedidos (us)':<28}{'':>12}" + "".join(f"{nombre:>12}" for nombre, _ in parsers))
+    for numero_lineas in LINEAS:
+        cuerpo = cuerpo_pedido(numero_lineas)
+        veces = max(1, repeticiones * 10 // numero_lineas)
+        fila = [con_parser(usar_orjson, medir, peticion, cuerpo, veces) for _, usar_orjson in parsers]
+        print(f"{f'pedido de {numero_lineas} líneas':<28}{'':>12}" + "".join(f"{valor:>12.1f}" for valor in fila))
+
+    lote = json.dumps([{"nombre": f"Producto {numero}", "precio": numero * 1.5}
+                       for numero in range(PRODUCTOS_LOTE)]).encode("utf-8")
+    fila = [con_parser(usar_orjson, medir, ingesta.leer_json, lote, 5) for _, usar_orjson in parsers]
+    print(f"\n{f'leer {PRODUCTOS_LOTE} productos (ms)':<28}{'':>12}"
+          + "".join(f"{valor / 1000:>12.2f}" for valor in fila))
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:2]))
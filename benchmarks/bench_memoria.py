@@ -0,0 +1,98 @@
+# --------------------------------------------------------------------------------
+#                                  BENCH_MEMORIA.PY
+#
+# Mide con "tracemalloc" la memoria que ocupa la lista de pedidos: bytes por
+# pedido con la representación compacta ("__slots__" y líneas en un array de
+# enteros) frente a la representación anterior (objetos con "__dict__" y una
+# lista de objetos "LineaPedido" por pedido).
+#
+# Uso:
+#   python -m benchmarks.bench_memoria [numero_pedidos] [lineas_por_pedido]
+# --------------------------------------------------------------------------------
+
+import gc
+import sys
+import tracemalloc
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, NodoPedido, Pedido
+
+
+# Representación anterior, para comparar (objetos normales, con "__dict__")
+class LineaPedidoAnterior:
+    def __init__(self, producto_id: int, cantidad: int):
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+
+
+class PedidoAnterior:
+    def __init__(self, pedido_id: int, nombre_cliente: str, lista_pedidos: list):
+        self.id = pedido_id
+        self.nombre_cliente = nombre_cliente
+        self.lista_pedidos = lista_pedidos
+
+
+class NodoPedidoAnterior:
+    def __init__(self, pedido):
+        self.pedido = pedido
+        self.siguiente = None
+
+
+def medir(crear, numero_pedidos: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    datos = crear(numero_pedidos)
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del datos
+    return actual
+
+
+def crear_compacta(numero_pedidos: int, lineas: int):
+    lista = ListaPedidos()
+    for pedido_id in range(1, numero_pedidos + 1):
+        lista.agregar_pedido(Pedido(pedido_id, "Cliente",
+                                    [LineaPedido(producto_id, 2) for producto_id in range(1, lineas + 1)]))
+    return lista
+
+
+# Solo los nodos y los pedidos (sin los índices de ListaPedidos), para comparar
+# exactamente lo mismo que ocupaba la representación anterior
+def crear_nodos_compactos(numero_pedidos: int, lineas: int):
+    cabeza = cola = None
+    for pedido_id in range(1, numero_pedidos + 1):
+        nodo = NodoPedido(Pedido(pedido_id, "Cliente",
+                                 [LineaPedido(producto_id, 2) for producto_id in range(1, lineas + 1)]))
+        if cabeza is None:
+            cabeza = nodo
+        else:
+            cola.siguiente = nodo
+        cola = nodo
+    return cabeza
+
+
+def crear_anterior(numero_pedidos: int, lineas: int):
+    cabeza = cola = None
+    for pedido_id in range(1, numero_pedidos + 1):
+        nodo = NodoPedidoAnterior(PedidoAnterior(pedido_id, "Cliente",
+                                                 [LineaPedidoAnterior(producto_id, 2)
+                                                  for producto_id in range(1, lineas + 1)]))
+        if cabeza is None:
+            cabeza = nodo
+        else:
+            cola.siguiente = nodo
+        cola = nodo
+    return cabeza
+
+
+def main(numero_pedidos: int = 1_000_000, lineas: int = 3):
+    anterior = medir(lambda n: crear_anterior(n, lineas), numero_pedidos)
+    nodos = medir(lambda n: crear_nodos_compactos(n, lineas), numero_pedidos)
+    lista = medir(lambda n: crear_compacta(n, lineas), numero_pedidos)
+    print(f"Pedidos: {numero_pedidos}, líneas por pedido: {lineas}")
+    print(f"Representación anterior (nodos y pedidos):   {anterior / numero_pedidos:8.1f} bytes/pedido")
+    print(f"Representación compacta (nodos y pedidos):   {nodos / numero_pedidos:8.1f} bytes/pedido")
+    print(f"ListaPedidos completa (con todos los índices): {lista / numero_pedidos:8.1f} bytes/pedido")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
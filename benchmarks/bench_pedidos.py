@@ -0,0 +1,70 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_PEDIDOS.PY
+#
+# Mide la latencia por operación de la lista de pedidos (añadir, buscar,
+# actualizar y eliminar) para distintos tamaños. Como todas las operaciones
+# son O(1), la latencia debe mantenerse plana al crecer el número de pedidos.
+#
+# Uso:
+#   python -m benchmarks.bench_pedidos [tamaño_máximo]
+# --------------------------------------------------------------------------------
+
+import random
+import sys
+import time
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+
+OPERACIONES_MEDIDAS = 10_000
+
+
+def crear_pedido(pedido_id: int) -> Pedido:
+    return Pedido(pedido_id, f"Cliente {pedido_id}", [LineaPedido(1, 1)])
+
+
+# Devuelve la latencia media (en microsegundos) de cada operación con "numero_pedidos" pedidos
+def medir(numero_pedidos: int) -> dict:
+    lista = ListaPedidos()
+    inicio = time.perf_counter()
+    for pedido_id in range(1, numero_pedidos + 1):
+        lista.agregar_pedido(crear_pedido(pedido_id))
+    agregar = (time.perf_counter() - inicio) / numero_pedidos
+
+    ids = [random.randint(1, numero_pedidos) for _ in range(OPERACIONES_MEDIDAS)]
+
+    inicio = time.perf_counter()
+    for pedido_id in ids:
+        lista.buscar_pedido(pedido_id)
+    buscar = (time.perf_counter() - inicio) / len(ids)
+
+    nuevo = crear_pedido(0)
+    inicio = time.perf_counter()
+    for pedido_id in ids:
+        lista.actualizar_pedido(pedido_id, nuevo)
+    actualizar = (time.perf_counter() - inicio) / len(ids)
+
+    inicio = time.perf_counter()
+    for pedido_id in ids:
+        lista.eliminar_pedido(pedido_id)
+    eliminar = (time.perf_counter() - inicio) / len(ids)
+
+    return {
+        "agregar": agregar * 1e6,
+        "buscar": buscar * 1e6,
+        "actualizar": actualizar * 1e6,
+        "eliminar": eliminar * 1e6,
+    }
+
+
+def main(tamano_maximo: int = 1_000_000):
+    print(f"{'pedidos':>10} {'agregar':>10} {'buscar':>10} {'actualizar':>11} {'eliminar':>10}   (us/op)")
+    numero_pedidos = 1_000
+    while numero_pedidos <= tamano_maximo:
+        res = medir(numero_pedidos)
+        print(f"{numero_pedidos:>10} {res['agregar']:>10.3f} {res['buscar']:>10.3f} "
+              f"{res['actualizar']:>11.3f} {res['eliminar']:>10.3f}")
+        numero_pedidos *= 10
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
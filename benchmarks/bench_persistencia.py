@@ -0,0 +1,68 @@
+# --------------------------------------------------------------------------------
+#                               BENCH_PERSISTENCIA.PY
+#
+# Mide el tiempo de arranque (carga de la snapshot + registro) en función del
+# número de productos y pedidos guardados. Para cada tamaño se genera una
+# snapshot y después un registro con 1.000 operaciones pendientes.
+#
+# Uso:
+#   python -m benchmarks.bench_persistencia [tamaño_máximo]
+# --------------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+from persistencia import FICHERO_SNAPSHOT, Persistencia
+from productos import Producto, ProductosTreeBST
+
+OPERACIONES_REGISTRO = 1_000
+
+
+def preparar(directorio: str, numero_elementos: int):
+    arbol = ProductosTreeBST()
+    lista = ListaPedidos()
+    persistencia = Persistencia(directorio, arbol, lista, operaciones_por_snapshot=10**12)
+    persistencia.cargar()
+
+    for producto_id in range(1, numero_elementos + 1):
+        producto = Producto(producto_id, f"Producto {producto_id}", 9.95)
+        arbol.insertar(producto)
+        persistencia.siguiente_id_producto = producto_id + 1
+    for pedido_id in range(1, numero_elementos + 1):
+        lista.agregar_pedido(Pedido(pedido_id, f"Cliente {pedido_id}",
+                                    [LineaPedido(1, 2), LineaPedido(pedido_id, 1)]))
+        persistencia.siguiente_id_pedido = pedido_id + 1
+    persistencia.guardar_snapshot()
+
+    # Operaciones pendientes en el registro (cola que se aplica tras la snapshot)
+    for pedido_id in range(numero_elementos + 1, numero_elementos + OPERACIONES_REGISTRO + 1):
+        pedido = Pedido(pedido_id, "Cliente", [LineaPedido(1, 1)])
+        persistencia.registrar_pedido(pedido)
+        lista.agregar_pedido(pedido)
+    persistencia.cerrar()
+
+
+def main(tamano_maximo: int = 1_000_000):
+    print(f"{'elementos':>10} {'snapshot (MB)':>14} {'arranque (s)':>13}")
+    numero_elementos = 1_000
+    while numero_elementos <= tamano_maximo:
+        with tempfile.TemporaryDirectory() as directorio:
+            preparar(directorio, numero_elementos)
+            tamano = os.path.getsize(os.path.join(directorio, FICHERO_SNAPSHOT)) / 1e6
+
+            inicio = time.perf_counter()
+            persistencia = Persistencia(directorio, ProductosTreeBST(), ListaPedidos(),
+                                        operaciones_por_snapshot=10**12)
+            persistencia.cargar()
+            tiempo = time.perf_counter() - inicio
+            persistencia.cerrar()
+
+        print(f"{numero_elementos:>10} {tamano:>14.2f} {tiempo:>13.3f}")
+        numero_elementos *= 10
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,45 @@
+# --------------------------------------------------------------------------------
+#                                 BENCH_PRODUCTOS.PY
+#
+# Carga en el árbol de productos identificadores secuenciales (igual que
+# hace POST /productos) y mide el tiempo de inserción, de búsqueda y la
+# altura final del árbol.
+#
+# Uso:
+#   python -m benchmarks.bench_productos [numero_productos]
+# --------------------------------------------------------------------------------
+
+import math
+import random
+import sys
+import time
+
+from productos import Producto, ProductosTreeBST
+
+
+def main(numero_productos: int = 1_000_000):
+    arbol = ProductosTreeBST()
+
+    inicio = time.perf_counter()
+    for producto_id in range(1, numero_productos + 1):
+        arbol.insertar(Producto(producto_id, f"Producto {producto_id}", 1.0))
+    tiempo_insercion = time.perf_counter() - inicio
+
+    ids_buscados = [random.randint(1, numero_productos) for _ in range(100_000)]
+    inicio = time.perf_counter()
+    for producto_id in ids_buscados:
+        arbol.buscar(producto_id)
+    tiempo_busqueda = time.perf_counter() - inicio
+
+    # Un árbol AVL tiene como máximo una altura de ~1.44 * log2(n + 2)
+    altura_maxima = 1.44 * math.log2(numero_productos + 2)
+
+    print(f"Productos insertados:   {numero_productos}")
+    print(f"Tiempo de inserción:    {tiempo_insercion:.2f} s "
+          f"({tiempo_insercion / numero_productos * 1e6:.2f} us/producto)")
+    print(f"Tiempo de búsqueda:     {tiempo_busqueda / len(ids_buscados) * 1e6:.2f} us/búsqueda")
+    print(f"Altura del árbol:       {arbol.altura()} (máximo AVL: {altura_maxima:.1f})")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
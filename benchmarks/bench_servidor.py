@@ -0,0 +1,166 @@
+# --------------------------------------------------------------------------------
+#                                  BENCH_SERVIDOR.PY
+#
+# Compara el servidor actual (werkzeug, un hilo por conexión) con el servidor
+# asyncio de "servidor.py" cuando hay muchos clientes concurrentes: latencia
+# p50/p99 y peticiones por segundo.
+#
+# Cada servidor se arranca en un proceso aparte con algunos productos y pedidos.
+# Los clientes se simulan con asyncio (todos en este proceso): cada uno mantiene
+# su conexión abierta entre peticiones si el servidor lo permite y, si el servidor
+# la cierra, vuelve a conectarse (ese tiempo se incluye en la latencia).
+# Mezcla de peticiones: 60% GET de un producto, 25% GET de un pedido y 15% POST
+# de un pedido nuevo.
+#
+# Uso:
+#   python -m benchmarks.bench_servidor [clientes] [peticiones_por_cliente]
+# --------------------------------------------------------------------------------
+
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUCTOS = 1000
+PEDIDOS = 1000
+
+# (nombre, argumentos de servidor.py)
+SERVIDORES = [
+    ("werkzeug (hilos)", ["--modo", "hilos"]),
+    ("asyncio + 4 hilos", ["--modo", "asyncio", "--hilos", "4"]),
+    ("asyncio + 8 hilos", ["--modo", "asyncio", "--hilos", "8"]),
+]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def arrancar(argumentos: list[str], puerto: int) -> subprocess.Popen:
+    entorno = {clave: valor for clave, valor in os.environ.items() if not clave.startswith("GESTION_PEDIDOS_")}
+    proceso = subprocess.Popen([sys.executable, "servidor.py", *argumentos, "--puerto", str(puerto)],
+                               cwd=RAIZ, env=entorno)
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.05)
+    proceso.kill()
+    raise RuntimeError("El servidor no ha arrancado")
+
+
+def cargar_datos(puerto: int):
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    cabeceras = {"Content-Type": "application/json"}
+    conexion.request("POST", "/productos/bulk", headers=cabeceras,
+                     body=json.dumps([{"nombre": f"Producto {i}", "precio": i % 50 + 1} for i in range(PRODUCTOS)]))
+    conexion.getresponse().read()
+    conexion.close()
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    conexion.request("POST", "/pedidos/batch", headers=cabeceras,
+                     body=json.dumps([{"nombre_cliente": f"Cliente {i % 100}",
+                                       "lista_pedidos": [{"id_producto": i % PRODUCTOS + 1, "cantidad": 1}]}
+                                      for i in range(PEDIDOS)]))
+    conexion.getresponse().read()
+    conexion.close()
+
+
+async def leer_respuesta(lector: asyncio.StreamReader) -> tuple[int, bool]:
+    cabecera = await lector.readuntil(b"\r\n\r\n")
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    version, codigo = lineas[0].split(" ")[:2]
+    cabeceras = {}
+    for linea in lineas[1:]:
+        if linea:
+            nombre, _, valor = linea.partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip().lower()
+    cerrar = cabeceras.get("connection") == "close" or version == "HTTP/1.0"
+    if "content-length" in cabeceras:
+        await lector.readexactly(int(cabeceras["content-length"]))
+    elif cabeceras.get("transfer-encoding") == "chunked":
+        while True:
+            tamaño = int((await lector.readuntil(b"\r\n")).split(b";")[0], 16)
+            await lector.readexactly(tamaño + 2)
+            if tamaño == 0:
+                break
+    else:
+        await lector.read()
+        cerrar = True
+    return int(codigo), cerrar
+
+
+async def cliente(puerto: int, peticiones: int, latencias: list, errores: list, aleatorio: random.Random):
+    lector = escritor = None
+    for _ in range(peticiones):
+        operacion = aleatorio.random()
+        if operacion < 0.6:
+            peticion = f"GET /productos/{aleatorio.randint(1, PRODUCTOS)}/ HTTP/1.1\r\nHost: x\r\n\r\n".encode()
+        elif operacion < 0.85:
+            peticion = f"GET /pedidos/{aleatorio.randint(1, PEDIDOS)}/ HTTP/1.1\r\nHost: x\r\n\r\n".encode()
+        else:
+            cuerpo = json.dumps({"nombre_cliente": "Cliente",
+                                 "lista_pedidos": [{"id_producto": aleatorio.randint(1, PRODUCTOS),
+                                                    "cantidad": 1}]}).encode()
+            peticion = (f"POST /pedidos HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(cuerpo)}\r\n\r\n").encode() + cuerpo
+
+        inicio = time.perf_counter()
+        try:
+            if escritor is None:
+                lector, escritor = await asyncio.open_connection("127.0.0.1", puerto, limit=1 << 20)
+            escritor.write(peticion)
+            codigo, cerrar = await leer_respuesta(lector)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            errores.append(repr(error))
+            codigo, cerrar = None, True
+        latencias.append(time.perf_counter() - inicio)
+        if codigo is not None and codigo >= 400:
+            errores.append(codigo)
+        if cerrar:
+            escritor.close()
+            lector = escritor = None
+    if escritor is not None:
+        escritor.close()
+
+
+async def carga(puerto: int, clientes: int, peticiones: int):
+    latencias = []
+    errores = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(puerto, peticiones, latencias, errores, random.Random(numero))
+                           for numero in range(clientes)))
+    return time.perf_counter() - inicio, latencias, errores
+
+
+def percentil(valores: list[float], p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main(clientes: int = 200, peticiones: int = 50):
+    print(f"Clientes concurrentes: {clientes}, peticiones por cliente: {peticiones}")
+    print(f"{'Servidor':<20}{'peticiones/s':>14}{'p50 (ms)':>11}{'p99 (ms)':>11}{'errores':>9}")
+    for nombre, argumentos in SERVIDORES:
+        puerto = puerto_libre()
+        proceso = arrancar(argumentos, puerto)
+        try:
+            cargar_datos(puerto)
+            segundos, latencias, errores = asyncio.run(carga(puerto, clientes, peticiones))
+        finally:
+            proceso.terminate()
+            proceso.wait()
+        print(f"{nombre:<20}{len(latencias) / segundos:>14.0f}{percentil(latencias, 0.5) * 1e3:>11.2f}"
+              f"{percentil(latencias, 0.99) * 1e3:>11.2f}{len(errores):>9}")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
@@ -0,0 +1,126 @@
+# --------------------------------------------------------------------------------
+#                                  BENCH_WORKERS.PY
+#
+# Mide el rendimiento (peticiones por segundo) de la API con 1, 2, 4 y 8
+# procesos worker que comparten una misma base de datos SQLite.
+#
+# Cada worker es un proceso con su propio servidor HTTP en un puerto distinto,
+# y los clientes (también procesos) reparten sus peticiones entre todos ellos,
+# como haría un balanceador de carga. Cada cliente crea pedidos con productos
+# creados por otros workers, así que el benchmark también comprueba que todos
+# los procesos ven los mismos datos.
+#
+# Uso:
+#   python -m benchmarks.bench_workers [peticiones_por_cliente] [clientes]
+# --------------------------------------------------------------------------------
+
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+WORKERS = [1, 2, 4, 8]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Proceso worker: importa la aplicación con el almacenamiento SQLite y la sirve
+def worker(ruta_sqlite: str, puerto: int):
+    import logging
+    os.environ["GESTION_PEDIDOS_SQLITE"] = ruta_sqlite
+    from werkzeug.serving import make_server
+    import app as api
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", puerto, api.app, threaded=True).serve_forever()
+
+
+def peticion(conexion: http.client.HTTPConnection, metodo: str, ruta: str, body=None):
+    cabeceras = {"Content-Type": "application/json"} if body is not None else {}
+    conexion.request(metodo, ruta, body=json.dumps(body) if body is not None else None, headers=cabeceras)
+    respuesta = conexion.getresponse()
+    return respuesta.status, json.loads(respuesta.read() or b"null")
+
+
+# Proceso cliente: mezcla de lecturas y escrituras repartidas entre los workers
+def cliente(puertos: list[int], peticiones: int, producto_inicial: int) -> int:
+    conexiones = [http.client.HTTPConnection("127.0.0.1", puerto) for puerto in puertos]
+    productos = [producto_inicial]
+    pedidos = []
+    for numero in range(peticiones):
+        conexion = conexiones[numero % len(conexiones)]
+        operacion = random.random()
+        if operacion < 0.1:
+            _, res = peticion(conexion, "POST", "/productos", {"nombre": "Producto", "precio": 1})
+            productos.append(res["producto"]["id"])
+        elif operacion < 0.3:
+            status, res = peticion(conexion, "POST", "/pedidos", {
+                "nombre_cliente": "Cliente",
+                "lista_pedidos": [{"id_producto": random.choice(productos), "cantidad": 1}]})
+            assert status == 201, res
+            pedidos.append(res["pedido"]["pedido_id"])
+        elif operacion < 0.6 or not pedidos:
+            status, _ = peticion(conexion, "GET", f"/productos/{random.choice(productos)}/")
+            assert status == 200
+        else:
+            status, _ = peticion(conexion, "GET", f"/pedidos/{random.choice(pedidos)}/")
+            assert status == 200
+    for conexion in conexiones:
+        conexion.close()
+    return peticiones
+
+
+def esperar_servidor(puerto: int):
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"El worker del puerto {puerto} no ha arrancado")
+
+
+def medir(numero_workers: int, peticiones: int, clientes: int) -> float:
+    contexto = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_sqlite = os.path.join(directorio, "datos.sqlite")
+        puertos = [puerto_libre() for _ in range(numero_workers)]
+        procesos = [contexto.Process(target=worker, args=(ruta_sqlite, puerto), daemon=True) for puerto in puertos]
+        for proceso in procesos:
+            proceso.start()
+        try:
+            for puerto in puertos:
+                esperar_servidor(puerto)
+
+            conexion = http.client.HTTPConnection("127.0.0.1", puertos[0])
+            _, res = peticion(conexion, "POST", "/productos", {"nombre": "Inicial", "precio": 1})
+            conexion.close()
+
+            with contexto.Pool(clientes) as pool:
+                inicio = time.perf_counter()
+                total = sum(pool.starmap(cliente, [(puertos, peticiones, res["producto"]["id"])] * clientes))
+                duracion = time.perf_counter() - inicio
+        finally:
+            for proceso in procesos:
+                proceso.terminate()
+                proceso.join()
+    return total / duracion
+
+
+def main(peticiones: int = 500, clientes: int = 8):
+    print(f"CPUs: {os.cpu_count()}, clientes: {clientes}, peticiones por cliente: {peticiones}")
+    print(f"{'workers':>8} {'peticiones/s':>13}")
+    for numero_workers in WORKERS:
+        print(f"{numero_workers:>8} {medir(numero_workers, peticiones, clientes):>13.0f}")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
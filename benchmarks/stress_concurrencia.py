@@ -0,0 +1,153 @@
+# --------------------------------------------------------------------------------
+#                               STRESS_CONCURRENCIA.PY
+#
+# Prueba de estrés: arranca la API en un servidor local con hilos y lanza
+# muchos clientes concurrentes que crean productos y pedidos, los consultan,
+# los actualizan y los eliminan. Al terminar se comprueba que:
+#
+# - No se ha repetido ningún identificador de producto ni de pedido.
+# - El árbol de productos sigue equilibrado y contiene todos los productos.
+# - La lista de pedidos es coherente (enlaces en los dos sentidos, índice y
+#   orden creciente de identificadores) y contiene los pedidos no eliminados.
+#
+# Uso:
+#   python -m benchmarks.stress_concurrencia [clientes] [operaciones_por_cliente]
+# --------------------------------------------------------------------------------
+
+import http.client
+import json
+import logging
+import random
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import app as api
+
+
+def peticion(conexion: http.client.HTTPConnection, metodo: str, ruta: str, body=None):
+    cabeceras = {"Content-Type": "application/json"} if body is not None else {}
+    conexion.request(metodo, ruta, body=json.dumps(body) if body is not None else None, headers=cabeceras)
+    respuesta = conexion.getresponse()
+    return respuesta.status, json.loads(respuesta.read() or b"null")
+
+
+def cliente(puerto: int, operaciones: int, resultado: dict, cerrojo: threading.Lock):
+    try:
+        ejecutar_cliente(puerto, operaciones, resultado, cerrojo)
+    except Exception as error:
+        # Los errores de los hilos no se propagan: se guardan para comprobarlos al final
+        with cerrojo:
+            resultado["errores"].append(repr(error))
+
+
+def ejecutar_cliente(puerto: int, operaciones: int, resultado: dict, cerrojo: threading.Lock):
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    productos, pedidos, eliminados = [], [], []
+    # Cada cliente empieza creando su propio producto, para poder crear pedidos
+    _, res = peticion(conexion, "POST", "/productos", {"nombre": "Producto", "precio": 1})
+    productos.append(res["producto"]["id"])
+
+    for _ in range(operaciones):
+        operacion = random.random()
+        if operacion < 0.2:
+            status, res = peticion(conexion, "POST", "/productos", {"nombre": "Producto", "precio": 2})
+            productos.append(res["producto"]["id"])
+        elif operacion < 0.45:
+            status, res = peticion(conexion, "POST", "/pedidos", {
+                "nombre_cliente": "Cliente",
+                "lista_pedidos": [{"id_producto": random.choice(productos), "cantidad": 1}]})
+            pedidos.append(res["pedido"]["pedido_id"])
+        elif operacion < 0.55 and pedidos:
+            peticion(conexion, "PUT", f"/pedidos/{random.choice(pedidos)}/", {
+                "nombre_cliente": "Otro cliente",
+                "lista_pedidos": [{"id_producto": random.choice(productos), "cantidad": 3}]})
+        elif operacion < 0.65 and pedidos:
+            pedido_id = pedidos.pop(random.randrange(len(pedidos)))
+            status, _ = peticion(conexion, "DELETE", f"/pedidos/{pedido_id}/")
+            assert status == 200, f"No se ha podido eliminar el pedido {pedido_id}"
+            eliminados.append(pedido_id)
+        elif operacion < 0.8:
+            peticion(conexion, "GET", f"/productos/{random.choice(productos)}/")
+        elif operacion < 0.9 and pedidos:
+            status, _ = peticion(conexion, "GET", f"/pedidos/{random.choice(pedidos)}/")
+            assert status == 200
+        else:
+            peticion(conexion, "GET", "/pedidos?limit=20")
+
+    conexion.close()
+    with cerrojo:
+        resultado["productos"].extend(productos)
+        resultado["pedidos"].extend(pedidos)
+        resultado["eliminados"].extend(eliminados)
+
+
+def comprobar_arbol(nodo) -> int:
+    if nodo is None:
+        return 0
+    izquierda = comprobar_arbol(nodo.left)
+    derecha = comprobar_arbol(nodo.right)
+    assert abs(izquierda - derecha) <= 1, "El árbol de productos no está equilibrado"
+    assert nodo.altura == 1 + max(izquierda, derecha), "Altura incorrecta en el árbol de productos"
+    return nodo.altura
+
+
+def comprobar_invariantes(resultado: dict):
+    assert not resultado["errores"], f"Errores en los clientes: {resultado['errores'][:5]}"
+    productos = resultado["productos"]
+    assert len(productos) == len(set(productos)), "Identificadores de producto repetidos"
+    ids_arbol = [producto.id for producto in api.arbol_productos.recorrido_inorder()]
+    assert ids_arbol == sorted(productos), "El árbol no contiene exactamente los productos creados"
+    assert len(api.arbol_productos) == len(productos)
+    comprobar_arbol(api.arbol_productos.root)
+
+    creados = resultado["pedidos"] + resultado["eliminados"]
+    assert len(creados) == len(set(creados)), "Identificadores de pedido repetidos"
+
+    lista = api.lista_pedidos
+    hacia_delante = []
+    nodo = lista.cabeza
+    while nodo is not None:
+        hacia_delante.append(nodo.pedido.id)
+        nodo = nodo.siguiente
+    hacia_atras = []
+    nodo = lista.cola
+    while nodo is not None:
+        hacia_atras.append(nodo.pedido.id)
+        nodo = nodo.anterior
+    assert hacia_delante == hacia_atras[::-1], "Los enlaces de la lista de pedidos no son coherentes"
+    assert hacia_delante == sorted(resultado["pedidos"]), "La lista no contiene los pedidos esperados"
+    assert set(lista.indice) == set(hacia_delante), "El índice de pedidos no coincide con la lista"
+
+
+def main(clientes: int = 32, operaciones: int = 300):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    servidor = make_server("127.0.0.1", 0, api.app, threaded=True)
+    hilo_servidor = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo_servidor.start()
+
+    resultado = {"productos": [], "pedidos": [], "eliminados": [], "errores": []}
+    cerrojo = threading.Lock()
+    hilos = [threading.Thread(target=cliente, args=(servidor.port, operaciones, resultado, cerrojo))
+             for _ in range(clientes)]
+
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    servidor.shutdown()
+
+    comprobar_invariantes(resultado)
+    print(f"Clientes: {clientes}, operaciones: {clientes * operaciones} en {duracion:.2f} s "
+          f"({clientes * operaciones / duracion:.0f} op/s)")
+    print(f"Productos: {len(resultado['productos'])}, pedidos: {len(resultado['pedidos'])}, "
+          f"eliminados: {len(resultado['eliminados'])}")
+    print("Invariantes correctos.")
+
+
+if __name__ == '__main__':
+    main(*(int(argumento) for argumento in sys.argv[1:3]))
@@ -0,0 +1,339 @@
+# --------------------------------------------------------------------------------
+#                                      SUITE.PY
+#
+# Batería de benchmarks de todos los endpoints de la API, para comprobar si un
+# cambio en ListaPedidos o en ProductosTreeBST mejora o empeora el rendimiento.
+#
+# - Transportes: el cliente de pruebas de Flask ("cliente", sin red) y un servidor
+#   HTTP local real ("http", arrancado con "servidor.py").
+# - Para cada tamaño (número de productos y de pedidos cargados antes de medir,
+#   de 1.000 a 1.000.000) se mide cada endpoint por separado y varias mezclas de
+#   operaciones (lectura, escritura y mixta).
+# - Cada combinación de transporte y tamaño se ejecuta en un proceso nuevo, con
+#   los datos vacíos, y se guarda su memoria máxima (RSS).
+# - Los resultados (operaciones/s, p50/p95/p99 y RSS máximo) se guardan en JSON.
+# - Modo regresión: con "--comparar base.json" se comparan los resultados con los
+#   de una ejecución anterior y el programa termina con código 1 si alguna medida
+#   empeora más que el umbral indicado.
+#
+# Uso:
+#   python -m benchmarks.suite [--tamaños 1000,10000,100000] [--transportes cliente,http]
+#                              [--operaciones 2000] [--escenarios ...] [--salida resultados.json]
+#                              [--comparar base.json] [--umbral 0.25]
+# --------------------------------------------------------------------------------
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+from benchmarks.bench_servidor import arrancar, puerto_libre
+
+LOTE_CARGA = 10_000 # Productos/pedidos por petición al cargar los datos iniciales
+
+
+# ------------------------------------------------------------
+#                         CLIENTES
+# Los dos transportes tienen la misma interfaz: peticion()
+# devuelve el código de estado de la respuesta.
+# ------------------------------------------------------------
+class ClientePruebas:
+    def __init__(self):
+        import app as api
+        self.cliente = api.app.test_client()
+
+    def peticion(self, metodo: str, ruta: str, cuerpo=None) -> int:
+        respuesta = self.cliente.open(ruta, method=metodo, json=cuerpo)
+        respuesta.get_data()
+        return respuesta.status_code
+
+    def rss_maximo(self) -> float:
+        # En Linux "ru_maxrss" está en KiB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def cerrar(self):
+        pass
+
+
+class ClienteHTTP:
+    def __init__(self, servidor: str):
+        self.puerto = puerto_libre()
+        self.proceso = arrancar(["--modo", servidor], self.puerto)
+        self.conexion = http.client.HTTPConnection("127.0.0.1", self.puerto)
+
+    def peticion(self, metodo: str, ruta: str, cuerpo=None) -> int:
+        if cuerpo is None:
+            self.conexion.request(metodo, ruta)
+        else:
+            self.conexion.request(metodo, ruta, body=json.dumps(cuerpo),
+                                  headers={"Content-Type": "application/json"})
+        respuesta = self.conexion.getresponse()
+        respuesta.read()
+        return respuesta.status
+
+    # Memoria máxima del proceso del servidor (solo en Linux)
+    def rss_maximo(self) -> float | None:
+        try:
+            with open(f"/proc/{self.proceso.pid}/status") as estado:
+                for linea in estado:
+                    if linea.startswith("VmHWM:"):
+                        return int(linea.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def cerrar(self):
+        self.conexion.close()
+        self.proceso.terminate()
+        self.proceso.wait()
+
+
+# ------------------------------------------------------------
+#                        OPERACIONES
+# Cada operación recibe el estado de la prueba (identificadores
+# existentes y generador aleatorio) y devuelve (método, ruta, body).
+# ------------------------------------------------------------
+class Estado:
+    def __init__(self, numero_productos: int, numero_pedidos: int, semilla: int = 1):
+        self.aleatorio = random.Random(semilla)
+        self.ultimo_producto = numero_productos
+        self.ultimo_pedido = numero_pedidos
+        self.pedidos = list(range(1, numero_pedidos + 1)) # Pedidos que no se han eliminado
+
+    def producto(self) -> int:
+        return self.aleatorio.randint(1, self.ultimo_producto)
+
+    def pedido(self) -> int:
+        return self.aleatorio.choice(self.pedidos)
+
+    def lineas(self) -> list[dict]:
+        return [{"id_producto": self.producto(), "cantidad": self.aleatorio.randint(1, 5)}
+                for _ in range(self.aleatorio.randint(1, 3))]
+
+    # Se quita un pedido al azar de la lista de pedidos existentes
+    def quitar_pedido(self) -> int:
+        posicion = self.aleatorio.randrange(len(self.pedidos))
+        self.pedidos[posicion], self.pedidos[-1] = self.pedidos[-1], self.pedidos[posicion]
+        return self.pedidos.pop()
+
+
+def _crear_producto(estado: Estado):
+    return "POST", "/productos", {"nombre": "Producto", "precio": estado.aleatorio.randint(1, 100)}
+
+
+def _crear_pedido(estado: Estado):
+    return "POST", "/pedidos", {"nombre_cliente": f"Cliente {estado.aleatorio.randrange(1000)}",
+                                "lista_pedidos": estado.lineas()}
+
+
+def _actualizar_pedido(estado: Estado):
+    return "PUT", f"/pedidos/{estado.pedido()}/", {"nombre_cliente": "Cliente",
+                                                   "lista_pedidos": estado.lineas()}
+
+
+OPERACIONES = {
+    "crear_producto": _crear_producto,
+    "ver_producto": lambda estado: ("GET", f"/productos/{estado.producto()}/", None),
+    "listar_productos": lambda estado: ("GET", f"/productos?desde={estado.producto()}&limit=50", None),
+    "crear_pedido": _crear_pedido,
+    "ver_pedido": lambda estado: ("GET", f"/pedidos/{estado.pedido()}/", None),
+    "actualizar_pedido": _actualizar_pedido,
+    "listar_pedidos": lambda estado: ("GET", f"/pedidos?after={estado.pedido()}&limit=50", None),
+    "total_pedido": lambda estado: ("GET", f"/pedidos/{estado.pedido()}/total", None),
+    "ingresos_productos": lambda estado: ("GET", "/ingresos/productos?top=10", None),
+    "eliminar_pedido": lambda estado: ("DELETE", f"/pedidos/{estado.quitar_pedido()}/", None),
+}
+
+# Mezclas de operaciones: operación --> peso
+MEZCLAS = {
+    "mezcla_lectura": {"ver_producto": 50, "ver_pedido": 30, "listar_productos": 10, "listar_pedidos": 10},
+    "mezcla_escritura": {"crear_producto": 20, "crear_pedido": 40, "actualizar_pedido": 30, "eliminar_pedido": 10},
+    "mezcla_mixta": {"ver_producto": 35, "ver_pedido": 25, "listar_pedidos": 5, "total_pedido": 5,
+                     "crear_producto": 5, "crear_pedido": 15, "actualizar_pedido": 8, "eliminar_pedido": 2},
+}
+
+USAN_PEDIDO = {"ver_pedido", "actualizar_pedido", "listar_pedidos", "total_pedido", "eliminar_pedido"}
+
+# Orden de los escenarios: la eliminación va la última porque reduce el número de pedidos
+ESCENARIOS = [nombre for nombre in OPERACIONES if nombre != "eliminar_pedido"] + list(MEZCLAS) + ["eliminar_pedido"]
+
+
+# ------------------------------------------------------------
+#                          MEDICIÓN
+# ------------------------------------------------------------
+def cargar_datos(cliente, numero_productos: int, numero_pedidos: int, estado: Estado):
+    for inicio in range(0, numero_productos, LOTE_CARGA):
+        cantidad = min(LOTE_CARGA, numero_productos - inicio)
+        codigo = cliente.peticion("POST", "/productos/bulk",
+                                  [{"nombre": f"Producto {inicio + i}", "precio": estado.aleatorio.randint(1, 100)}
+                                   for i in range(cantidad)])
+        assert codigo == 201, codigo
+    for inicio in range(0, numero_pedidos, LOTE_CARGA):
+        cantidad = min(LOTE_CARGA, numero_pedidos - inicio)
+        codigo = cliente.peticion("POST", "/pedidos/batch",
+                                  [{"nombre_cliente": f"Cliente {estado.aleatorio.randrange(1000)}",
+                                    "lista_pedidos": estado.lineas()} for _ in range(cantidad)])
+        assert codigo == 201, codigo
+
+
+def percentil(valores: list[float], p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def medir_escenario(cliente, estado: Estado, escenario: str, operaciones: int) -> dict:
+    if escenario in MEZCLAS:
+        nombres = list(MEZCLAS[escenario])
+        elegidas = estado.aleatorio.choices(nombres, weights=list(MEZCLAS[escenario].values()), k=operaciones)
+    else:
+        elegidas = [escenario] * operaciones
+
+    latencias = []
+    errores = 0
+    inicio_total = time.perf_counter()
+    for nombre in elegidas:
+        # Si ya no quedan pedidos, se saltan las operaciones que usan un pedido existente
+        if nombre in USAN_PEDIDO and not estado.pedidos:
+            continue
+        metodo, ruta, cuerpo = OPERACIONES[nombre](estado)
+        inicio = time.perf_counter()
+        codigo = cliente.peticion(metodo, ruta, cuerpo)
+        latencias.append(time.perf_counter() - inicio)
+        if codigo >= 400:
+            errores += 1
+        elif nombre == "crear_producto":
+            estado.ultimo_producto += 1
+        elif nombre == "crear_pedido":
+            # Los identificadores se asignan en orden (las peticiones se hacen de una en una)
+            estado.ultimo_pedido += 1
+            estado.pedidos.append(estado.ultimo_pedido)
+    segundos = time.perf_counter() - inicio_total
+
+    latencias.sort()
+    if not latencias:
+        return {"operaciones": 0, "errores": errores}
+    return {
+        "operaciones": len(latencias),
+        "ops_s": round(len(latencias) / segundos, 1),
+        "p50_ms": round(percentil(latencias, 0.50) * 1e3, 4),
+        "p95_ms": round(percentil(latencias, 0.95) * 1e3, 4),
+        "p99_ms": round(percentil(latencias, 0.99) * 1e3, 4),
+        "errores": errores,
+    }
+
+
+# Se ejecuta en un proceso nuevo para cada transporte y tamaño
+def ejecutar(transporte: str, tamaño: int, escenarios: list[str], operaciones: int, servidor: str) -> dict:
+    for clave in [clave for clave in os.environ if clave.startswith("GESTION_PEDIDOS_")]:
+        del os.environ[clave]
+    cliente = ClientePruebas() if transporte == "cliente" else ClienteHTTP(servidor)
+    try:
+        estado = Estado(tamaño, tamaño)
+        inicio = time.perf_counter()
+        cargar_datos(cliente, tamaño, tamaño, estado)
+        carga = time.perf_counter() - inicio
+        resultados = {escenario: medir_escenario(cliente, estado, escenario, operaciones)
+                      for escenario in escenarios}
+        return {"carga_s": round(carga, 3), "rss_max_mb": cliente.rss_maximo(), "escenarios": resultados}
+    finally:
+        cliente.cerrar()
+
+
+# ------------------------------------------------------------
+#                         REGRESIÓN
+# Una medida empeora si las operaciones/s bajan o el p99 sube
+# más que el umbral (en tanto por uno) respecto a la base.
+# ------------------------------------------------------------
+def comparar(resultados: dict, base: dict, umbral: float) -> list[str]:
+    regresiones = []
+    for clave, actual in resultados["resultados"].items():
+        anterior = base.get("resultados", {}).get(clave)
+        if anterior is None:
+            continue
+        for escenario, medida in actual["escenarios"].items():
+            medida_base = anterior["escenarios"].get(escenario)
+            if medida_base is None or "ops_s" not in medida or "ops_s" not in medida_base:
+                continue
+            if medida["ops_s"] < medida_base["ops_s"] * (1 - umbral):
+                regresiones.append(f"{clave}/{escenario}: {medida['ops_s']} ops/s "
+                                   f"(base {medida_base['ops_s']} ops/s)")
+            if medida["p99_ms"] > medida_base["p99_ms"] * (1 + umbral):
+                regresiones.append(f"{clave}/{escenario}: p99 {medida['p99_ms']} ms "
+                                   f"(base {medida_base['p99_ms']} ms)")
+        if actual.get("rss_max_mb") and anterior.get("rss_max_mb") \
+                and actual["rss_max_mb"] > anterior["rss_max_mb"] * (1 + umbral):
+            regresiones.append(f"{clave}: RSS máximo {actual['rss_max_mb']:.1f} MiB "
+                               f"(base {anterior['rss_max_mb']:.1f} MiB)")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de todos los endpoints de la API")
+    parser.add_argument("--tamaños", default="1000,10000,100000",
+                        help="números de productos y pedidos cargados, separados por comas")
+    parser.add_argument("--transportes", default="cliente,http", help="cliente, http o ambos")
+    parser.add_argument("--servidor", choices=["asyncio", "hilos"], default="asyncio",
+                        help="modo de servidor.py para el transporte http")
+    parser.add_argument("--operaciones", type=int, default=2000, help="operaciones medidas por escenario")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS),
+                        help=f"escenarios separados por comas (por defecto, todos: {', '.join(ESCENARIOS)})")
+    parser.add_argument("--salida", default="resultados_benchmarks.json")
+    parser.add_argument("--comparar", help="fichero JSON de una ejecución anterior (modo regresión)")
+    parser.add_argument("--umbral", type=float, default=0.25,
+                        help="empeoramiento máximo permitido en modo regresión (0.25 = 25%%)")
+    argumentos = parser.parse_args()
+
+    tamaños = [int(tamaño) for tamaño in argumentos.tamaños.split(",")]
+    transportes = argumentos.transportes.split(",")
+    escenarios = argumentos.escenarios.split(",")
+    for escenario in escenarios:
+        if escenario not in OPERACIONES and escenario not in MEZCLAS:
+            parser.error(f"escenario desconocido: {escenario}")
+
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "configuracion": {"operaciones": argumentos.operaciones, "servidor": argumentos.servidor},
+        "resultados": {},
+    }
+    contexto = multiprocessing.get_context("spawn")
+    for transporte in transportes:
+        for tamaño in tamaños:
+            with contexto.Pool(1) as proceso:
+                resultado = proceso.apply(ejecutar, (transporte, tamaño, escenarios,
+                                                     argumentos.operaciones, argumentos.servidor))
+            resultados["resultados"][f"{transporte}/{tamaño}"] = resultado
+            rss = resultado["rss_max_mb"]
+            print(f"\n{transporte} - {tamaño} productos y pedidos (carga {resultado['carga_s']} s, "
+                  f"RSS máximo {rss:.1f} MiB)" if rss is not None else
+                  f"\n{transporte} - {tamaño} productos y pedidos (carga {resultado['carga_s']} s)")
+            print(f"  {'escenario':<20}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>9}")
+            for escenario, medida in resultado["escenarios"].items():
+                if "ops_s" in medida:
+                    print(f"  {escenario:<20}{medida['ops_s']:>10.0f}{medida['p50_ms']:>10.3f}"
+                          f"{medida['p95_ms']:>10.3f}{medida['p99_ms']:>10.3f}{medida['errores']:>9}")
+
+    with open(argumentos.salida, "w", encoding="utf-8") as fichero:
+        json.dump(resultados, fichero, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {argumentos.salida}")
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as fichero:
+            base = json.load(fichero)
+        regresiones = comparar(resultados, base, argumentos.umbral)
+        if regresiones:
+            print(f"\nREGRESIONES (umbral {argumentos.umbral:.0%}):")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            sys.exit(1)
+        print(f"\nSin regresiones respecto a {argumentos.comparar} (umbral {argumentos.umbral:.0%}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# --------------------------------------------------------------------------------
+#                                       CACHE.PY
+#
+# Caché de respuestas ya serializadas (bytes JSON) para los endpoints GET.
+#
+# - Cada entrada guarda el body codificado y su ETag, para poder responder
+#   "304 Not Modified" si el cliente ya tiene esa versión (If-None-Match).
+# - El tamaño está limitado en bytes; cuando se supera, se expulsan las
+#   entradas usadas hace más tiempo (LRU).
+# - Las entradas de un producto o de un pedido se invalidan cuando se
+#   modifica ese producto o pedido. Los listados se invalidan de golpe con
+#   una "generación": la clave de cada página incluye el número de generación
+#   y, al modificar los datos, se pasa a la siguiente generación (las páginas
+#   antiguas dejan de usarse y acaban expulsadas por el LRU).
+# --------------------------------------------------------------------------------
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class EntradaCache:
+    __slots__ = ("cuerpo", "etag")
+
+    def __init__(self, cuerpo: bytes):
+        self.cuerpo = cuerpo
+        self.etag = hashlib.blake2b(cuerpo, digest_size=16).hexdigest()
+
+
+class CacheRespuestas:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes # Con 0 la caché queda desactivada (solo se calculan los ETag)
+        self.bytes = 0
+        self._entradas = OrderedDict() # clave --> EntradaCache (de la menos a la más usada)
+        self._generaciones = {} # nombre del listado --> número de generación
+        self._cerrojo = threading.Lock()
+
+        # Contadores
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.max_bytes > 0
+
+    # Devuelve la entrada guardada con esa clave (o None) y la marca como la más usada
+    def obtener(self, clave) -> EntradaCache | None:
+        if not self.activa:
+            return None
+        with self._cerrojo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    # Guarda un body ya serializado y devuelve su entrada (con el ETag calculado)
+    def guardar(self, clave, cuerpo: bytes) -> EntradaCache:
+        entrada = EntradaCache(cuerpo)
+        # Las respuestas más grandes que la propia caché no se guardan
+        if not self.activa or len(cuerpo) > self.max_bytes:
+            return entrada
+
+        with self._cerrojo:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior.cuerpo)
+            self._entradas[clave] = entrada
+            self.bytes += len(cuerpo)
+
+            # Se expulsan las entradas menos usadas hasta volver al tamaño máximo
+            while self.bytes > self.max_bytes:
+                _, expulsada = self._entradas.popitem(last=False)
+                self.bytes -= len(expulsada.cuerpo)
+                self.expulsiones += 1
+        return entrada
+
+    def invalidar(self, clave):
+        with self._cerrojo:
+            entrada = self._entradas.pop(clave, None)
+            if entrada is not None:
+                self.bytes -= len(entrada.cuerpo)
+                self.invalidaciones += 1
+
+    # Generación actual de un listado (forma parte de la clave de sus páginas)
+    def generacion(self, nombre: str) -> int:
+        return self._generaciones.get(nombre, 0)
+
+    # Invalida todas las páginas de un listado pasando a la siguiente generación
+    def nueva_generacion(self, nombre: str):
+        with self._cerrojo:
+            self._generaciones[nombre] = self._generaciones.get(nombre, 0) + 1
+            self.invalidaciones += 1
+
+    def estadisticas(self) -> dict:
+        with self._cerrojo:
+            consultas = self.aciertos + self.fallos
+            return {
+                "activa": self.activa,
+                "entradas": len(self._entradas),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones,
+            }
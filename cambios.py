@@ -0,0 +1,280 @@
+# --------------------------------------------------------------------------------
+#                                     CAMBIOS.PY
+#
+# Registro de cambios (change feed) de los pedidos y los productos, para que otros
+# sistemas (stock, facturación...) reciban solo lo que ha cambiado en lugar de
+# descargar y comparar el listado completo (endpoint GET /cambios).
+#
+# - Cada cambio (pedido creado, actualizado o eliminado; producto creado) recibe una
+#   secuencia. El cliente guarda la última que ha recibido y pide los siguientes
+#   cambios con "desde".
+# - Los cambios se guardan en un buffer circular de tamaño fijo: cuando está lleno,
+#   se descartan los más antiguos. Si un cliente pide cambios que ya se han
+#   descartado, se le avisa para que vuelva a descargar el listado completo.
+# - La secuencia es un texto "<época>-<número>" que el cliente no debe interpretar:
+#   la época se elige al azar en cada arranque y el número es un contador que empieza
+#   en 0. Los cambios se guardan en memoria y se pierden al reiniciar: una secuencia
+#   de otro arranque se detecta por la época (sin depender del reloj del sistema) y el
+#   cliente recibe el mismo aviso.
+# - Los cambios se generan "envolviendo" los métodos del árbol de productos y de
+#   la lista de pedidos (como las métricas, ver "metricas.py").
+# - Los clientes pueden esperar a que haya cambios nuevos: con hilos
+#   ("esperar") o desde el bucle de eventos de asyncio ("esperar_async").
+# --------------------------------------------------------------------------------
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+LIMITE = 1000 # Cambios que se devuelven como mucho en cada respuesta (por defecto)
+LIMITE_MAXIMO = 10_000
+ESPERA = 30 # Segundos que espera una petición si no hay cambios nuevos (por defecto)
+ESPERA_MAXIMA = 60
+SSE_LATIDO = 15 # Segundos entre comentarios vacíos de un stream SSE sin cambios
+SSE_DURACION = 300 # Segundos que dura como mucho un stream SSE (el navegador se vuelve a conectar)
+
+# Tipos de cambio
+PEDIDO_CREADO = "pedido_creado"
+PEDIDO_ACTUALIZADO = "pedido_actualizado"
+PEDIDO_ELIMINADO = "pedido_eliminado"
+PRODUCTO_CREADO = "producto_creado"
+
+
+# "desde": 0 (el cambio más antiguo que se conserva) o una secuencia "<época>-<número>"
+_DESDE = re.compile(r"0|[0-9a-f]+-[0-9]+")
+
+
+class Cambio:
+    __slots__ = ("numero", "secuencia", "tipo", "entidad_id", "datos", "instante", "_json")
+
+    def __init__(self, numero: int, secuencia: str, tipo: str, entidad_id: int, datos: dict | None,
+                 instante: float):
+        self.numero = numero # Posición del cambio en este arranque
+        self.secuencia = secuencia # Lo que ve el cliente: "<época>-<número>"
+        self.tipo = tipo
+        self.entidad_id = entidad_id # Identificador del pedido o del producto
+        self.datos = datos # Pedido o producto después del cambio (None si se ha eliminado)
+        self.instante = instante
+        self._json = None
+
+    def to_dict(self):
+        return {
+            "secuencia": self.secuencia,
+            "tipo": self.tipo,
+            "id": self.entidad_id,
+            "datos": self.datos,
+            "instante": self.instante
+        }
+
+    # El JSON de cada cambio se genera una sola vez, aunque lo lean muchos clientes
+    def json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), ensure_ascii=False)
+        return self._json
+
+
+class RegistroCambios:
+    def __init__(self, capacidad: int = 10_000):
+        self.capacidad = capacidad # Con 0 se desactiva (no se guarda ningún cambio)
+        self.epoca = os.urandom(4).hex() # Distinta en cada arranque
+        self.numero = 0 # Número del último cambio
+        self.ultima = self.secuencia(0) # Secuencia del último cambio
+        self._cambios = deque(maxlen=max(1, capacidad))
+        self._condicion = threading.Condition()
+        self._esperas_async = set() # (bucle, futuro) de los clientes asyncio que esperan
+        self._anidado = threading.local()
+        self.descartados = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.capacidad > 0
+
+    def secuencia(self, numero: int) -> str:
+        return f"{self.epoca}-{numero}"
+
+    # Número de una secuencia (None si es de otro arranque del proceso)
+    def _numero(self, secuencia: str) -> int | None:
+        epoca, _, numero = secuencia.partition("-")
+        return int(numero) if epoca == self.epoca else None
+
+    # Secuencia del cambio más antiguo que se conserva
+    @property
+    def primera(self) -> str:
+        with self._condicion:
+            return self._cambios[0].secuencia if self._cambios else self.secuencia(self.numero + 1)
+
+    # Añade cambios (tipo, identificador, datos) y despierta a los clientes que esperan
+    def emitir(self, cambios: list[tuple]):
+        if not cambios:
+            return
+        instante = time.time()
+        with self._condicion:
+            for tipo, entidad_id, datos in cambios:
+                self.numero += 1
+                if len(self._cambios) == self._cambios.maxlen:
+                    self.descartados += 1
+                self._cambios.append(Cambio(self.numero, self.secuencia(self.numero), tipo, entidad_id, datos,
+                                            instante))
+            self.ultima = self._cambios[-1].secuencia
+            self._condicion.notify_all()
+            esperas, self._esperas_async = self._esperas_async, set()
+        for bucle, futuro in esperas:
+            bucle.call_soon_threadsafe(_despertar, futuro)
+
+    # Devuelve (cambios posteriores a "desde", como mucho "limite"; secuencia que hay que
+    # usar como "desde" en la siguiente llamada). La secuencia es None si ya se han
+    # descartado cambios posteriores a "desde" (o si "desde" es de otro arranque del
+    # proceso): el cliente se ha perdido cambios. Con "desde" "0" se empieza por el
+    # cambio más antiguo que se conserva.
+    def leer(self, desde: str, limite: int) -> tuple[list[Cambio], str | None]:
+        with self._condicion:
+            primera = self._cambios[0].numero if self._cambios else self.numero + 1
+            numero = primera - 1 if desde == "0" else self._numero(desde)
+            if numero is None or not primera - 1 <= numero <= self.numero:
+                return [], None
+            # Los números del buffer son consecutivos: la posición se calcula directamente
+            inicio = numero + 1 - primera
+            leidos = [self._cambios[posicion] for posicion in range(inicio, min(len(self._cambios), inicio + limite))]
+            return leidos, leidos[-1].secuencia if leidos else self.secuencia(numero)
+
+    # Espera (bloqueando el hilo) hasta que haya algo que leer después de "desde" (cambios
+    # nuevos o el aviso de que se han perdido) o pasen "segundos".
+    def esperar(self, desde: str, segundos: float) -> bool:
+        with self._condicion:
+            return self._condicion.wait_for(lambda: self.ultima != desde, timeout=segundos)
+
+    # Igual que "esperar", pero sin bloquear el bucle de eventos
+    async def esperar_async(self, desde: str, segundos: float) -> bool:
+        bucle = asyncio.get_running_loop()
+        futuro = bucle.create_future()
+        espera = (bucle, futuro)
+        with self._condicion:
+            if self.ultima != desde:
+                return True
+            self._esperas_async.add(espera)
+        try:
+            await asyncio.wait_for(futuro, segundos)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condicion:
+                self._esperas_async.discard(espera)
+        return self.ultima != desde
+
+    def estadisticas(self) -> dict:
+        with self._condicion:
+            return {
+                "activa": self.activa,
+                "cambios": len(self._cambios) if self.activa else 0,
+                "capacidad": self.capacidad,
+                "ultima": self.ultima,
+                "descartados": self.descartados,
+            }
+
+
+def _despertar(futuro):
+    if not futuro.done():
+        futuro.set_result(None)
+
+
+# Parámetros de GET /cambios: (desde, limite, espera). "desde" se puede indicar también
+# con la cabecera "Last-Event-ID" (la envían los navegadores al reconectarse a un
+# stream SSE). Lanza ValueError si algún parámetro no es válido.
+def leer_parametros(argumentos, cabeceras) -> tuple[str, int, float]:
+    desde = argumentos.get("desde", cabeceras.get("Last-Event-ID", "0"))
+    if not _DESDE.fullmatch(desde):
+        raise ValueError("ERROR: 'desde' debe ser 0 o una secuencia devuelta por el servidor "
+                         "('siguiente', 'ultima' o el 'id' de un evento).")
+    try:
+        limite = int(argumentos.get("limit", LIMITE))
+        espera = float(argumentos.get("espera", ESPERA))
+    except ValueError:
+        raise ValueError("ERROR: Los parámetros 'limit' y 'espera' deben ser números.") from None
+    if not 1 <= limite <= LIMITE_MAXIMO or not 0 <= espera <= ESPERA_MAXIMA:
+        raise ValueError(f"ERROR: 'limit' debe estar entre 1 y {LIMITE_MAXIMO} "
+                         f"y 'espera' entre 0 y {ESPERA_MAXIMA} segundos.")
+    return desde, limite, espera
+
+
+# ------------------------------------------------------------
+#                  SERVER-SENT EVENTS (SSE)
+# ------------------------------------------------------------
+def texto_sse(cambios: list[Cambio]) -> str:
+    return "".join(f"id: {cambio.secuencia}\nevent: {cambio.tipo}\ndata: {cambio.json()}\n\n" for cambio in cambios)
+
+
+# Evento que se envía al cliente que se ha perdido cambios (y se cierra el stream)
+def texto_sse_perdidos(registro: RegistroCambios) -> str:
+    return ("event: cambios_perdidos\n"
+            f"data: {json.dumps({'primera': registro.primera, 'ultima': registro.ultima})}\n\n")
+
+
+SSE_INICIO = "retry: 3000\n\n" # Milisegundos que espera el navegador antes de volver a conectarse
+SSE_LATIDO_TEXTO = ": \n\n" # Comentario (los clientes lo ignoran) para mantener viva la conexión
+
+
+# Un paso de un stream SSE: (texto con los cambios posteriores a "desde", nueva "desde").
+# Si no hay cambios el texto está vacío (hay que esperar). Si el cliente se ha perdido
+# cambios, el texto es el aviso y la nueva "desde" es None (hay que cerrar el stream).
+def paso_sse(registro: RegistroCambios, desde: str) -> tuple[str, str | None]:
+    leidos, siguiente = registro.leer(desde, LIMITE)
+    if siguiente is None:
+        return texto_sse_perdidos(registro), None
+    return texto_sse(leidos), siguiente
+
+
+# ------------------------------------------------------------
+#                     INSTRUMENTACIÓN
+# Cada método envuelto emite sus cambios al terminar (con el
+# cerrojo de escritura de la aplicación todavía adquirido, así
+# que el orden de las secuencias es el de las modificaciones).
+# Si un método envuelto llama a otro (por ejemplo,
+# "insertar_lote" llama a "insertar" con lotes pequeños), solo
+# emite cambios el más externo.
+# ------------------------------------------------------------
+def _emitir_al_terminar(registro: RegistroCambios, funcion, cambios):
+    @wraps(funcion)
+    def envoltorio(*argumentos, **opciones):
+        if getattr(registro._anidado, "activo", False):
+            return funcion(*argumentos, **opciones)
+        registro._anidado.activo = True
+        try:
+            resultado = funcion(*argumentos, **opciones)
+        finally:
+            registro._anidado.activo = False
+        registro.emitir(cambios(resultado, *argumentos, **opciones))
+        return resultado
+    return envoltorio
+
+
+def instrumentar_productos(arbol, registro: RegistroCambios):
+    arbol.insertar = _emitir_al_terminar(
+        registro, arbol.insertar,
+        lambda resultado, producto: [(PRODUCTO_CREADO, producto.id, producto.to_dict())])
+    arbol.insertar_lote = _emitir_al_terminar(
+        registro, arbol.insertar_lote,
+        lambda resultado, productos: [(PRODUCTO_CREADO, producto.id, producto.to_dict()) for producto in productos])
+
+
+def instrumentar_pedidos(lista, registro: RegistroCambios):
+    lista.agregar_pedido = _emitir_al_terminar(
+        registro, lista.agregar_pedido,
+        lambda resultado, pedido: [(PEDIDO_CREADO, pedido.id, pedido.to_dict())])
+    lista.agregar_pedidos = _emitir_al_terminar(
+        registro, lista.agregar_pedidos,
+        lambda resultado, pedidos: [(PEDIDO_CREADO, pedido.id, pedido.to_dict()) for pedido in pedidos])
+    lista.actualizar_pedido = _emitir_al_terminar(
+        registro, lista.actualizar_pedido,
+        lambda resultado, pedido_id, pedido: [(PEDIDO_ACTUALIZADO, pedido_id, pedido.to_dict())] if resultado else [])
+    lista.modificar_lineas = _emitir_al_terminar(
+        registro, lista.modificar_lineas,
+        lambda resultado, pedido_id, cambios, nombre_cliente=None:
+            [(PEDIDO_ACTUALIZADO, pedido_id, resultado.to_dict())] if resultado is not None else [])
+    lista.eliminar_pedido = _emitir_al_terminar(
+        registro, lista.eliminar_pedido,
+        lambda resultado, pedido_id: [(PEDIDO_ELIMINADO, pedido_id, None)] if resultado else [])
@@ -0,0 +1,286 @@
+# --------------------------------------------------------------------------------
+#                                     CATALOGO.PY
+#
+# Carga inicial del catálogo de productos desde un fichero, para no tener que
+# crear los productos uno a uno con POST /productos después de cada despliegue.
+#
+# Formatos:
+#
+# - CSV: una fila de cabecera con las columnas "id",
+#   "nombre" y "precio" (en cualquier orden) y un producto por línea. Los
+#   nombres pueden ir entre comillas (si tienen comas), pero no pueden contener
+#   saltos de línea. Los precios enteros se guardan como enteros (13 y no 13.0),
+#   igual que si llegaran por JSON.
+# - Binario de ancho fijo: cabecera CABECERA (firma "GPPR", versión, ancho del
+#   nombre y número de productos) y un registro de tamaño fijo por producto:
+#   identificador (entero de 64 bits), precio (decimal de 64 bits) y nombre en
+#   UTF-8 relleno con bytes nulos hasta el ancho indicado. Se genera a partir de
+#   un CSV con "--binario". Los precios se guardan siempre como decimales.
+#
+# El formato se reconoce por la firma del principio del fichero.
+#
+# El fichero se lee mapeado en memoria y se divide en trozos (en límites de línea
+# o de registro) que se procesan en paralelo, uno por proceso. Después el árbol
+# se construye de una sola vez con "insertar_lote" y el contador de productos se
+# ajusta al identificador más alto cargado.
+#
+# Uso:
+#   python catalogo.py FICHERO [--procesos N] [--datos DIRECTORIO | --sqlite FICHERO]
+#   python catalogo.py FICHERO.csv --binario SALIDA
+#
+# Sin "--datos" ni "--sqlite" solo se lee el fichero y se construye el árbol en
+# memoria (para comprobar el fichero y medir los tiempos). Al arrancar la API, el
+# catálogo se carga con la variable de entorno GESTION_PEDIDOS_CATALOGO (o con
+# "python servidor.py --catalogo FICHERO").
+# --------------------------------------------------------------------------------
+
+import argparse
+import csv
+import gc
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from array import array
+
+from productos import Producto, ProductosTreeBST
+
+CABECERA = struct.Struct("<4sHHq") # firma, versión, ancho del nombre, nº productos
+FIRMA = b"GPPR"
+VERSION = 1
+ANCHO_NOMBRE = 48 # Bytes del nombre en cada registro (por defecto)
+
+TAMAÑO_MINIMO_PARALELO = 4 * 1024 * 1024 # Con ficheros más pequeños no compensa arrancar procesos
+TROZOS_POR_PROCESO = 4 # Varios trozos por proceso, para repartir mejor el trabajo
+
+
+def _registro(ancho_nombre: int) -> struct.Struct:
+    return struct.Struct(f"<qd{ancho_nombre}s")
+
+
+def _es_binario(datos) -> bool:
+    return len(datos) >= CABECERA.size and datos[:len(FIRMA)] == FIRMA
+
+
+# Columnas (id, nombre, precio) de la cabecera de un CSV
+def _columnas_csv(cabecera: bytes) -> tuple[int, int, int]:
+    columnas = [columna.strip().lower() for columna in next(csv.reader([cabecera.decode("utf-8-sig")]))]
+    try:
+        return columnas.index("id"), columnas.index("nombre"), columnas.index("precio")
+    except ValueError:
+        raise ValueError("ERROR: La cabecera del CSV debe tener las columnas 'id', 'nombre' y 'precio'.") from None
+
+
+def _precio(texto: str):
+    try:
+        return int(texto)
+    except ValueError:
+        return float(texto)
+
+
+# ------------------------------------------------------------
+#                   LECTURA DE UN TROZO
+# Se ejecuta en los procesos de trabajo: cada uno mapea el
+# fichero y lee solo su trozo. Devuelve los identificadores (en
+# un array, que se transfiere entre procesos como bytes), los
+# nombres, los precios y el número de filas con errores.
+# ------------------------------------------------------------
+def _leer_trozo(ruta: str, inicio: int, fin: int, columnas: tuple | None, ancho_nombre: int):
+    with open(ruta, "rb") as fichero, mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        trozo = datos[inicio:fin]
+
+    ids = array("q")
+    nombres = []
+    precios = []
+    errores = 0
+    if columnas is None:
+        for producto_id, precio, nombre in _registro(ancho_nombre).iter_unpack(trozo):
+            ids.append(producto_id)
+            nombres.append(nombre.rstrip(b"\0").decode("utf-8"))
+            precios.append(precio)
+        return ids, nombres, precios, errores
+
+    columna_id, columna_nombre, columna_precio = columnas
+    necesarias = max(columnas) + 1
+    for fila in csv.reader(trozo.decode("utf-8").splitlines()):
+        if not fila:
+            continue
+        try:
+            if len(fila) < necesarias:
+                raise ValueError
+            producto_id = int(fila[columna_id])
+            precio = _precio(fila[columna_precio])
+            ids.append(producto_id)
+        except (ValueError, OverflowError):
+            errores += 1
+            continue
+        nombres.append(fila[columna_nombre])
+        precios.append(precio)
+    return ids, nombres, precios, errores
+
+
+# Divide el fichero en trozos (inicio, fin) que terminan en un límite de línea (CSV)
+# o de registro (binario)
+def _trozos(datos, inicio: int, partes: int, tamaño_registro: int | None) -> list[tuple[int, int]]:
+    fin = len(datos)
+    paso = max(1, (fin - inicio) // partes)
+    limites = [inicio]
+    for parte in range(1, partes):
+        posicion = inicio + parte * paso
+        if tamaño_registro is not None:
+            posicion -= (posicion - inicio) % tamaño_registro
+        else:
+            salto = datos.find(b"\n", posicion)
+            posicion = fin if salto == -1 else salto + 1
+        if limites[-1] < posicion < fin:
+            limites.append(posicion)
+    limites.append(fin)
+    return list(zip(limites, limites[1:]))
+
+
+# ------------------------------------------------------------
+#                         CARGA
+# ------------------------------------------------------------
+class ResultadoCarga:
+    __slots__ = ("productos", "errores", "maximo_id", "segundos_lectura")
+
+    def __init__(self, productos: list[Producto], errores: int, maximo_id: int, segundos_lectura: float):
+        self.productos = productos
+        self.errores = errores # Filas del CSV que no se han podido leer
+        self.maximo_id = maximo_id # 0 si no hay productos
+        self.segundos_lectura = segundos_lectura
+
+
+# Lee todos los productos del fichero (CSV o binario). Con "procesos" se indica
+# cuántos procesos leen el fichero en paralelo (por defecto, uno por núcleo).
+def leer_catalogo(ruta: str, procesos: int | None = None) -> ResultadoCarga:
+    inicio_lectura = time.perf_counter()
+    procesos = procesos or os.cpu_count() or 1
+    with open(ruta, "rb") as fichero:
+        if os.fstat(fichero.fileno()).st_size == 0:
+            raise ValueError(f"ERROR: El fichero '{ruta}' está vacío.")
+        with mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            if _es_binario(datos):
+                firma, version, ancho_nombre, numero = CABECERA.unpack_from(datos, 0)
+                registro = _registro(ancho_nombre)
+                if version != VERSION or len(datos) != CABECERA.size + numero * registro.size:
+                    raise ValueError(f"ERROR: El fichero '{ruta}' no es un catálogo binario válido.")
+                columnas, inicio, tamaño_registro = None, CABECERA.size, registro.size
+            else:
+                salto = datos.find(b"\n")
+                fin_cabecera = len(datos) if salto == -1 else salto + 1
+                columnas, inicio, tamaño_registro = _columnas_csv(datos[:fin_cabecera]), fin_cabecera, None
+                ancho_nombre = 0
+
+            paralelo = procesos > 1 and len(datos) - inicio >= TAMAÑO_MINIMO_PARALELO
+            trozos = _trozos(datos, inicio, procesos * TROZOS_POR_PROCESO if paralelo else 1, tamaño_registro)
+
+    argumentos = [(ruta, desde, hasta, columnas, ancho_nombre) for desde, hasta in trozos]
+    if paralelo:
+        with multiprocessing.Pool(min(procesos, len(argumentos))) as pool:
+            leidos = pool.starmap(_leer_trozo, argumentos)
+    else:
+        leidos = [_leer_trozo(*argumento) for argumento in argumentos]
+
+    productos = []
+    errores = 0
+    maximo_id = 0
+    for ids, nombres, precios, errores_trozo in leidos:
+        productos += map(Producto, ids, nombres, precios)
+        errores += errores_trozo
+        if ids:
+            maximo_id = max(maximo_id, max(ids))
+    return ResultadoCarga(productos, errores, maximo_id, time.perf_counter() - inicio_lectura)
+
+
+# Carga el catálogo en un árbol de productos vacío (en memoria o SQLite) y ajusta el
+# contador para que los productos nuevos tengan identificadores mayores.
+#
+# Mientras se crean los productos y los nodos del árbol se desactiva el recolector de
+# ciclos (con millones de objetos nuevos se ejecutaría una y otra vez sin encontrar
+# nada que liberar). Si "congelar" es True, al terminar se "congelan" (gc.freeze) todos
+# los objetos del proceso para que las siguientes recolecciones completas no tengan que
+# recorrerlos. Afecta a todo el intérprete, así que solo lo activa el servidor al arrancar.
+def sembrar(arbol, contador, ruta: str, procesos: int | None = None,
+            congelar: bool = False) -> ResultadoCarga:
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        resultado = leer_catalogo(ruta, procesos)
+        arbol.insertar_lote(resultado.productos)
+    finally:
+        if activo:
+            gc.enable()
+    if congelar:
+        gc.freeze()
+    contador.ajustar(resultado.maximo_id + 1)
+    return resultado
+
+
+# Escribe productos en el formato binario de ancho fijo
+def escribir_binario(ruta: str, productos, ancho_nombre: int = ANCHO_NOMBRE) -> int:
+    registro = _registro(ancho_nombre)
+    buffer = bytearray(CABECERA.pack(FIRMA, VERSION, ancho_nombre, 0))
+    numero = 0
+    for producto in productos:
+        nombre = str(producto.nombre).encode("utf-8")
+        if len(nombre) > ancho_nombre:
+            raise ValueError(f"ERROR: El nombre del producto '{producto.id}' ocupa más de {ancho_nombre} bytes.")
+        buffer += registro.pack(producto.id, float(producto.precio), nombre)
+        numero += 1
+    CABECERA.pack_into(buffer, 0, FIRMA, VERSION, ancho_nombre, numero)
+    with open(ruta + ".tmp", "wb") as fichero:
+        fichero.write(buffer)
+    os.replace(ruta + ".tmp", ruta)
+    return numero
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga inicial del catálogo de productos")
+    parser.add_argument("fichero", help="fichero CSV (id,nombre,precio) o binario de ancho fijo")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos que leen el fichero (por defecto, uno por núcleo)")
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument("--datos", help="directorio de datos (GESTION_PEDIDOS_DATOS) donde se guarda la snapshot")
+    destino.add_argument("--sqlite", help="base de datos SQLite (GESTION_PEDIDOS_SQLITE)")
+    destino.add_argument("--binario", help="convierte el fichero al formato binario de ancho fijo")
+    parser.add_argument("--ancho-nombre", type=int, default=ANCHO_NOMBRE, help="bytes del nombre en el formato binario")
+    argumentos = parser.parse_args()
+
+    if argumentos.binario:
+        resultado = leer_catalogo(argumentos.fichero, argumentos.procesos)
+        numero = escribir_binario(argumentos.binario, resultado.productos, argumentos.ancho_nombre)
+        print(f"Se han escrito {numero} productos en '{argumentos.binario}' ({resultado.errores} filas con errores)")
+        return
+
+    persistencia = None
+    if argumentos.sqlite:
+        from almacenamiento import ContadorSQLite, ProductosSQLite
+        arbol = ProductosSQLite(argumentos.sqlite)
+        contador = ContadorSQLite(argumentos.sqlite, "productos")
+    else:
+        from concurrencia import ContadorAtomico
+        from lista_enlazada_pedidos import ListaPedidos
+        from persistencia import Persistencia
+        arbol = ProductosTreeBST()
+        persistencia = Persistencia(directorio=argumentos.datos, arbol=arbol, lista=ListaPedidos())
+        contador = ContadorAtomico(persistencia.cargar()[0])
+    if len(arbol) > 0:
+        sys.exit("ERROR: Ya hay productos guardados; el catálogo solo se carga en un almacenamiento vacío.")
+
+    inicio = time.perf_counter()
+    resultado = sembrar(arbol, contador, argumentos.fichero, argumentos.procesos)
+    construccion = time.perf_counter() - inicio - resultado.segundos_lectura
+    if persistencia is not None:
+        persistencia.siguiente_id_producto = contador.valor
+        persistencia.guardar_snapshot()
+        persistencia.cerrar()
+    print(f"Productos cargados: {len(resultado.productos)} ({resultado.errores} filas con errores), "
+          f"siguiente identificador: {contador.valor}")
+    print(f"Lectura: {resultado.segundos_lectura:.2f} s, construcción del árbol: {construccion:.2f} s, "
+          f"total: {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
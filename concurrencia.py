@@ -0,0 +1,98 @@
+# --------------------------------------------------------------------------------
+#                                   CONCURRENCIA.PY
+#
+# Utilidades para que la API se pueda usar desde varios hilos a la vez
+# (servidor de Flask con hilos, gunicorn con "threads", ...):
+#
+# - ContadorAtomico: reparte identificadores sin que dos peticiones
+#   obtengan el mismo.
+# - CerrojoLectorEscritor: permite que varias lecturas (GET) se ejecuten
+#   en paralelo, mientras que las escrituras se ejecutan de una en una.
+# --------------------------------------------------------------------------------
+
+import threading
+from contextlib import contextmanager
+
+
+# ------------------------------------------------------------
+#                       CONTADORATOMICO
+# ------------------------------------------------------------
+class ContadorAtomico:
+    def __init__(self, inicial: int = 1):
+        self._valor = inicial
+        self._cerrojo = threading.Lock()
+
+    # Siguiente valor que se va a repartir (sin reservarlo)
+    @property
+    def valor(self) -> int:
+        return self._valor
+
+    # Reserva "cantidad" valores consecutivos y devuelve el primero de ellos
+    def siguiente(self, cantidad: int = 1) -> int:
+        with self._cerrojo:
+            res = self._valor
+            self._valor += cantidad
+            return res
+
+    # Se asegura de que el siguiente valor sea, como mínimo, "minimo"
+    # (por ejemplo, tras cargar datos que ya tienen identificadores asignados)
+    def ajustar(self, minimo: int):
+        with self._cerrojo:
+            if self._valor < minimo:
+                self._valor = minimo
+
+
+# ------------------------------------------------------------
+#                     CERROJOLECTORESCRITOR
+# Se da prioridad a los escritores: cuando hay un escritor esperando,
+# los lectores nuevos esperan, para que las escrituras no se queden
+# bloqueadas indefinidamente por un flujo continuo de lecturas.
+# El cerrojo no es reentrante.
+# ------------------------------------------------------------
+class CerrojoLectorEscritor:
+    def __init__(self):
+        self._condicion = threading.Condition(threading.Lock())
+        self._lectores = 0 # Lectores que tienen el cerrojo
+        self._escritor = False # Si hay un escritor con el cerrojo
+        self._escritores_esperando = 0
+
+    def adquirir_lectura(self):
+        with self._condicion:
+            while self._escritor or self._escritores_esperando > 0:
+                self._condicion.wait()
+            self._lectores += 1
+
+    def liberar_lectura(self):
+        with self._condicion:
+            self._lectores -= 1
+            if self._lectores == 0:
+                self._condicion.notify_all()
+
+    def adquirir_escritura(self):
+        with self._condicion:
+            self._escritores_esperando += 1
+            while self._escritor or self._lectores > 0:
+                self._condicion.wait()
+            self._escritores_esperando -= 1
+            self._escritor = True
+
+    def liberar_escritura(self):
+        with self._condicion:
+            self._escritor = False
+            self._condicion.notify_all()
+
+    @contextmanager
+    def lectura(self):
+        self.adquirir_lectura()
+        try:
+            yield
+        finally:
+            self.liberar_lectura()
+
+    @contextmanager
+    def escritura(self):
+        self.adquirir_escritura()
+        try:
+            yield
+        finally:
+            self.liberar_escritura()
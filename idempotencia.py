@@ -0,0 +1,146 @@
+# --------------------------------------------------------------------------------
+#                                   IDEMPOTENCIA.PY
+#
+# Respuestas guardadas por "Idempotency-Key" para los POST/PUT/PATCH.
+#
+# Si un cliente no recibe la respuesta (por ejemplo, por un corte de red) y
+# repite la petición con la misma cabecera "Idempotency-Key", se le devuelve la
+# respuesta guardada en lugar de volver a ejecutarla (y crear otro pedido).
+#
+# - Cada clave guarda la huella de la petición (método, ruta y body): si se
+#   reutiliza la clave con otra petición distinta, se rechaza.
+# - Mientras la primera petición se está ejecutando, los reintentos con la
+#   misma clave se rechazan (no se ejecutan dos veces a la vez).
+# - Las claves caducan pasado un tiempo y el tamaño total está limitado en
+#   bytes; cuando se supera, se expulsan las claves más antiguas (LRU).
+# - Las respuestas con errores del servidor (5xx) no se guardan, para que el
+#   cliente pueda reintentar.
+# --------------------------------------------------------------------------------
+
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+
+
+# Estados devueltos por "empezar"
+NUEVA = "nueva" # La petición se debe ejecutar (y después "guardar" o "cancelar")
+REPETIDA = "repetida" # Ya hay una respuesta guardada para esa clave
+EN_CURSO = "en_curso" # La petición original todavía se está ejecutando
+DISTINTA = "distinta" # La clave ya se usó con otra petición
+
+
+def huella(metodo: str, ruta: str, cuerpo: bytes) -> bytes:
+    return hashlib.blake2b(b"\n".join((metodo.encode(), ruta.encode("utf-8"), cuerpo)), digest_size=16).digest()
+
+
+# Stream del body que calcula la huella (la misma que "huella") mientras se lee, para
+# las peticiones cuyo body se procesa por partes sin guardarlo entero en memoria
+class LectorConHuella(io.RawIOBase):
+    def __init__(self, metodo: str, ruta: str, stream):
+        self._stream = stream
+        self._hash = hashlib.blake2b(metodo.encode() + b"\n" + ruta.encode("utf-8") + b"\n", digest_size=16)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, destino) -> int:
+        leidos = self._stream.readinto(destino)
+        if leidos:
+            self._hash.update(memoryview(destino)[:leidos])
+        return leidos
+
+    # Huella del body completo (lo que quede sin leer se lee y se descarta)
+    def huella(self) -> bytes:
+        while self.read(1 << 16):
+            pass
+        return self._hash.digest()
+
+
+class RespuestaGuardada:
+    __slots__ = ("huella", "codigo", "mimetype", "cuerpo", "caducidad")
+
+    def __init__(self, huella: bytes, codigo: int, mimetype: str, cuerpo: bytes, caducidad: float):
+        self.huella = huella
+        self.codigo = codigo
+        self.mimetype = mimetype
+        self.cuerpo = cuerpo
+        self.caducidad = caducidad
+
+
+class CacheIdempotencia:
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, duracion: float = 24 * 3600):
+        self.max_bytes = max_bytes # Con 0 se desactiva (las claves se ignoran)
+        self.duracion = duracion # Segundos que se guarda cada respuesta
+        self.bytes = 0
+        self._respuestas = OrderedDict() # clave --> RespuestaGuardada (de la más antigua a la más reciente)
+        self._en_curso = {} # clave --> huella de la petición que se está ejecutando
+        self._cerrojo = threading.Lock()
+
+        # Contadores
+        self.repetidas = 0
+        self.guardadas = 0
+        self.expulsiones = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.max_bytes > 0
+
+    # Devuelve (estado, respuesta guardada o None). Con el estado NUEVA la clave
+    # queda reservada hasta que se llame a "guardar" o "cancelar".
+    def empezar(self, clave: str, huella_peticion: bytes) -> tuple[str, RespuestaGuardada | None]:
+        with self._cerrojo:
+            guardada = self._respuestas.get(clave)
+            if guardada is not None and guardada.caducidad <= time.monotonic():
+                self._quitar(clave)
+                guardada = None
+            if guardada is not None:
+                if guardada.huella != huella_peticion:
+                    return DISTINTA, None
+                self.repetidas += 1
+                return REPETIDA, guardada
+            if clave in self._en_curso:
+                return (EN_CURSO if self._en_curso[clave] == huella_peticion else DISTINTA), None
+            self._en_curso[clave] = huella_peticion
+            return NUEVA, None
+
+    def guardar(self, clave: str, codigo: int, mimetype: str, cuerpo: bytes):
+        with self._cerrojo:
+            huella_peticion = self._en_curso.pop(clave, None)
+            if huella_peticion is None or len(cuerpo) > self.max_bytes:
+                return
+            self._respuestas[clave] = RespuestaGuardada(huella_peticion, codigo, mimetype, cuerpo,
+                                                        time.monotonic() + self.duracion)
+            self.bytes += len(cuerpo)
+            self.guardadas += 1
+            # Se expulsan las caducadas y, si hace falta, las más antiguas
+            ahora = time.monotonic()
+            while self._respuestas:
+                clave_antigua, antigua = next(iter(self._respuestas.items()))
+                if self.bytes <= self.max_bytes and antigua.caducidad > ahora:
+                    break
+                self._quitar(clave_antigua)
+                self.expulsiones += 1
+
+    # La petición no ha terminado bien: la clave se libera para poder reintentar
+    def cancelar(self, clave: str):
+        with self._cerrojo:
+            self._en_curso.pop(clave, None)
+
+    def _quitar(self, clave: str):
+        guardada = self._respuestas.pop(clave)
+        self.bytes -= len(guardada.cuerpo)
+
+    def estadisticas(self) -> dict:
+        with self._cerrojo:
+            return {
+                "activa": self.activa,
+                "claves": len(self._respuestas),
+                "en_curso": len(self._en_curso),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "guardadas": self.guardadas,
+                "repetidas": self.repetidas,
+                "expulsiones": self.expulsiones,
+            }
@@ -0,0 +1,87 @@
+# --------------------------------------------------------------------------------
+#                                     INGESTA.PY
+#
+# Lectura rápida de los body JSON de las peticiones.
+#
+# - Si está instalado "orjson", los body se decodifican con él (bastante más
+#   rápido que el módulo "json"); si no, se usa "json". orjson no admite algunos
+#   valores que "json" sí acepta (NaN, Infinity, enteros de más de 64 bits, que
+#   convierte en decimales): en esos casos se decodifica con "json", para que el
+#   resultado sea siempre el mismo.
+# - Las líneas de un pedido se validan y se empaquetan en el array compacto del
+#   pedido (ver "lista_enlazada_pedidos.py") en una sola pasada, sin crear
+#   objetos "LineaPedido" intermedios.
+# --------------------------------------------------------------------------------
+
+import json
+from array import array
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # orjson es opcional
+    orjson = None
+
+
+# Números de 19 cifras o más: pueden no caber en 64 bits (orjson los convertiría en
+# decimales). Para buscarlos rápido se cambian todas las cifras por "9" (translate
+# es mucho más rápido que una expresión regular) y se busca una secuencia de 19.
+_CIFRAS = bytes.maketrans(b"0123456789", b"9" * 10)
+_NUMERO_GRANDE = b"9" * 19
+
+
+def leer_json(datos: bytes | str):
+    if orjson is not None:
+        if isinstance(datos, str):
+            datos = datos.encode("utf-8", "surrogatepass")
+        if _NUMERO_GRANDE not in datos.translate(_CIFRAS):
+            try:
+                return orjson.loads(datos)
+            except orjson.JSONDecodeError:
+                pass # Se vuelve a intentar con "json" (que acepta NaN, Infinity...)
+    return json.loads(datos)
+
+
+# Proveedor JSON de Flask que usa "leer_json" para request.get_json(). Las
+# respuestas se siguen codificando igual que con el proveedor por defecto.
+class ProveedorJSONRapido(DefaultJSONProvider):
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return leer_json(s)
+
+
+MINIMO = -2 ** 63 # Rango de los enteros del array compacto
+MAXIMO = 2 ** 63 - 1
+
+
+class LineasInvalidas(ValueError):
+    pass
+
+
+# Valida las líneas JSON de un pedido ([{"id_producto": 4, "cantidad": 20}, ...])
+# y las empaqueta en los valores intercalados [producto_id, cantidad, ...]: un
+# array de enteros de 64 bits o, si algún valor no cabe, una lista. Devuelve
+# (valores, identificadores de producto). Si alguna línea no es válida, lanza
+# LineasInvalidas.
+def empaquetar_lineas(lineas_json) -> tuple[array | list, set]:
+    if not isinstance(lineas_json, list):
+        raise LineasInvalidas("ERROR: El campo 'lista_pedidos' debe ser una lista.")
+    valores = array("q")
+    productos = set()
+    for linea in lineas_json:
+        if type(linea) is not dict:
+            raise LineasInvalidas("ERROR: Cada línea de pedido debe ser un objeto JSON.")
+        producto_id = linea.get("id_producto")
+        cantidad = linea.get("cantidad")
+        if type(producto_id) is not int or cantidad is None:
+            raise LineasInvalidas("ERROR: Los campos 'id_producto' (entero) y 'cantidad' "
+                                  "son obligatorios en cada línea de pedido.")
+        productos.add(producto_id)
+        if type(valores) is array and not (type(cantidad) is int and MINIMO <= cantidad <= MAXIMO
+                                           and MINIMO <= producto_id <= MAXIMO):
+            valores = valores.tolist()
+        valores.append(producto_id)
+        valores.append(cantidad)
+    return valores, productos
@@ -5,8 +5,11 @@
 # donde cada nodo representa un pedido que contiene varios productos.
 # --------------------------------------------------------------------------------
 
-from typing import Optional
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, Optional
 from productos import Producto
+from agregados import AgregadosPedidos
 
 # Producto --> (Id_producto, nombre_producto, precio)
 
@@ -16,6 +19,8 @@ from productos import Producto
 #  5 --> (5, "Vestido",  14€)            20
 
 class LineaPedido:
+    __slots__ = ("producto_id", "cantidad")
+
     def __init__(self, producto_id: int, cantidad: int):
        self.producto_id = producto_id
        self.cantidad = cantidad
@@ -26,33 +31,207 @@ class LineaPedido:
             "producto_id": self.producto_id,
             "cantidad": self.cantidad,
         }
+
+
+# Las líneas de un pedido no se guardan como objetos "LineaPedido" (cada objeto
+# ocupa mucha más memoria que los dos enteros que contiene), sino en un único
+# array de enteros de 64 bits con los valores intercalados:
+#
+#   [producto_id_1, cantidad_1, producto_id_2, cantidad_2, ...]
+#
+# Si algún valor no es un entero de 64 bits (los datos llegan por JSON sin
+# validar su tipo), se usa una lista de Python con la misma disposición.
+def _empaquetar_lineas(lineas) -> array | list:
+    datos = []
+    for linea in lineas:
+        datos.append(linea.producto_id)
+        datos.append(linea.cantidad)
+    if all(type(valor) is int for valor in datos):
+        try:
+            return array("q", datos)
+        except OverflowError:
+            pass
+    return datos
+
+
+# Aplica cambios {producto_id: cantidad} sobre los valores intercalados de las líneas
+# de un pedido, modificándolos en su sitio (sin crear un pedido ni un array nuevos).
+# Cada producto indicado queda en una sola línea con la nueva cantidad: en la posición
+# de su primera línea o, si no estaba en el pedido, al final. Con cantidad 0 se eliminan
+# sus líneas. Si algún valor nuevo no cabe en el array de enteros, se pasa a una lista.
+def _cambiar_lineas(datos: array | list, cambios: dict) -> array | list:
+    if type(datos) is array:
+        try:
+            array("q", [valor for par in cambios.items() for valor in par])
+        except (TypeError, OverflowError):
+            datos = list(datos)
+
+    pendientes = dict(cambios)
+    borrar = [] # Posiciones de las líneas que se eliminan
+    for posicion in range(0, len(datos), 2):
+        producto_id = datos[posicion]
+        if not isinstance(producto_id, (str, int, float)) or producto_id not in cambios:
+            continue
+        if producto_id in pendientes:
+            cantidad = pendientes.pop(producto_id)
+            if cantidad == 0:
+                borrar.append(posicion)
+            else:
+                datos[posicion + 1] = cantidad
+        else:
+            # Línea repetida de un producto que ya se ha cambiado
+            borrar.append(posicion)
+    for posicion in reversed(borrar):
+        del datos[posicion:posicion + 2]
+    for producto_id, cantidad in pendientes.items():
+        if cantidad != 0:
+            datos.extend((producto_id, cantidad))
+    return datos
+
+
+# Vista de solo lectura de las líneas de un pedido: se comporta como una lista
+# de "LineaPedido", pero los objetos se crean solo cuando se accede a ellos.
+class LineasPedido:
+    __slots__ = ("_datos",)
+
+    def __init__(self, datos: array | list):
+        self._datos = datos
+
+    def __len__(self) -> int:
+        return len(self._datos) // 2
+
+    def __getitem__(self, posicion: int) -> LineaPedido:
+        if posicion < 0:
+            posicion += len(self)
+        if not 0 <= posicion < len(self):
+            raise IndexError("La línea de pedido no existe")
+        return LineaPedido(producto_id=self._datos[2 * posicion], cantidad=self._datos[2 * posicion + 1])
+
+    def __iter__(self) -> Iterator[LineaPedido]:
+        for producto_id, cantidad in self.pares():
+            yield LineaPedido(producto_id=producto_id, cantidad=cantidad)
+
+    # Recorre las líneas como pares (producto_id, cantidad), sin crear objetos
+    def pares(self) -> Iterator[tuple]:
+        valores = iter(self._datos)
+        return zip(valores, valores)
+
+    # Valores intercalados [producto_id, cantidad, ...] (array de enteros o lista)
+    def valores(self) -> array | list:
+        return self._datos
+
+
 #   Id_pedido       Nombre_cliente     Lista_pedidos
 #       15              Juan          LineaPedido(1, 8)       --> El producto 1 era: (1, "Pantalón", 5€)    
 #       28              Laura         LineaPedido(2, 8)       --> El producto 2 era: (2, "Camiseta", 10€)
 #       03              Pepe          LineaPedido(5, 1)       --> El producto 5 era: (5, "Vestido",  14€) 
 class Pedido:
+    __slots__ = ("id", "nombre_cliente", "_lineas")
+
     def __init__(self, pedido_id: int, nombre_cliente: str, lista_pedidos: list[LineaPedido]):
         self.id = pedido_id
         self.nombre_cliente = nombre_cliente
         self.lista_pedidos = lista_pedidos
 
+    # Las líneas se devuelven como una vista ("LineasPedido") sobre el array compacto
+    @property
+    def lista_pedidos(self) -> LineasPedido:
+        return LineasPedido(self._lineas)
+
+    # Al asignar las líneas se empaquetan en el array compacto. Si se asignan las
+    # líneas de otro pedido (una vista "LineasPedido"), se comparte su array.
+    @lista_pedidos.setter
+    def lista_pedidos(self, lista_pedidos):
+        if isinstance(lista_pedidos, LineasPedido):
+            self._lineas = lista_pedidos._datos
+        else:
+            self._lineas = _empaquetar_lineas(lista_pedidos)
+
     def to_dict(self):
         return {
             "pedido_id": self.id,
             "nombre_cliente": self.nombre_cliente,
-            "lista_productos": [ item.to_dict() for item in self.lista_pedidos]
+            "lista_productos": [{"producto_id": producto_id, "cantidad": cantidad}
+                                for producto_id, cantidad in self.lista_pedidos.pares()]
         }   
     
 
 class NodoPedido:
+    __slots__ = ("pedido", "siguiente", "anterior")
+
     def __init__(self, pedido:Pedido):
         self.pedido = pedido 
         self.siguiente = None 
+        self.anterior = None # Nodo anterior (la lista es doblemente enlazada)
     
 
+# La lista es doblemente enlazada y guarda un puntero al último nodo ("cola")
+# y un índice (diccionario) identificador --> nodo. De esta forma añadir,
+# buscar, actualizar y eliminar un pedido son operaciones O(1), y se sigue
+# manteniendo el orden de inserción para "listar_pedidos".
+#
+# Además se mantienen dos índices secundarios para buscar pedidos por cliente
+# y por producto sin recorrer toda la lista. Cada índice guarda, para cada
+# valor, la lista ordenada de los identificadores de sus pedidos: los pedidos
+# nuevos tienen el identificador más alto, así que casi siempre se añaden al
+# final, y para paginar se busca el cursor con búsqueda binaria.
 class ListaPedidos:
     def __init__(self):
         self.cabeza = None 
+        self.cola = None # Último nodo de la lista
+        self.indice = {} # pedido_id --> NodoPedido
+        self.indice_clientes = {} # nombre_cliente --> [pedido_id, ...] (ordenados)
+        self.indice_productos = {} # producto_id --> [pedido_id, ...] (ordenados)
+        self.agregados = AgregadosPedidos() # Unidades vendidas por producto y por cliente
+
+    def __len__(self) -> int:
+        return len(self.indice)
+
+    # Claves de los índices secundarios para un pedido. Los valores que no se
+    # pueden usar como clave de un diccionario (p. ej. una lista) no se indexan.
+    @staticmethod
+    def _claves_indices(pedido: Pedido):
+        cliente = pedido.nombre_cliente if isinstance(pedido.nombre_cliente, (str, int, float)) else None
+        productos = {producto_id for producto_id, _ in pedido.lista_pedidos.pares()
+                     if isinstance(producto_id, (str, int, float))}
+        return cliente, productos
+
+    def _indexar(self, pedido: Pedido):
+        cliente, productos = self._claves_indices(pedido)
+        if cliente is not None:
+            self._añadir_a_indice(self.indice_clientes, cliente, pedido.id)
+        for producto_id in productos:
+            self._añadir_a_indice(self.indice_productos, producto_id, pedido.id)
+
+    def _desindexar(self, pedido: Pedido):
+        cliente, productos = self._claves_indices(pedido)
+        if cliente is not None:
+            self._quitar_de_indice(self.indice_clientes, cliente, pedido.id)
+        for producto_id in productos:
+            self._quitar_de_indice(self.indice_productos, producto_id, pedido.id)
+
+    @staticmethod
+    def _añadir_a_indice(indice: dict, clave, pedido_id: int):
+        pedidos = indice.get(clave)
+        if pedidos is None:
+            indice[clave] = [pedido_id]
+        elif pedidos[-1] < pedido_id: # El caso habitual: un pedido nuevo
+            pedidos.append(pedido_id)
+        else:
+            posicion = bisect_left(pedidos, pedido_id)
+            if posicion == len(pedidos) or pedidos[posicion] != pedido_id:
+                pedidos.insert(posicion, pedido_id)
+
+    @staticmethod
+    def _quitar_de_indice(indice: dict, clave, pedido_id: int):
+        pedidos = indice.get(clave)
+        if pedidos is not None:
+            posicion = bisect_left(pedidos, pedido_id)
+            if posicion < len(pedidos) and pedidos[posicion] == pedido_id:
+                del pedidos[posicion]
+            # Si ya no queda ningún pedido con esa clave, se borra la entrada
+            if not pedidos:
+                del indice[clave]
 
     # Agregar un pedido (se añade al final)
     def agregar_pedido (self, pedido: Pedido):
@@ -61,30 +240,45 @@ class ListaPedidos:
         if self.cabeza is None:
             self.cabeza = nuevo_pedido
         else:
-
-            # La lista contiene elementos, se reccorre hasta llegar al final de la lista  (final del nodo)
-            # para añadirlo como último.
-            actual = self.cabeza
-            while actual.siguiente is not None:
-                actual = actual.siguiente
-            actual.siguiente = nuevo_pedido
+            # La lista contiene elementos, se engancha directamente detrás del último nodo.
+            nuevo_pedido.anterior = self.cola
+            self.cola.siguiente = nuevo_pedido
+        self.cola = nuevo_pedido
+        self.indice[pedido.id] = nuevo_pedido
+        self._indexar(pedido)
+        self.agregados.sumar(pedido)
     
-    # Buscar un pedido por su identificador (id)
-    def buscar_pedido (self, pedido_id: int) -> Pedido | None:
+    # Agregar varios pedidos a la vez (se añaden al final, en el mismo orden).
+    # Primero se enlazan entre sí y después la cadena completa se engancha a la cola.
+    def agregar_pedidos(self, pedidos: list[Pedido]):
+        if not pedidos:
+            return
+        primero = anterior = None
+        for pedido in pedidos:
+            nodo = NodoPedido(pedido)
+            if anterior is None:
+                primero = nodo
+            else:
+                nodo.anterior = anterior
+                anterior.siguiente = nodo
+            self.indice[pedido.id] = nodo
+            self._indexar(pedido)
+            anterior = nodo
+
         if self.cabeza is None:
-            return None 
+            self.cabeza = primero
         else:
-            actual = self.cabeza
-            encontrado = False
-            res = None
-            # Mientras que haya elementos y no se haya encontrado el "pedido", se sigue buscando.
-            while actual is not None and encontrado is False:
-                if actual.pedido.id == pedido_id:
-                    encontrado = True
-                    res = actual.pedido
-                actual = actual.siguiente
-            
-            return res 
+            primero.anterior = self.cola
+            self.cola.siguiente = primero
+        self.cola = anterior
+        self.agregados.sumar_lote(pedidos)
+
+    # Buscar un pedido por su identificador (id)
+    def buscar_pedido (self, pedido_id: int) -> Pedido | None:
+        nodo = self.indice.get(pedido_id)
+        if nodo is None:
+            return None
+        return nodo.pedido
     
     # Actualizar todos los datos de un pedido dado un identificador
     def actualizar_pedido(self, pedido_id: int, pedido: Pedido) -> bool:
@@ -92,37 +286,119 @@ class ListaPedidos:
         if pedido_antiguo is None:
             res = False
         else:
+            self._desindexar(pedido_antiguo)
+            self.agregados.restar(pedido_antiguo)
             pedido_antiguo.nombre_cliente = pedido.nombre_cliente
             pedido_antiguo.lista_pedidos = pedido.lista_pedidos
+            self._indexar(pedido_antiguo)
+            self.agregados.sumar(pedido_antiguo)
             res = True 
 
         return res
 
 
+    # Modificar solo algunas líneas de un pedido: "cambios" es {producto_id: cantidad}
+    # (cantidad 0 elimina la línea, ver "_cambiar_lineas"). Las líneas se cambian en
+    # su sitio y los índices y agregados se actualizan solo para los productos
+    # indicados. Si se indica "nombre_cliente", también se cambia el cliente.
+    # Devuelve el pedido modificado o None si no existe.
+    def modificar_lineas(self, pedido_id: int, cambios: dict, nombre_cliente=None) -> Pedido | None:
+        nodo = self.indice.get(pedido_id)
+        if nodo is None:
+            return None
+        pedido = nodo.pedido
+
+        if nombre_cliente is not None and nombre_cliente != pedido.nombre_cliente:
+            # Con otro cliente cambian todas sus entradas: se rehace el pedido completo
+            self._desindexar(pedido)
+            self.agregados.restar(pedido)
+            pedido.nombre_cliente = nombre_cliente
+            pedido.lista_pedidos = LineasPedido(_cambiar_lineas(pedido.lista_pedidos.valores(), cambios))
+            self._indexar(pedido)
+            self.agregados.sumar(pedido)
+            return pedido
+
+        antes = self._lineas_de(pedido, cambios)
+        pedido.lista_pedidos = LineasPedido(_cambiar_lineas(pedido.lista_pedidos.valores(), cambios))
+        despues = self._lineas_de(pedido, cambios)
+        presentes = {producto_id for producto_id, _ in despues}
+        for producto_id in cambios:
+            if producto_id in presentes:
+                self._añadir_a_indice(self.indice_productos, producto_id, pedido_id)
+            else:
+                self._quitar_de_indice(self.indice_productos, producto_id, pedido_id)
+        self.agregados.ajustar(pedido.nombre_cliente, antes, despues)
+        return pedido
+
+    # Líneas (producto_id, cantidad) de un pedido cuyos productos están en "productos"
+    @staticmethod
+    def _lineas_de(pedido: Pedido, productos) -> list[tuple]:
+        return [(producto_id, cantidad) for producto_id, cantidad in pedido.lista_pedidos.pares()
+                if isinstance(producto_id, (str, int, float)) and producto_id in productos]
+
     # Eliminar pedido dado un identificador
     def eliminar_pedido(self, pedido_id: int) -> bool:
-        if self.cabeza is None:
-            return False 
+        actual = self.indice.pop(pedido_id, None)
+        if actual is None:
+            return False
+        self._desindexar(actual.pedido)
+        self.agregados.restar(actual.pedido)
+
+        # Se desengancha el nodo uniendo su nodo anterior con su siguiente.
+        if actual.anterior is None:        # Si es el primero, la cabeza pasa a ser el siguiente
+            self.cabeza = actual.siguiente
         else:
-            actual = self.cabeza
-            encontrado = False
-            anterior = None 
-            
-            # Mientras que haya elementos y no se haya encontrado el "pedido", se sigue buscando.
-            while actual is not None and encontrado is False:
-                if actual.pedido.id == pedido_id:
-                    encontrado = True
-                    # Si se ha encontrado el "pedido" se comprueba si está el primero de la lista o no.
-                    if anterior is None:           # Si es el primero, se borra de la lista
-                        self.cabeza = actual.siguiente
-                    else:                          # Si no es el primero, significa que tiene nodos anteriores,
-                                               # por tanto, se indica que el nodo anterior apunte al siguiente 
-                                               # del que se va a borrar.
-                        anterior.siguiente = actual.siguiente
-                anterior = actual
-                actual = actual.siguiente
-                
-        return encontrado
+            actual.anterior.siguiente = actual.siguiente
+
+        if actual.siguiente is None:       # Si es el último, la cola pasa a ser el anterior
+            self.cola = actual.anterior
+        else:
+            actual.siguiente.anterior = actual.anterior
+
+        # No se borran los punteros del nodo eliminado: si algún recorrido
+        # (por ejemplo, un listado que se está enviando por streaming) está
+        # detenido en este nodo, podrá seguir avanzando por "siguiente".
+        return True
+
+    # Saca de la lista los pedidos del principio (los más antiguos) con identificador
+    # menor o igual que "hasta_id", para pasarlos al archivo (ver "archivo.py").
+    # Sus unidades siguen contando en los agregados, porque los pedidos no se han
+    # eliminado. Devuelve los pedidos extraídos, en orden.
+    def extraer_antiguos(self, hasta_id: int) -> list[Pedido]:
+        extraidos = []
+        clientes = set()
+        productos = set()
+        actual = self.cabeza
+        while actual is not None and actual.pedido.id <= hasta_id:
+            del self.indice[actual.pedido.id]
+            cliente, productos_pedido = self._claves_indices(actual.pedido)
+            if cliente is not None:
+                clientes.add(cliente)
+            productos |= productos_pedido
+            extraidos.append(actual.pedido)
+            actual = actual.siguiente
+        # Los pedidos extraídos son los de identificador más bajo: en cada lista de los
+        # índices secundarios se quitan de una vez todos los del principio
+        for indice, claves in ((self.indice_clientes, clientes), (self.indice_productos, productos)):
+            for clave in claves:
+                pedidos = indice[clave]
+                del pedidos[:bisect_right(pedidos, hasta_id)]
+                if not pedidos:
+                    del indice[clave]
+        # Como en "eliminar_pedido", los nodos extraídos conservan sus punteros
+        self.cabeza = actual
+        if actual is None:
+            self.cola = None
+        else:
+            actual.anterior = None
+
+        # Los diccionarios no reducen su tamaño al borrar claves: si se ha extraído
+        # la mayor parte de los pedidos, se copian para liberar esa memoria
+        if len(extraidos) > len(self.indice):
+            self.indice = dict(self.indice)
+            self.indice_clientes = dict(self.indice_clientes)
+            self.indice_productos = dict(self.indice_productos)
+        return extraidos
 
     # Devuelve la lista con todos los pedidos que hay existentes.
     def listar_pedidos(self) -> list[Pedido]:
@@ -135,3 +411,71 @@ class ListaPedidos:
             actual = actual.siguiente
         return lista_pedidos
 
+    # Recorre los pedidos de forma perezosa (generador), sin copiarlos en una lista.
+    # Si se indica "despues_de", el recorrido empieza en el pedido siguiente al
+    # que tiene ese identificador (cursor de paginación).
+    def iterar_pedidos(self, despues_de: int | None = None) -> Iterator[Pedido]:
+        if despues_de is None:
+            actual = self.cabeza
+        else:
+            nodo = self.indice.get(despues_de)
+            if nodo is not None:
+                actual = nodo.siguiente
+            else:
+                # El pedido del cursor ya no existe (p. ej. se ha eliminado). Como los
+                # identificadores se asignan de forma creciente y los pedidos se añaden
+                # al final, se salta a partir del primer pedido con un identificador mayor.
+                actual = self.cabeza
+                while actual is not None and actual.pedido.id <= despues_de:
+                    actual = actual.siguiente
+
+        while actual is not None:
+            yield actual.pedido
+            actual = actual.siguiente
+
+    # Pedidos de un cliente y/o que contienen un producto, ordenados por identificador.
+    # Se usan los índices secundarios: el cursor se busca con búsqueda binaria y los
+    # pedidos se devuelven de forma perezosa, así que una página cuesta lo que ocupa y
+    # no depende del total de pedidos encontrados. Si se indican los dos filtros, se
+    # recorre la lista más corta y se busca cada pedido en la otra.
+    def filtrar_pedidos(self, nombre_cliente=None, producto_id=None,
+                        despues_de: int | None = None) -> Iterator[Pedido]:
+        conjuntos = []
+        if nombre_cliente is not None:
+            conjuntos.append(self.indice_clientes.get(nombre_cliente, []))
+        if producto_id is not None:
+            conjuntos.append(self.indice_productos.get(producto_id, []))
+        if not conjuntos:
+            yield from self.iterar_pedidos(despues_de)
+            return
+
+        conjuntos.sort(key=len)
+        menor, otros = conjuntos[0], conjuntos[1:]
+        # La posición se vuelve a buscar a partir del último identificador devuelto en
+        # cada paso, porque la lista puede cambiar entre un pedido y el siguiente
+        ultimo = despues_de
+        while True:
+            posicion = 0 if ultimo is None else bisect_right(menor, ultimo)
+            if posicion == len(menor):
+                return
+            ultimo = menor[posicion]
+            if not all(_contiene(otro, ultimo) for otro in otros):
+                continue
+            # El pedido se pudo eliminar mientras se recorrían los resultados
+            nodo = self.indice.get(ultimo)
+            if nodo is not None:
+                yield nodo.pedido
+
+    # Los "n" productos con más unidades vendidas: [(producto_id, unidades), ...]
+    def top_productos(self, n: int) -> list[tuple]:
+        return self.agregados.top_productos(n)
+
+    # (número de pedidos, {producto_id: unidades}) de un cliente
+    def resumen_cliente(self, nombre_cliente) -> tuple[int, dict]:
+        return self.agregados.resumen_cliente(nombre_cliente)
+
+
+# Búsqueda binaria de un identificador en una lista ordenada
+def _contiene(ordenados: list, pedido_id: int) -> bool:
+    posicion = bisect_left(ordenados, pedido_id)
+    return posicion < len(ordenados) and ordenados[posicion] == pedido_id
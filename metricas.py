@@ -0,0 +1,381 @@
+# --------------------------------------------------------------------------------
+#                                     METRICAS.PY
+#
+# Métricas de las operaciones más frecuentes, en formato de texto de Prometheus
+# (endpoint GET /metrics).
+#
+# - Árbol de productos: tiempo de cada búsqueda/inserción y profundidad alcanzada.
+# - Lista de pedidos: tiempo de cada operación y número de nodos recorridos.
+# - JSON: tiempo de lectura del body (loads), de codificación de las respuestas
+#   (dumps) y de "to_dict" de productos y pedidos.
+# - Peticiones: histograma de latencias por ruta y método, y número de
+#   respuestas por código.
+#
+# Las métricas se añaden "envolviendo" los métodos de los objetos ya creados, así
+# que si se desactivan (GESTION_PEDIDOS_METRICAS=0) no se instala nada y no
+# cuestan nada.
+#
+# Opcionalmente, un perfilador por muestreo guarda las pilas de las peticiones
+# lentas en formato "folded" (una línea "f1;f2;f3 muestras" por pila), que se
+# puede convertir en un flamegraph (flamegraph.pl, speedscope, ...).
+# --------------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+
+# Límites de los histogramas
+LIMITES_LATENCIA = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # segundos
+LIMITES_PROFUNDIDAD = (1, 2, 4, 8, 12, 16, 20, 24, 32, 48, 64)
+LIMITES_NODOS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# nombre --> (tipo, descripción, límites del histograma)
+DEFINICIONES = {
+    "gestion_pedidos_peticiones_segundos":
+        ("histogram", "Latencia de las peticiones por ruta y método.", LIMITES_LATENCIA),
+    "gestion_pedidos_respuestas_total":
+        ("counter", "Respuestas enviadas por ruta, método y código.", None),
+    "gestion_pedidos_operacion_segundos":
+        ("histogram", "Duración de las operaciones del árbol de productos y de la lista de pedidos.", LIMITES_LATENCIA),
+    "gestion_pedidos_arbol_profundidad":
+        ("histogram", "Profundidad alcanzada en el árbol de productos.", LIMITES_PROFUNDIDAD),
+    "gestion_pedidos_lista_nodos":
+        ("histogram", "Nodos de la lista de pedidos recorridos por operación.", LIMITES_NODOS),
+    "gestion_pedidos_json_segundos":
+        ("histogram", "Duración de la lectura (loads) y la codificación (dumps) de JSON.", LIMITES_LATENCIA),
+    "gestion_pedidos_to_dict_segundos":
+        ("histogram", "Duración de to_dict por clase.", LIMITES_LATENCIA),
+}
+
+
+class Histograma:
+    __slots__ = ("limites", "cuentas", "suma")
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1) # La última posición es "+Inf"
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+
+
+def _etiquetas(etiquetas: tuple) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for nombre, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metricas:
+    def __init__(self):
+        self._cerrojo = threading.Lock()
+        self._histogramas = {} # (nombre, etiquetas) --> Histograma
+        self._contadores = {} # (nombre, etiquetas) --> valor
+
+    # Histograma de una serie ("etiquetas" es una tupla de pares (nombre, valor)).
+    # Los envoltorios lo obtienen una sola vez y después lo actualizan con "anotar".
+    def histograma(self, nombre: str, etiquetas: tuple) -> Histograma:
+        clave = (nombre, etiquetas)
+        with self._cerrojo:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma(DEFINICIONES[nombre][2])
+            return histograma
+
+    # Añade varias observaciones con una sola adquisición del cerrojo: (histograma, valor), ...
+    def anotar(self, *observaciones):
+        with self._cerrojo:
+            for histograma, valor in observaciones:
+                histograma.observar(valor)
+
+    def observar(self, nombre: str, etiquetas: tuple, valor):
+        self.anotar((self.histograma(nombre, etiquetas), valor))
+
+    def contar(self, nombre: str, etiquetas: tuple, cantidad: int = 1):
+        clave = (nombre, etiquetas)
+        with self._cerrojo:
+            self._contadores[clave] = self._contadores.get(clave, 0) + cantidad
+
+    # Texto en formato Prometheus. "indicadores" son valores instantáneos (gauges):
+    # lista de (nombre, descripción, valor).
+    def texto(self, indicadores: list[tuple] = ()) -> str:
+        with self._cerrojo:
+            histogramas = {clave: (tuple(h.cuentas), h.suma) for clave, h in self._histogramas.items()}
+            contadores = dict(self._contadores)
+
+        lineas = []
+        for nombre, descripcion, valor in indicadores:
+            lineas.append(f"# HELP {nombre} {descripcion}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {_numero(valor)}")
+
+        for nombre, (tipo, descripcion, limites) in DEFINICIONES.items():
+            series = histogramas if tipo == "histogram" else contadores
+            claves = sorted((clave for clave in series if clave[0] == nombre), key=lambda clave: str(clave[1]))
+            if not claves:
+                continue
+            lineas.append(f"# HELP {nombre} {descripcion}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for clave in claves:
+                etiquetas = clave[1]
+                if tipo == "counter":
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {series[clave]}")
+                    continue
+                cuentas, suma = series[clave]
+                acumulado = 0
+                for limite, cuenta in zip(limites + ("+Inf",), cuentas):
+                    acumulado += cuenta
+                    lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', _numero(limite)),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(suma)}")
+                lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulado}")
+        return "\n".join(lineas) + "\n"
+
+
+# ------------------------------------------------------------
+#                     ENVOLTORIOS DE MÉTODOS
+# Se sustituye el método de un objeto (o de una clase) por otro
+# que mide su duración y, si se indica, un valor calculado a
+# partir del resultado (profundidad, nodos recorridos...).
+# ------------------------------------------------------------
+def _medir(metricas: Metricas, funcion, etiquetas: tuple, nombre_valor=None, valor=None):
+    duracion = metricas.histograma("gestion_pedidos_operacion_segundos", etiquetas)
+    if nombre_valor is None:
+        @wraps(funcion)
+        def envoltorio(*argumentos, **opciones):
+            inicio = time.perf_counter()
+            resultado = funcion(*argumentos, **opciones)
+            metricas.anotar((duracion, time.perf_counter() - inicio))
+            return resultado
+        return envoltorio
+
+    histograma = metricas.histograma(nombre_valor, etiquetas)
+
+    @wraps(funcion)
+    def envoltorio(*argumentos, **opciones):
+        inicio = time.perf_counter()
+        resultado = funcion(*argumentos, **opciones)
+        metricas.anotar((duracion, time.perf_counter() - inicio), (histograma, valor(resultado, argumentos)))
+        return resultado
+    return envoltorio
+
+
+# Para los generadores se mide el tiempo de cada "next" (no el del código que los
+# consume) y los elementos devueltos se registran al terminar el recorrido.
+def _medir_generador(metricas: Metricas, funcion, etiquetas: tuple, nombre_valor: str):
+    histograma_duracion = metricas.histograma("gestion_pedidos_operacion_segundos", etiquetas)
+    histograma = metricas.histograma(nombre_valor, etiquetas)
+
+    @wraps(funcion)
+    def envoltorio(*argumentos, **opciones):
+        generador = funcion(*argumentos, **opciones)
+        elementos = 0
+        duracion = 0.0
+        try:
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    elemento = next(generador)
+                except StopIteration:
+                    return
+                finally:
+                    duracion += time.perf_counter() - inicio
+                elementos += 1
+                yield elemento
+        finally:
+            generador.close()
+            metricas.anotar((histograma_duracion, duracion), (histograma, elementos))
+    return envoltorio
+
+
+def instrumentar_productos(arbol, metricas: Metricas):
+    def operacion(nombre):
+        return (("estructura", "arbol_productos"), ("operacion", nombre))
+
+    profundidad = "gestion_pedidos_arbol_profundidad"
+    buscar_con_profundidad = getattr(arbol, "buscar_con_profundidad", None)
+    if buscar_con_profundidad is not None:
+        duracion = metricas.histograma("gestion_pedidos_operacion_segundos", operacion("buscar"))
+        niveles = metricas.histograma(profundidad, operacion("buscar"))
+
+        def buscar(producto_id):
+            inicio = time.perf_counter()
+            producto, nivel = buscar_con_profundidad(producto_id)
+            metricas.anotar((duracion, time.perf_counter() - inicio), (niveles, nivel))
+            return producto
+        arbol.buscar = buscar
+    else:
+        arbol.buscar = _medir(metricas, arbol.buscar, operacion("buscar"))
+
+    # "insertar" devuelve la profundidad a la que ha llegado (si la conoce)
+    arbol.insertar = _medir(metricas, arbol.insertar, operacion("insertar"), profundidad,
+                            lambda resultado, _: resultado if isinstance(resultado, int) else 0)
+    for nombre in ("eliminar", "buscar_varios", "insertar_lote"):
+        if hasattr(arbol, nombre):
+            setattr(arbol, nombre, _medir(metricas, getattr(arbol, nombre), operacion(nombre)))
+
+
+def instrumentar_pedidos(lista, metricas: Metricas):
+    def operacion(nombre):
+        return (("estructura", "lista_pedidos"), ("operacion", nombre))
+
+    nodos = "gestion_pedidos_lista_nodos"
+    # Las operaciones por identificador usan el índice: solo tocan un nodo
+    for nombre in ("agregar_pedido", "buscar_pedido", "actualizar_pedido", "modificar_lineas", "eliminar_pedido"):
+        setattr(lista, nombre, _medir(metricas, getattr(lista, nombre), operacion(nombre), nodos,
+                                      lambda resultado, argumentos: 1))
+    lista.agregar_pedidos = _medir(metricas, lista.agregar_pedidos, operacion("agregar_pedidos"), nodos,
+                                   lambda resultado, argumentos: len(argumentos[0]))
+    lista.listar_pedidos = _medir(metricas, lista.listar_pedidos, operacion("listar_pedidos"), nodos,
+                                  lambda resultado, argumentos: len(resultado))
+    for nombre in ("iterar_pedidos", "filtrar_pedidos"):
+        setattr(lista, nombre, _medir_generador(metricas, getattr(lista, nombre), operacion(nombre), nodos))
+
+
+# Mide "to_dict" de todos los objetos de una clase
+def instrumentar_to_dict(clase, metricas: Metricas):
+    to_dict = clase.to_dict
+    duracion = metricas.histograma("gestion_pedidos_to_dict_segundos", (("clase", clase.__name__),))
+
+    @wraps(to_dict)
+    def envoltorio(self):
+        inicio = time.perf_counter()
+        resultado = to_dict(self)
+        metricas.anotar((duracion, time.perf_counter() - inicio))
+        return resultado
+    clase.to_dict = envoltorio
+
+
+# Proveedor JSON de Flask que mide la lectura de los body (request.get_json)
+# y la codificación de las respuestas.
+class ProveedorJSONMedido(DefaultJSONProvider):
+    metricas = None
+    base = None # Proveedor anterior, que es el que decodifica y codifica (ver "ingesta.py")
+
+    def loads(self, s, **kwargs):
+        inicio = time.perf_counter()
+        resultado = self.base.loads(s, **kwargs)
+        self.metricas.observar("gestion_pedidos_json_segundos", (("operacion", "loads"),), time.perf_counter() - inicio)
+        return resultado
+
+    def dumps(self, obj, **kwargs):
+        inicio = time.perf_counter()
+        resultado = self.base.dumps(obj, **kwargs)
+        self.metricas.observar("gestion_pedidos_json_segundos", (("operacion", "dumps"),), time.perf_counter() - inicio)
+        return resultado
+
+
+# ------------------------------------------------------------
+#                  PERFILADOR POR MUESTREO
+# Un hilo toma cada "intervalo" segundos la pila de los hilos
+# que están atendiendo una petición. Al terminar una petición
+# que ha tardado al menos "umbral" segundos, sus pilas se
+# guardan en "directorio" en formato folded.
+# ------------------------------------------------------------
+class PerfiladorMuestreo:
+    def __init__(self, directorio: str, umbral: float, intervalo: float = 0.005):
+        self.directorio = directorio
+        self.umbral = umbral
+        self.intervalo = intervalo
+        self._activos = {} # identificador del hilo --> Counter(pila --> muestras)
+        self._cerrojo = threading.Lock()
+        self._hilo = None
+        os.makedirs(directorio, exist_ok=True)
+
+    def empezar(self) -> Counter:
+        muestras = Counter()
+        with self._cerrojo:
+            self._activos[threading.get_ident()] = muestras
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+                self._hilo.start()
+        return muestras
+
+    def terminar(self, muestras: Counter, duracion: float, descripcion: str):
+        with self._cerrojo:
+            if self._activos.get(threading.get_ident()) is muestras:
+                del self._activos[threading.get_ident()]
+        if duracion < self.umbral or not muestras:
+            return
+        nombre = re.sub(r"[^A-Za-z0-9_.-]+", "_", descripcion).strip("_")
+        ruta = os.path.join(self.directorio, f"{time.time_ns()}-{nombre}-{duracion * 1e3:.0f}ms.folded")
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            for pila, cuenta in muestras.most_common():
+                fichero.write(f"{pila} {cuenta}\n")
+
+    def _muestrear(self):
+        while True:
+            time.sleep(self.intervalo)
+            marcos = sys._current_frames()
+            with self._cerrojo:
+                for ident, muestras in self._activos.items():
+                    marco = marcos.get(ident)
+                    if marco is not None:
+                        muestras[_pila(marco)] += 1
+
+
+# Pila de llamadas de un marco, de la más externa a la más interna: "f1 (fichero:línea);f2 (...)"
+def _pila(marco) -> str:
+    funciones = []
+    while marco is not None:
+        codigo = marco.f_code
+        funciones.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{marco.f_lineno})")
+        marco = marco.f_back
+    return ";".join(reversed(funciones))
+
+
+# ------------------------------------------------------------
+#                   INSTALACIÓN EN LA APLICACIÓN
+# ------------------------------------------------------------
+def instalar(app, metricas: Metricas, perfilador: PerfiladorMuestreo | None = None):
+    proveedor = ProveedorJSONMedido(app)
+    proveedor.metricas = metricas
+    proveedor.base = app.json
+    # Se conserva la configuración del proveedor anterior (ensure_ascii, sort_keys...)
+    for opcion in ("ensure_ascii", "sort_keys", "compact", "mimetype"):
+        setattr(proveedor, opcion, getattr(app.json, opcion))
+    app.json = proveedor
+
+    @app.before_request
+    def _empezar_medicion():
+        g.inicio_peticion = time.perf_counter()
+        if perfilador is not None:
+            g.muestras_perfilador = perfilador.empezar()
+
+    @app.after_request
+    def _medir_peticion(respuesta):
+        inicio = g.get("inicio_peticion")
+        if inicio is not None:
+            # Las peticiones que no corresponden a ninguna ruta se agrupan (si no,
+            # cada URL distinta crearía una serie nueva)
+            ruta = request.url_rule.rule if request.url_rule is not None else "<sin ruta>"
+            etiquetas = (("ruta", ruta), ("metodo", request.method))
+            metricas.observar("gestion_pedidos_peticiones_segundos", etiquetas, time.perf_counter() - inicio)
+            metricas.contar("gestion_pedidos_respuestas_total", etiquetas + (("codigo", respuesta.status_code),))
+        return respuesta
+
+    # Con las respuestas en streaming, "teardown_request" se ejecuta al terminar de enviarlas
+    @app.teardown_request
+    def _terminar_perfilador(error):
+        muestras = g.pop("muestras_perfilador", None)
+        if perfilador is not None and muestras is not None:
+            perfilador.terminar(muestras, time.perf_counter() - g.inicio_peticion,
+                                f"{request.method} {request.path}")
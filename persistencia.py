@@ -0,0 +1,375 @@
+# --------------------------------------------------------------------------------
+#                                     PERSISTENCIA.PY
+#
+# Persistencia en disco del árbol de productos y de la lista de pedidos.
+#
+# Se utilizan dos ficheros dentro de un directorio de datos:
+#
+# - "registro.log": registro de escritura anticipada (write-ahead log). Cada
+#   operación que modifica los datos (insertar producto, añadir, actualizar,
+#   modificar o eliminar pedido) se añade al final como una línea JSON ANTES de
+#   aplicarla en memoria: si la escritura falla, la operación no se aplica.
+# - "snapshot.bin": copia binaria compacta de todos los datos. Cada cierto
+#   número de operaciones se genera una nueva snapshot y se vacía el registro.
+#
+# Al arrancar se carga la snapshot (leyéndola mediante un fichero mapeado en
+# memoria) y después se vuelven a aplicar las operaciones del registro.
+# --------------------------------------------------------------------------------
+
+import json
+import mmap
+import os
+import struct
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+from productos import Producto, ProductosTreeBST
+
+FICHERO_REGISTRO = "registro.log"
+FICHERO_SNAPSHOT = "snapshot.bin"
+
+# Cabecera de la snapshot:
+# firma, versión, siguiente_id_producto, siguiente_id_pedido, nº productos, nº pedidos
+CABECERA = struct.Struct("<4sHqqqq")
+FIRMA = b"GPSN"
+VERSION = 1
+
+ENTERO = struct.Struct("<q")
+DECIMAL = struct.Struct("<d")
+LONGITUD = struct.Struct("<I")
+
+# Tipos de los valores guardados en la snapshot. Los datos llegan por JSON sin
+# validar su tipo, así que cada valor se guarda con una etiqueta para que al
+# cargarlo se obtenga exactamente el mismo valor (por ejemplo, 13 y no 13.0).
+TIPO_ENTERO = 0
+TIPO_DECIMAL = 1
+TIPO_TEXTO = 2
+TIPO_JSON = 3
+
+
+# ------------------------------------------------------------
+#                   CODIFICACIÓN DE LA SNAPSHOT
+# ------------------------------------------------------------
+def _escribir_valor(buffer: bytearray, valor):
+    if type(valor) is int and -2**63 <= valor < 2**63:
+        buffer.append(TIPO_ENTERO)
+        buffer += ENTERO.pack(valor)
+    elif type(valor) is float:
+        buffer.append(TIPO_DECIMAL)
+        buffer += DECIMAL.pack(valor)
+    else:
+        if isinstance(valor, str):
+            buffer.append(TIPO_TEXTO)
+            datos = valor.encode("utf-8")
+        else:
+            buffer.append(TIPO_JSON)
+            datos = json.dumps(valor).encode("utf-8")
+        buffer += LONGITUD.pack(len(datos))
+        buffer += datos
+
+
+# Devuelve el valor leído y la nueva posición dentro del buffer
+def _leer_valor(buffer, posicion: int):
+    tipo = buffer[posicion]
+    posicion += 1
+    if tipo == TIPO_ENTERO:
+        return ENTERO.unpack_from(buffer, posicion)[0], posicion + ENTERO.size
+    if tipo == TIPO_DECIMAL:
+        return DECIMAL.unpack_from(buffer, posicion)[0], posicion + DECIMAL.size
+
+    longitud = LONGITUD.unpack_from(buffer, posicion)[0]
+    posicion += LONGITUD.size
+    datos = bytes(buffer[posicion:posicion + longitud])
+    posicion += longitud
+    if tipo == TIPO_TEXTO:
+        return datos.decode("utf-8"), posicion
+    return json.loads(datos), posicion
+
+
+def _lineas_a_json(pedido: Pedido) -> list:
+    return [[producto_id, cantidad] for producto_id, cantidad in pedido.lista_pedidos.pares()]
+
+
+def _lineas_desde_json(lineas: list) -> list[LineaPedido]:
+    return [LineaPedido(producto_id=producto_id, cantidad=cantidad) for producto_id, cantidad in lineas]
+
+
+# ------------------------------------------------------------
+#                           PERSISTENCIA
+# Si no se indica ningún directorio, la persistencia queda
+# desactivada y todas las operaciones no hacen nada.
+# ------------------------------------------------------------
+class Persistencia:
+    def __init__(self, directorio: str | None, arbol: ProductosTreeBST, lista: ListaPedidos,
+                 operaciones_por_snapshot: int = 10_000, sincronizar: bool = False):
+        self.directorio = directorio
+        self.arbol = arbol
+        self.lista = lista
+        self.operaciones_por_snapshot = operaciones_por_snapshot
+        self.sincronizar = sincronizar # Si es True, se hace "fsync" tras cada operación
+
+        # Se lleva la cuenta de los siguientes identificadores a partir de las
+        # operaciones registradas, para poder guardarlos en la snapshot.
+        self.siguiente_id_producto = 1
+        self.siguiente_id_pedido = 1
+        self.operaciones_registro = 0 # Operaciones escritas desde la última snapshot
+        self.fichero_registro = None
+
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+
+    @property
+    def activa(self) -> bool:
+        return self.directorio is not None
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre)
+
+    # --------------------------- ARRANQUE ---------------------------
+
+    # Carga la snapshot y el registro en el árbol y la lista.
+    # Devuelve (siguiente_id_producto, siguiente_id_pedido).
+    def cargar(self) -> tuple[int, int]:
+        if not self.activa:
+            return self.siguiente_id_producto, self.siguiente_id_pedido
+
+        self._cargar_snapshot()
+        self._aplicar_registro()
+        self.fichero_registro = open(self._ruta(FICHERO_REGISTRO), "ab")
+
+        # Si el registro ha crecido demasiado, se compacta en una nueva snapshot.
+        if self.operaciones_registro >= self.operaciones_por_snapshot:
+            self.guardar_snapshot()
+
+        return self.siguiente_id_producto, self.siguiente_id_pedido
+
+    def _cargar_snapshot(self):
+        ruta = self._ruta(FICHERO_SNAPSHOT)
+        if not os.path.exists(ruta) or os.path.getsize(ruta) == 0:
+            return
+
+        with open(ruta, "rb") as fichero, \
+                mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            firma, version, siguiente_producto, siguiente_pedido, numero_productos, numero_pedidos = \
+                CABECERA.unpack_from(datos, 0)
+            if firma != FIRMA or version != VERSION:
+                raise ValueError(f"ERROR: El fichero '{ruta}' no es una snapshot válida.")
+            posicion = CABECERA.size
+
+            # Los productos se guardan ordenados por identificador ("in order"),
+            # así que el árbol se construye de una vez a partir de la lista ordenada.
+            productos = []
+            for _ in range(numero_productos):
+                producto_id, posicion = _leer_valor(datos, posicion)
+                nombre, posicion = _leer_valor(datos, posicion)
+                precio, posicion = _leer_valor(datos, posicion)
+                productos.append(Producto(producto_id=producto_id,
+                                          nombre_producto=nombre,
+                                          precio_producto=precio))
+            self.arbol.insertar_lote(productos)
+
+            # Los pedidos se guardan en el orden de la lista enlazada. Se añaden
+            # todos a la vez para que los agregados se calculen por lotes.
+            pedidos = []
+            for _ in range(numero_pedidos):
+                pedido_id, posicion = _leer_valor(datos, posicion)
+                nombre_cliente, posicion = _leer_valor(datos, posicion)
+                numero_lineas = LONGITUD.unpack_from(datos, posicion)[0]
+                posicion += LONGITUD.size
+                lineas = []
+                for _ in range(numero_lineas):
+                    producto_id, posicion = _leer_valor(datos, posicion)
+                    cantidad, posicion = _leer_valor(datos, posicion)
+                    lineas.append(LineaPedido(producto_id=producto_id, cantidad=cantidad))
+                pedidos.append(Pedido(pedido_id=pedido_id,
+                                      nombre_cliente=nombre_cliente,
+                                      lista_pedidos=lineas))
+            self.lista.agregar_pedidos(pedidos)
+
+        self.siguiente_id_producto = siguiente_producto
+        self.siguiente_id_pedido = siguiente_pedido
+
+    def _aplicar_registro(self):
+        ruta = self._ruta(FICHERO_REGISTRO)
+        if not os.path.exists(ruta):
+            return
+
+        # Posición (en bytes) del final de la última línea completa
+        fin_valido = 0
+        with open(ruta, "rb") as fichero:
+            for linea in fichero:
+                try:
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("Línea incompleta")
+                    operacion = json.loads(linea)
+                except ValueError:
+                    # Una última línea incompleta (p. ej. el proceso se detuvo mientras
+                    # se escribía) se descarta: esa operación nunca llegó a confirmarse.
+                    break
+                self._aplicar(operacion)
+                self.operaciones_registro += 1
+                fin_valido += len(linea)
+
+        # Se borra la línea incompleta: si no, las siguientes operaciones se añadirían
+        # detrás de ella y en el próximo arranque tampoco se podrían leer.
+        if fin_valido < os.path.getsize(ruta):
+            os.truncate(ruta, fin_valido)
+
+    def _aplicar(self, operacion: dict):
+        tipo = operacion["op"]
+        if tipo == "insertar_producto":
+            self.arbol.insertar(Producto(producto_id=operacion["id"],
+                                         nombre_producto=operacion["nombre"],
+                                         precio_producto=operacion["precio"]))
+            self.siguiente_id_producto = max(self.siguiente_id_producto, operacion["id"] + 1)
+        elif tipo == "agregar_pedido":
+            # Si el pedido ya está en la snapshot (el proceso se detuvo después de
+            # guardarla pero antes de vaciar el registro), no se vuelve a añadir.
+            if self.lista.buscar_pedido(operacion["id"]) is None:
+                self.lista.agregar_pedido(Pedido(pedido_id=operacion["id"],
+                                                 nombre_cliente=operacion["nombre_cliente"],
+                                                 lista_pedidos=_lineas_desde_json(operacion["lineas"])))
+            self.siguiente_id_pedido = max(self.siguiente_id_pedido, operacion["id"] + 1)
+        elif tipo == "actualizar_pedido":
+            self.lista.actualizar_pedido(operacion["id"],
+                                         Pedido(pedido_id=operacion["id"],
+                                                nombre_cliente=operacion["nombre_cliente"],
+                                                lista_pedidos=_lineas_desde_json(operacion["lineas"])))
+        elif tipo == "modificar_pedido":
+            self.lista.modificar_lineas(operacion["id"],
+                                        {producto_id: cantidad for producto_id, cantidad in operacion["lineas"]},
+                                        operacion.get("nombre_cliente"))
+        elif tipo == "eliminar_pedido":
+            self.lista.eliminar_pedido(operacion["id"])
+        else:
+            raise ValueError(f"ERROR: Operación desconocida en el registro: '{tipo}'.")
+
+    # --------------------------- REGISTRO ---------------------------
+
+    def _escribir(self, operacion: dict):
+        self._escribir_varias([operacion])
+
+    # Escribe varias operaciones seguidas con una única escritura (y "fsync").
+    # Se llama antes de aplicar las operaciones en memoria y con el cerrojo de escritura
+    # adquirido; si lanza una excepción, las operaciones no se deben aplicar.
+    def _escribir_varias(self, operaciones: list[dict]):
+        if not self.activa:
+            return
+
+        # La snapshot se genera antes de escribir las nuevas operaciones: en este momento
+        # las anteriores ya están aplicadas en memoria y las nuevas todavía no.
+        if self.operaciones_registro >= self.operaciones_por_snapshot:
+            self.guardar_snapshot()
+
+        if self.fichero_registro is None:
+            self.fichero_registro = open(self._ruta(FICHERO_REGISTRO), "ab")
+        posicion = self.fichero_registro.tell()
+        try:
+            self.fichero_registro.write(b"".join(
+                json.dumps(operacion, ensure_ascii=False).encode("utf-8") + b"\n" for operacion in operaciones))
+            self.fichero_registro.flush()
+            if self.sincronizar:
+                os.fsync(self.fichero_registro.fileno())
+        except BaseException:
+            # Se deshace la escritura parcial para que las operaciones (que no se van a
+            # aplicar) tampoco se apliquen al volver a arrancar
+            self._descartar_desde(posicion)
+            raise
+
+        self.operaciones_registro += len(operaciones)
+
+    def _descartar_desde(self, posicion: int):
+        fichero, self.fichero_registro = self.fichero_registro, None
+        try:
+            fichero.close()
+        except OSError:
+            pass
+        # Si tampoco se puede truncar, la línea incompleta se descarta al arrancar
+        try:
+            os.truncate(self._ruta(FICHERO_REGISTRO), posicion)
+        except OSError:
+            pass
+
+    def registrar_producto(self, producto: Producto):
+        self.registrar_productos([producto])
+
+    def registrar_productos(self, productos: list[Producto]):
+        if not productos:
+            return
+        self.siguiente_id_producto = max(self.siguiente_id_producto,
+                                         max(producto.id for producto in productos) + 1)
+        self._escribir_varias([{"op": "insertar_producto", "id": producto.id,
+                                "nombre": producto.nombre, "precio": producto.precio}
+                               for producto in productos])
+
+    def registrar_pedido(self, pedido: Pedido):
+        self.registrar_pedidos([pedido])
+
+    def registrar_pedidos(self, pedidos: list[Pedido]):
+        if not pedidos:
+            return
+        self.siguiente_id_pedido = max(self.siguiente_id_pedido,
+                                       max(pedido.id for pedido in pedidos) + 1)
+        self._escribir_varias([{"op": "agregar_pedido", "id": pedido.id,
+                                "nombre_cliente": pedido.nombre_cliente, "lineas": _lineas_a_json(pedido)}
+                               for pedido in pedidos])
+
+    def registrar_actualizacion(self, pedido: Pedido):
+        self._escribir({"op": "actualizar_pedido", "id": pedido.id,
+                        "nombre_cliente": pedido.nombre_cliente, "lineas": _lineas_a_json(pedido)})
+
+    # Solo se guardan las líneas cambiadas (ver "ListaPedidos.modificar_lineas")
+    def registrar_modificacion(self, pedido_id: int, cambios: dict, nombre_cliente=None):
+        operacion = {"op": "modificar_pedido", "id": pedido_id,
+                     "lineas": [[producto_id, cantidad] for producto_id, cantidad in cambios.items()]}
+        if nombre_cliente is not None:
+            operacion["nombre_cliente"] = nombre_cliente
+        self._escribir(operacion)
+
+    def registrar_eliminacion(self, pedido_id: int):
+        self._escribir({"op": "eliminar_pedido", "id": pedido_id})
+
+    # --------------------------- SNAPSHOT ---------------------------
+
+    # Escribe una snapshot con el estado actual y vacía el registro.
+    # La snapshot se escribe primero en un fichero temporal y después se
+    # renombra, de forma que nunca queda una snapshot a medio escribir.
+    def guardar_snapshot(self):
+        if not self.activa:
+            return
+
+        productos = self.arbol.recorrido_inorder()
+        pedidos = self.lista.listar_pedidos()
+
+        buffer = bytearray(CABECERA.pack(FIRMA, VERSION,
+                                         self.siguiente_id_producto, self.siguiente_id_pedido,
+                                         len(productos), len(pedidos)))
+        for producto in productos:
+            _escribir_valor(buffer, producto.id)
+            _escribir_valor(buffer, producto.nombre)
+            _escribir_valor(buffer, producto.precio)
+        for pedido in pedidos:
+            _escribir_valor(buffer, pedido.id)
+            _escribir_valor(buffer, pedido.nombre_cliente)
+            buffer += LONGITUD.pack(len(pedido.lista_pedidos))
+            for producto_id, cantidad in pedido.lista_pedidos.pares():
+                _escribir_valor(buffer, producto_id)
+                _escribir_valor(buffer, cantidad)
+
+        ruta = self._ruta(FICHERO_SNAPSHOT)
+        ruta_temporal = ruta + ".tmp"
+        with open(ruta_temporal, "wb") as fichero:
+            fichero.write(buffer)
+            fichero.flush()
+            os.fsync(fichero.fileno())
+        os.replace(ruta_temporal, ruta)
+
+        # Las operaciones del registro ya están incluidas en la snapshot.
+        if self.fichero_registro is not None:
+            self.fichero_registro.close()
+        self.fichero_registro = open(self._ruta(FICHERO_REGISTRO), "wb")
+        self.operaciones_registro = 0
+
+    def cerrar(self):
+        if self.fichero_registro is not None:
+            self.fichero_registro.close()
+            self.fichero_registro = None
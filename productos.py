@@ -5,12 +5,18 @@
 # para permitir búsquedas eficientes.
 # --------------------------------------------------------------------------------
 
+import operator
+from itertools import islice
+from typing import Iterator
+
 # ------------------------------------------------------------
 #                           PRODUCTO
 # Se define la estructura de "Producto", compuesto por
 # un identificador, nombre y precio. 
 # ------------------------------------------------------------
 class Producto:
+    __slots__ = ("id", "nombre", "precio")
+
     def __init__(self, producto_id: int, nombre_producto: str, precio_producto: float):
         self.id = producto_id
         self.nombre = nombre_producto
@@ -22,93 +28,416 @@ class Producto:
             "nombre": self.nombre,
             "precio": self.precio
         }
+# Los productos con un precio numérico se guardan también en un índice
+# ordenado por (precio, identificador). Los precios que no son números
+# (el precio no se valida al crear el producto) no se pueden ordenar y no
+# se incluyen en el índice.
+def _tiene_precio_ordenable(producto: Producto) -> bool:
+    precio = producto.precio
+    return type(precio) in (int, float) and precio == precio # (NaN != NaN)
+
+
+_clave_precio = operator.attrgetter("precio", "id") # (precio, identificador)
+_identificador = operator.attrgetter("id")
+_precio = operator.attrgetter("precio")
+
+
+INFINITO = float("inf")
+
 # ------------------------------------------------------------
 #                           NODEPRODUCTO 
 # Es el nodo "Producto" del árbol BST
 # ------------------------------------------------------------
 class NodeProducto:
-    def __init__(self, producto: Producto): 
+    __slots__ = ("value", "clave", "left", "right", "altura")
+
+    def __init__(self, producto: Producto, clave=None): 
         self.value = producto # Propio valor (el valor que le pasamos para inicializarlo)
+        self.clave = producto.id if clave is None else clave # Clave por la que se ordena el árbol
         self.left = None # Es posible que tenga un Hijo izquierdo
         self.right = None # ... Hijo derecho
+        self.altura = 1 # Altura del subárbol que cuelga de este nodo (una hoja tiene altura 1)
 
 # ------------------------------------------------------------
 #                           PRODUCTOSTREEBST 
-# Es el árbol BST
+# Es el árbol BST (auto-equilibrado como un árbol AVL)
+#
+# Los identificadores de los productos se generan de forma secuencial,
+# por lo que un BST sin equilibrar acaba convertido en una lista (todas
+# las inserciones van a la derecha). Tras cada inserción se rotan los
+# nodos desequilibrados para que la altura sea siempre O(log n).
+# Todos los recorridos son iterativos para no depender del límite de
+# recursión de Python.
+#
+# Por defecto el árbol se ordena por el identificador del producto. Con
+# "clave" se puede indicar otra función de ordenación; así se construye el
+# índice auxiliar de precios ("indice_precios"), que es otro árbol AVL
+# ordenado por (precio, identificador).
 # -------------------------------------------------------------
 class ProductosTreeBST:
-    def __init__(self):
+    def __init__(self, clave=None):
         self.root = None # Raíz del árbol
+        self.total = 0 # Número de productos almacenados
+        self._clave = clave # Función que calcula la clave de un producto (None: su identificador)
+        # Solo el árbol principal (ordenado por identificador) tiene índice de precios
+        self.indice_precios = ProductosTreeBST(clave=_clave_precio) if clave is None else None
 
-    # Inserción de un nuevo Producto (nodo) en el árbol
-    def insertar(self, producto: Producto):
-        self.root = self.insertar_rec(self.root, producto)
+    def __len__(self) -> int:
+        return self.total
+
+    def _clave_de(self, producto: Producto):
+        return producto.id if self._clave is None else self._clave(producto)
 
-    # Inserción en el árbol (recursividad)    
+    # Altura de un nodo (un nodo vacío tiene altura 0)
+    @staticmethod
+    def _altura(nodo: NodeProducto | None) -> int:
+        return nodo.altura if nodo is not None else 0
+
+    def _actualizar_altura(self, nodo: NodeProducto):
+        nodo.altura = 1 + max(self._altura(nodo.left), self._altura(nodo.right))
+
+    #        y                x
+    #       / \              / \
+    #      x   C    -->     A   y
+    #     / \                  / \
+    #    A   B                B   C
+    def _rotar_derecha(self, y: NodeProducto) -> NodeProducto:
+        x = y.left
+        y.left = x.right
+        x.right = y
+        self._actualizar_altura(y)
+        self._actualizar_altura(x)
+        return x
+
+    #      x                    y
+    #     / \                  / \
+    #    A   y      -->       x   C
+    #       / \              / \
+    #      B   C            A   B
+    def _rotar_izquierda(self, x: NodeProducto) -> NodeProducto:
+        y = x.right
+        x.right = y.left
+        y.left = x
+        self._actualizar_altura(x)
+        self._actualizar_altura(y)
+        return y
+
+    # Se vuelve a equilibrar un nodo y se devuelve la nueva raíz de su subárbol.
+    def _equilibrar(self, nodo: NodeProducto) -> NodeProducto:
+        self._actualizar_altura(nodo)
+        balance = self._altura(nodo.left) - self._altura(nodo.right)
+
+        if balance > 1:
+            # Subárbol izquierdo demasiado alto (caso izquierda-derecha: doble rotación)
+            if self._altura(nodo.left.left) < self._altura(nodo.left.right):
+                nodo.left = self._rotar_izquierda(nodo.left)
+            return self._rotar_derecha(nodo)
+
+        if balance < -1:
+            # Subárbol derecho demasiado alto (caso derecha-izquierda: doble rotación)
+            if self._altura(nodo.right.right) < self._altura(nodo.right.left):
+                nodo.right = self._rotar_derecha(nodo.right)
+            return self._rotar_izquierda(nodo)
+
+        return nodo
+
+    # Mantiene el índice de precios al insertar o sustituir un producto
+    def _actualizar_indice_precios(self, anterior: Producto | None, producto: Producto):
+        if self.indice_precios is None:
+            return
+        if anterior is not None and _tiene_precio_ordenable(anterior):
+            self.indice_precios.eliminar(_clave_precio(anterior))
+        if _tiene_precio_ordenable(producto):
+            self.indice_precios.insertar(producto)
+
+    # Inserción de un nuevo Producto (nodo) en el árbol
     # En el árbol binario se tiene una ordenación.
     # Si el valor es más pequeño, nos vamos a la izquierda.
-    # Si el valor es más grande, nos vamos  a la derecha
-
-    # insert(Raíz donde le vamos a insertar el nuevo nodo y el valor del nuevo nodo)
-    def insertar_rec(self, nodo: NodeProducto, producto: Producto): 
-        if nodo is None: # Raíz no definida, significa que el nuevo nodo insertado será la raíz.
-            return NodeProducto(producto) 
-        if producto.id < nodo.value.id: 
-            # Si el valor que se quiere insertar es más pequeño que el nodo actual, 
-            # significa que se añadirá en su parte izquierda. 
-            # Por tanto, se va a insertar su hijo izquierdo
-            nodo.left = self.insertar_rec(nodo.left, producto)
-            
-        else: 
-            # Si el valor que se quiere insertar es más grande que el nodo actual,
-            # significa que se añadirá en su parte derecha.
-            # Por tanto, se va a insertar su hijo derecho.
-            nodo.right = self.insertar_rec(nodo.right, producto)
-        return nodo
-    
+    # Si el valor es más grande, nos vamos  a la derecha.
+    # Si ya existe un producto con ese identificador, se sustituye.
+    # Devuelve la profundidad a la que se ha llegado (la usan las métricas).
+    def insertar(self, producto: Producto) -> int:
+        clave = self._clave_de(producto)
+        # Se baja por el árbol guardando el camino recorrido (los padres),
+        # para después subir equilibrando sin usar recursividad.
+        camino = []
+        nodo = self.root
+        while nodo is not None:
+            if clave == nodo.clave:
+                anterior = nodo.value
+                nodo.value = producto
+                self._actualizar_indice_precios(anterior, producto)
+                return len(camino) + 1
+            camino.append(nodo)
+            if clave < nodo.clave:
+                nodo = nodo.left
+            else:
+                nodo = nodo.right
+
+        hijo = NodeProducto(producto, clave)
+        self.total += 1
+        self._actualizar_indice_precios(None, producto)
+        profundidad = len(camino) + 1
+
+        # Se sube desde el nuevo nodo hasta la raíz, enganchando cada subárbol
+        # (ya equilibrado) a su padre.
+        while camino:
+            padre = camino.pop()
+            if clave < padre.clave:
+                padre.left = hijo
+            else:
+                padre.right = hijo
+            altura_anterior = padre.altura
+            hijo = self._equilibrar(padre)
+            # Si la altura del subárbol no ha cambiado y no ha hecho falta rotar,
+            # los ancestros no se ven afectados y se puede terminar antes.
+            if hijo is padre and padre.altura == altura_anterior:
+                return profundidad
+        self.root = hijo
+        return profundidad
+
+    # Elimina el producto con una determinada clave y lo devuelve (None si no existe).
+    # Se usa para mantener el índice de precios cuando cambia el precio de un producto
+    # (en el árbol principal también se quita el producto del índice de precios).
+    def eliminar(self, clave) -> Producto | None:
+        camino = []
+        nodo = self.root
+        while nodo is not None and nodo.clave != clave:
+            camino.append(nodo)
+            if clave < nodo.clave:
+                nodo = nodo.left
+            else:
+                nodo = nodo.right
+        if nodo is None:
+            return None
+        eliminado = nodo.value
+
+        # Si el nodo tiene dos hijos, se sustituye por su sucesor (el menor de su
+        # subárbol derecho) y es el sucesor el que se quita del árbol.
+        if nodo.left is not None and nodo.right is not None:
+            camino.append(nodo)
+            sucesor = nodo.right
+            while sucesor.left is not None:
+                camino.append(sucesor)
+                sucesor = sucesor.left
+            nodo.value, nodo.clave = sucesor.value, sucesor.clave
+            nodo = sucesor
+
+        # El nodo que se quita tiene como mucho un hijo, que ocupa su lugar.
+        hijo = nodo.left if nodo.left is not None else nodo.right
+        quitado = nodo
+        self.total -= 1
+
+        # Se sube hasta la raíz equilibrando cada ancestro.
+        while camino:
+            padre = camino.pop()
+            if padre.left is quitado:
+                padre.left = hijo
+            else:
+                padre.right = hijo
+            quitado = padre
+            hijo = self._equilibrar(padre)
+        self.root = hijo
+        if self.indice_precios is not None and _tiene_precio_ordenable(eliminado):
+            self.indice_precios.eliminar(_clave_precio(eliminado))
+        return eliminado
+
     # Buscar producto por un determinado identificador
     def buscar(self, producto_id: int) -> Producto | None :
         # Se busca un producto por su identificador (ID).
         # Devuelve como redultado:
         # - Producto: el propio producto.
         # - None: si no se ha encontrado.
-        node = self.buscar_rec(self.root, producto_id)
-        if node is None:
-            return None 
+        node = self.root
+        while node is not None:
+            # Si se ha encontrado un nodo con ese identificador, se devuelve el producto
+            if producto_id == node.clave:
+                return node.value
+            # Si el identificador es más pequeño que el nodo, 
+            # significa que hay que buscar en la parte IZQUIERDA.
+            # En otro caso, hay que buscar en la parte DERECHA.
+            if producto_id < node.clave:
+                node = node.left
+            else:
+                node = node.right
+        return None
+
+    # Igual que "buscar", pero devuelve también la profundidad alcanzada (número
+    # de nodos visitados). La usan las métricas (ver "metricas.py").
+    def buscar_con_profundidad(self, producto_id: int) -> tuple[Producto | None, int]:
+        profundidad = 0
+        node = self.root
+        while node is not None:
+            profundidad += 1
+            if producto_id == node.clave:
+                return node.value, profundidad
+            if producto_id < node.clave:
+                node = node.left
+            else:
+                node = node.right
+        return None, profundidad
+
+    # Buscar varios productos a la vez.
+    # Los identificadores se ordenan (sin repetidos) y se resuelven en un único
+    # recorrido "in order" del árbol, avanzando a la vez por la lista de
+    # identificadores y sin bajar a los subárboles donde no queda ninguno.
+    # Devuelve un diccionario identificador --> Producto con los encontrados.
+    def buscar_varios(self, producto_ids) -> dict[int, Producto]:
+        pendientes = sorted(set(producto_ids))
+        res = {}
+        i = 0
+        pila = []
+        node = self.root
+        while i < len(pendientes) and (pila or node is not None):
+            # Se baja hacia el siguiente identificador pendiente
+            while node is not None:
+                if pendientes[i] < node.clave:
+                    pila.append(node)
+                    node = node.left
+                elif pendientes[i] == node.clave:
+                    pila.append(node)
+                    node = None
+                else:
+                    # El nodo y todo su subárbol izquierdo son menores: se saltan
+                    node = node.right
+            if not pila:
+                break
+
+            node = pila.pop()
+            # Los identificadores menores que el nodo actual no existen en el árbol
+            while i < len(pendientes) and pendientes[i] < node.clave:
+                i += 1
+            if i < len(pendientes) and pendientes[i] == node.clave:
+                res[node.clave] = node.value
+                i += 1
+            node = node.right
+        return res
+
+    # Inserción de muchos productos a la vez.
+    # Si el lote es grande respecto al árbol, en lugar de hacer "n" inserciones
+    # se mezclan (merge) los productos existentes, que ya están ordenados, con los
+    # nuevos y se reconstruye el árbol equilibrado en O(n). Si el lote es pequeño,
+    # sale más barato insertarlos uno a uno (O(m log n)).
+    # Si un identificador ya existe, el producto nuevo sustituye al antiguo.
+    def insertar_lote(self, productos: list[Producto]):
+        if not productos:
+            return
+        clave = self._clave or _identificador
+        nuevos = sorted(productos, key=clave)
+
+        if len(nuevos) * max(1, self.altura()) < self.total + len(nuevos):
+            for producto in nuevos:
+                self.insertar(producto)
+            return
+
+        existentes = self.recorrido_inorder()
+        # Caso habitual: los identificadores nuevos son todos mayores que los existentes
+        if not existentes or clave(existentes[-1]) < clave(nuevos[0]):
+            mezcla = existentes + nuevos
+        else:
+            mezcla = []
+            i = j = 0
+            while i < len(existentes) and j < len(nuevos):
+                if clave(existentes[i]) < clave(nuevos[j]):
+                    mezcla.append(existentes[i])
+                    i += 1
+                elif clave(existentes[i]) > clave(nuevos[j]):
+                    mezcla.append(nuevos[j])
+                    j += 1
+                else:
+                    i += 1 # Mismo identificador: se queda el producto nuevo
+            mezcla.extend(existentes[i:])
+            mezcla.extend(nuevos[j:])
+
+        # Si el lote traía identificadores repetidos, se queda el último de ellos
+        claves = list(map(clave, mezcla))
+        if all(map(operator.lt, claves, islice(claves, 1, None))):
+            ordenados = mezcla
         else:
-            return node.value
+            ordenados = []
+            claves_ordenados = []
+            for producto, clave_producto in zip(mezcla, claves):
+                if claves_ordenados and claves_ordenados[-1] == clave_producto:
+                    ordenados[-1] = producto
+                else:
+                    ordenados.append(producto)
+                    claves_ordenados.append(clave_producto)
+            claves = claves_ordenados
 
-    def buscar_rec(self, node:NodeProducto, producto_id: int) -> NodeProducto | None:
+        self._reconstruir(ordenados, claves)
+        if self.indice_precios is not None:
+            # Los productos ya están ordenados por identificador y la ordenación es estable:
+            # basta con ordenar por precio para que queden ordenados por (precio, identificador)
+            self.indice_precios._reconstruir(sorted(filter(_tiene_precio_ordenable, ordenados), key=_precio))
 
-        # Si no hay nada, significa que estámos en un árbol vacío
-        if node is None:
+    # Sustituye el contenido del árbol por los productos de una lista ya ordenada
+    # (con sus claves, si ya están calculadas)
+    def _reconstruir(self, ordenados: list[Producto], claves: list | None = None):
+        if claves is None:
+            claves = list(map(self._clave or _identificador, ordenados))
+        self.root = self._construir_equilibrado(ordenados, claves, 0, len(ordenados) - 1)
+        self.total = len(ordenados)
+
+    # Construye un árbol equilibrado a partir de una lista ordenada: el elemento
+    # central es la raíz y cada mitad forma un subárbol. La recursividad solo
+    # llega a una profundidad de log2(n), así que no hay riesgo de superar el límite.
+    # Un subárbol construido así con n nodos tiene altura n.bit_length().
+    def _construir_equilibrado(self, ordenados: list[Producto], claves: list,
+                               inicio: int, fin: int) -> NodeProducto | None:
+        if inicio > fin:
             return None
-        
-        # Si se ha encontrado un nodo con ese identificador, se devuelve el producto
-        if node.value.id == producto_id:
-            return node
-        
-        # Si el identificador es más pequeño que el nodo, 
-        # significa que hay que buscar en la parte IZQUIERDA.
-        if producto_id < node.value.id:
-            return self.buscar_rec(node.left,producto_id)
-
-        # Si el identificador es más grande que el nodo,
-        # significa que hay que buscar en la parte DERECHA.
-        if producto_id > node.value.id:
-            return self.buscar_rec(node.right,producto_id)
-        
+        medio = (inicio + fin) // 2
+        nodo = NodeProducto(ordenados[medio], claves[medio])
+        if inicio < medio:
+            nodo.left = self._construir_equilibrado(ordenados, claves, inicio, medio - 1)
+        if medio < fin:
+            nodo.right = self._construir_equilibrado(ordenados, claves, medio + 1, fin)
+        nodo.altura = (fin - inicio + 1).bit_length()
+        return nodo
 
 #   Recorrer el árbol en "in order"
     def recorrido_inorder(self) -> list[Producto]:
-        result = []
-        self.recorrido_inorder_rec(self.root, result)
-        return result
-    
-    def recorrido_inorder_rec(self, node: NodeProducto, result: list):
-        if node is not None:
-            self.recorrido_inorder_rec(node.left, result)
-            result.append(node.value)
-            self.recorrido_inorder_rec(node.right, result)
-
-        
+        return list(self.iterar_rango())
+
+    # Recorrido "in order" perezoso (generador) de los productos cuya clave está
+    # entre "desde" y "hasta" (ambos incluidos; None indica sin límite).
+    # No se baja a los subárboles que quedan fuera del rango, así que el coste
+    # es O(log n + k), siendo k el número de productos devueltos.
+    def iterar_rango(self, desde=None, hasta=None) -> Iterator[Producto]:
+        pila = []
+        node = self.root
+        # Se usa una pila explícita en lugar de recursividad.
+        while pila or node is not None:
+            # Se baja todo lo posible por la izquierda, saltando los nodos
+            # (y su subárbol izquierdo) menores que "desde"
+            while node is not None:
+                if desde is not None and node.clave < desde:
+                    node = node.right
+                else:
+                    pila.append(node)
+                    node = node.left
+            if not pila:
+                return
+            node = pila.pop()
+            if hasta is not None and node.clave > hasta:
+                return
+            yield node.value
+            node = node.right
+
+    # Productos con un precio entre "precio_min" y "precio_max" (ambos incluidos),
+    # ordenados por precio (y por identificador si tienen el mismo precio).
+    # Con "despues_de" (identificador de producto) se continúa a partir de ese
+    # producto, para paginar los resultados.
+    def iterar_por_precio(self, precio_min=None, precio_max=None,
+                          despues_de: int | None = None) -> Iterator[Producto]:
+        desde = (precio_min if precio_min is not None else -INFINITO, -INFINITO)
+        hasta = (precio_max if precio_max is not None else INFINITO, INFINITO)
+        if despues_de is not None:
+            producto = self.buscar(despues_de)
+            if producto is not None and _tiene_precio_ordenable(producto):
+                desde = max(desde, (producto.precio, despues_de + 1))
+        return self.indice_precios.iterar_rango(desde, hasta)
+
+    # Altura total del árbol (útil para comprobar que está equilibrado)
+    def altura(self) -> int:
+        return self._altura(self.root)
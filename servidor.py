@@ -0,0 +1,337 @@
+# --------------------------------------------------------------------------------
+#                                     SERVIDOR.PY
+#
+# Punto de entrada para producción ("app.run(debug=True)" arranca el servidor de
+# desarrollo de Flask, con el depurador activado).
+#
+# Modos:
+#   - asyncio: servidor HTTP/1.1 con asyncio que ejecuta la aplicación ASGI de
+#     "asgi.py". Un único hilo atiende todas las conexiones, que se mantienen
+#     abiertas entre peticiones (keep-alive), y las vistas se ejecutan en unos
+#     pocos hilos, así que cientos de clientes concurrentes no necesitan cientos
+#     de hilos.
+#   - hilos: servidor WSGI de werkzeug con un hilo por conexión (el servidor que
+#     se usaba hasta ahora, pero sin el depurador).
+#
+# Workers: con "--workers N" se arrancan N procesos que escuchan en el mismo puerto
+# (SO_REUSEPORT; el sistema operativo reparte las conexiones). Cada proceso tiene
+# su propia memoria, así que con más de un worker hay que usar el almacenamiento
+# SQLite (GESTION_PEDIDOS_SQLITE). En modo asyncio, "--hilos N" indica cuántos
+# hilos ejecutan las vistas (por defecto 8, ver "asgi.py").
+#
+# Con "--catalogo FICHERO" se cargan los productos de ese fichero al arrancar, si
+# todavía no hay ninguno (ver "catalogo.py").
+#
+# Uso:
+#   python servidor.py [--modo asyncio|hilos] [--host HOST] [--puerto PUERTO]
+#                      [--workers N] [--hilos N] [--catalogo FICHERO]
+# --------------------------------------------------------------------------------
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from urllib.parse import unquote
+
+LIMITE_CABECERAS = 64 * 1024 # Tamaño máximo de la línea de petición más las cabeceras
+ESPERA_KEEP_ALIVE = 5 # Segundos que se mantiene abierta una conexión sin peticiones
+TAMAÑO_LECTURA = 64 * 1024 # Bytes del body que se leen cada vez
+
+RAZONES = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+           404: "Not Found", 405: "Method Not Allowed", 413: "Content Too Large",
+           431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+class PeticionIncorrecta(Exception):
+    pass
+
+
+# ------------------------------------------------------------
+#                 SERVIDOR HTTP/1.1 CON ASYNCIO
+# ------------------------------------------------------------
+def _analizar_cabecera(datos: bytes):
+    lineas = datos[:-4].split(b"\r\n")
+    try:
+        metodo, objetivo, version = lineas[0].decode("latin-1").split(" ")
+    except ValueError:
+        raise PeticionIncorrecta("Línea de petición incorrecta") from None
+    if version not in ("HTTP/1.0", "HTTP/1.1"):
+        raise PeticionIncorrecta("Versión de HTTP no soportada")
+    cabeceras = []
+    for linea in lineas[1:]:
+        nombre, separador, valor = linea.partition(b":")
+        if not separador:
+            raise PeticionIncorrecta("Cabecera incorrecta")
+        cabeceras.append((nombre.strip().lower(), valor.strip()))
+    return metodo, objetivo, version[5:], cabeceras
+
+
+class ConexionHTTP:
+    def __init__(self, aplicacion, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        self.aplicacion = aplicacion
+        self.lector = lector
+        self.escritor = escritor
+        self.cliente = escritor.get_extra_info("peername")
+        self.servidor = escritor.get_extra_info("sockname")
+        # Sin el algoritmo de Nagle: las respuestas se envían en cuanto se escriben
+        sock = escritor.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    async def atender(self):
+        try:
+            while await self._peticion():
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.escritor.close()
+
+    async def _error(self, codigo: int):
+        cuerpo = f'{{"message": "ERROR: {RAZONES[codigo]}"}}\n'.encode("utf-8")
+        self.escritor.write(f"HTTP/1.1 {codigo} {RAZONES[codigo]}\r\ncontent-type: application/json\r\n"
+                            f"content-length: {len(cuerpo)}\r\nconnection: close\r\n\r\n".encode("latin-1") + cuerpo)
+        await self.escritor.drain()
+
+    # Atiende una petición. Devuelve True si la conexión sigue abierta (keep-alive).
+    async def _peticion(self) -> bool:
+        try:
+            datos = await asyncio.wait_for(self.lector.readuntil(b"\r\n\r\n"), ESPERA_KEEP_ALIVE)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            await self._error(431)
+            return False
+        try:
+            metodo, objetivo, version, cabeceras = _analizar_cabecera(datos)
+        except PeticionIncorrecta:
+            await self._error(400)
+            return False
+
+        valores = {}
+        for nombre, valor in cabeceras:
+            valores[nombre] = valor.lower()
+        conexion = valores.get(b"connection", b"")
+        mantener = b"close" not in conexion if version == "1.1" else b"keep-alive" in conexion
+        por_trozos = b"chunked" in valores.get(b"transfer-encoding", b"")
+        try:
+            restante = 0 if por_trozos else int(valores.get(b"content-length", b"0"))
+        except ValueError:
+            await self._error(400)
+            return False
+        if b"100-continue" in valores.get(b"expect", b""):
+            self.escritor.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        ruta, _, consulta = objetivo.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": version,
+            "method": metodo,
+            "scheme": "http",
+            "path": unquote(ruta),
+            "raw_path": ruta.encode("latin-1"),
+            "query_string": consulta.encode("latin-1"),
+            "root_path": "",
+            "headers": cabeceras,
+            "client": self.cliente,
+            "server": self.servidor,
+        }
+
+        # Estado de la petición, compartido por "receive" y "send"
+        estado = {"terminado": False, "respuesta": None, "por_trozos": False, "enviado": False}
+
+        async def receive():
+            nonlocal restante
+            if estado["terminado"]:
+                return {"type": "http.disconnect"}
+            if por_trozos:
+                linea = await self.lector.readuntil(b"\r\n")
+                tamaño = int(linea.split(b";")[0], 16)
+                if tamaño == 0:
+                    # Se descartan las cabeceras finales ("trailers") hasta la línea vacía
+                    while await self.lector.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    estado["terminado"] = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                trozo = await self.lector.readexactly(tamaño + 2)
+                return {"type": "http.request", "body": trozo[:-2], "more_body": True}
+            trozo = await self.lector.readexactly(min(restante, TAMAÑO_LECTURA)) if restante else b""
+            restante -= len(trozo)
+            estado["terminado"] = restante == 0
+            return {"type": "http.request", "body": trozo, "more_body": restante > 0}
+
+        async def send(mensaje):
+            nonlocal mantener
+            if mensaje["type"] == "http.response.start":
+                estado["respuesta"] = (mensaje["status"], list(mensaje.get("headers", [])))
+                return
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+            if not estado["enviado"]:
+                codigo, cabeceras_respuesta = estado["respuesta"]
+                nombres = {nombre.lower() for nombre, _ in cabeceras_respuesta}
+                sin_cuerpo = metodo == "HEAD" or codigo in (204, 304) or codigo < 200
+                if b"content-length" not in nombres and not sin_cuerpo:
+                    if not mas:
+                        cabeceras_respuesta.append((b"content-length", str(len(cuerpo)).encode("latin-1")))
+                    elif version == "1.1":
+                        cabeceras_respuesta.append((b"transfer-encoding", b"chunked"))
+                        estado["por_trozos"] = True
+                    else:
+                        mantener = False # El final del body se indica cerrando la conexión
+                if not estado["terminado"]:
+                    mantener = False # La aplicación no ha leído el body completo
+                cabeceras_respuesta.append((b"connection", b"keep-alive" if mantener else b"close"))
+                texto = f"HTTP/1.1 {codigo} {RAZONES.get(codigo, '')}\r\n".encode("latin-1")
+                texto += b"".join(nombre + b": " + valor + b"\r\n" for nombre, valor in cabeceras_respuesta)
+                salida = [texto + b"\r\n"]
+                estado["enviado"] = True
+                estado["sin_cuerpo"] = sin_cuerpo
+            else:
+                salida = []
+            # Las cabeceras y el body se escriben de una vez (un solo envío si caben)
+            if not estado["sin_cuerpo"]:
+                if estado["por_trozos"]:
+                    if cuerpo:
+                        salida.append(f"{len(cuerpo):x}\r\n".encode("latin-1") + cuerpo + b"\r\n")
+                    if not mas:
+                        salida.append(b"0\r\n\r\n")
+                elif cuerpo:
+                    salida.append(cuerpo)
+            self.escritor.write(b"".join(salida))
+            await self.escritor.drain()
+
+        try:
+            await self.aplicacion(scope, receive, send)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return False
+        except Exception:
+            logging.getLogger(__name__).exception("Error al atender la petición %s %s", metodo, objetivo)
+            if not estado["enviado"]:
+                await self._error(500)
+            return False
+        if not estado["enviado"]:
+            await self._error(500)
+            return False
+        return mantener
+
+
+async def servir_asyncio(aplicacion, sock: socket.socket):
+    # Arranque de la aplicación (mensajes "lifespan" de ASGI)
+    entrada = asyncio.Queue()
+    salida = asyncio.Queue()
+    ciclo = asyncio.create_task(aplicacion({"type": "lifespan", "asgi": {"version": "3.0"}},
+                                           entrada.get, salida.put))
+    await entrada.put({"type": "lifespan.startup"})
+    await salida.get()
+
+    async def nueva_conexion(lector, escritor):
+        await ConexionHTTP(aplicacion, lector, escritor).atender()
+
+    servidor = await asyncio.start_server(nueva_conexion, sock=sock, limit=LIMITE_CABECERAS)
+    parar = asyncio.Event()
+    bucle = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        bucle.add_signal_handler(senal, parar.set)
+    async with servidor:
+        await parar.wait()
+
+    await entrada.put({"type": "lifespan.shutdown"})
+    await salida.get()
+    await ciclo
+
+
+# ------------------------------------------------------------
+#                           WORKERS
+# ------------------------------------------------------------
+def crear_socket(host: str, puerto: int, compartido: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if compartido:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, puerto))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker(modo: str, host: str, puerto: int, compartido: bool, hilos: int | None):
+    if hilos is not None:
+        os.environ["GESTION_PEDIDOS_ASGI_HILOS"] = str(hilos)
+    # La aplicación se importa (y carga sus datos) antes de abrir el socket, para no
+    # aceptar conexiones hasta que esté lista
+    if modo == "asyncio":
+        from asgi import aplicacion
+        sock = crear_socket(host, puerto, compartido)
+        asyncio.run(servir_asyncio(aplicacion, sock))
+    else:
+        from werkzeug.serving import make_server
+        import app as api
+        sock = crear_socket(host, puerto, compartido)
+        # Sin registrar cada petición, igual que el modo asyncio
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        servidor = make_server(host, puerto, api.app, threaded=True, fd=sock.fileno())
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            api.persistencia.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de la API de gestión de pedidos")
+    parser.add_argument("--modo", choices=["asyncio", "hilos"], default="asyncio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--hilos", type=int, default=None,
+                        help="hilos que ejecutan las vistas en modo asyncio (por defecto 8)")
+    parser.add_argument("--catalogo", default=None,
+                        help="fichero de productos (CSV o binario) que se carga al arrancar si no hay productos")
+    argumentos = parser.parse_args()
+
+    if argumentos.hilos is not None and argumentos.hilos < 1:
+        parser.error("--hilos debe ser mayor que 0")
+    if argumentos.workers > 1 and "GESTION_PEDIDOS_SQLITE" not in os.environ:
+        parser.error("con más de un worker hay que usar SQLite (variable GESTION_PEDIDOS_SQLITE), "
+                     "ya que cada proceso tiene su propia memoria")
+
+    if argumentos.catalogo is not None:
+        os.environ["GESTION_PEDIDOS_CATALOGO"] = argumentos.catalogo
+        # El proceso solo va a servir la API: los objetos del catálogo se congelan (gc.freeze)
+        os.environ.setdefault("GESTION_PEDIDOS_CATALOGO_CONGELAR", "1")
+        if argumentos.workers > 1:
+            # Con varios workers el catálogo se carga una sola vez en SQLite antes de arrancarlos
+            import catalogo
+            from almacenamiento import ContadorSQLite, ProductosSQLite
+            productos = ProductosSQLite(os.environ["GESTION_PEDIDOS_SQLITE"])
+            if len(productos) == 0:
+                catalogo.sembrar(productos, ContadorSQLite(os.environ["GESTION_PEDIDOS_SQLITE"], "productos"),
+                                 argumentos.catalogo)
+
+    if argumentos.workers == 1:
+        worker(argumentos.modo, argumentos.host, argumentos.puerto, False, argumentos.hilos)
+        return
+
+    procesos = [multiprocessing.Process(target=worker, args=(argumentos.modo, argumentos.host, argumentos.puerto,
+                                                             True, argumentos.hilos))
+                for _ in range(argumentos.workers)]
+    for proceso in procesos:
+        proceso.start()
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.join()
+
+
+if __name__ == '__main__':
+    main()
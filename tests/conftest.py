@@ -0,0 +1,32 @@
+# --------------------------------------------------------------------------------
+#                                     CONFTEST.PY
+#
+# Configuración común de las pruebas (pytest). Los módulos del proyecto están en
+# la raíz del repositorio, así que se añade al "sys.path" para poder importarlos
+# aunque se ejecute "pytest" desde otro directorio.
+#
+# Uso (desde la raíz del proyecto):
+#   python -m pytest -q
+# --------------------------------------------------------------------------------
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# La aplicación se configura al importarla (variables GESTION_PEDIDOS_*): se importa una
+# sola vez, sin persistencia ni archivo, y todas las pruebas comparten sus datos.
+@pytest.fixture(scope="session")
+def api():
+    for clave in [clave for clave in os.environ if clave.startswith("GESTION_PEDIDOS_")]:
+        del os.environ[clave]
+    import app
+    return app
+
+
+@pytest.fixture
+def cliente(api):
+    return api.app.test_client()
@@ -0,0 +1,90 @@
+# --------------------------------------------------------------------------------
+#                                  TEST_ARCHIVO.PY
+#
+# Pruebas del archivo de pedidos antiguos: búsqueda del bloque de cada pedido,
+# caché de bloques y carga de los segmentos al arrancar.
+# --------------------------------------------------------------------------------
+
+import os
+
+import pytest
+
+import archivo
+from archivo import ArchivoPedidos
+from lista_enlazada_pedidos import LineaPedido, Pedido
+
+
+def _pedidos(ids) -> list[Pedido]:
+    return [Pedido(pedido_id, "Ñandú" if pedido_id % 3 else f"Cliente {pedido_id}",
+                   [LineaPedido(pedido_id % 5 + 1, 2), LineaPedido(7, pedido_id)])
+            for pedido_id in ids]
+
+
+@pytest.fixture
+def archivados(tmp_path, monkeypatch):
+    # Bloques pequeños para tener varios bloques por segmento
+    monkeypatch.setattr(archivo, "PEDIDOS_POR_BLOQUE", 7)
+    # Dos segmentos; faltan algunos pedidos (eliminados antes de archivarse)
+    primero = [pedido_id for pedido_id in range(1, 41) if pedido_id % 10 != 4]
+    segundo = list(range(61, 90))
+    pedidos = _pedidos(primero) + _pedidos(segundo)
+    archivo_pedidos = ArchivoPedidos(str(tmp_path), bloques_en_cache=2)
+    archivo_pedidos.archivar(pedidos[:len(primero)])
+    archivo_pedidos.archivar(pedidos[len(primero):])
+    yield archivo_pedidos, {pedido.id: pedido.to_dict() for pedido in pedidos}
+    archivo_pedidos.cerrar()
+
+
+def comprobar_busquedas(archivo_pedidos: ArchivoPedidos, esperados: dict):
+    for pedido_id in range(-1, 100):
+        pedido = archivo_pedidos.buscar(pedido_id)
+        if pedido_id in esperados:
+            assert pedido is not None and pedido.to_dict() == esperados[pedido_id]
+        else:
+            assert pedido is None, pedido_id
+    assert archivo_pedidos.buscar("5") is None and archivo_pedidos.buscar(5.0) is None
+
+
+def test_busqueda_de_bloques(archivados):
+    archivo_pedidos, esperados = archivados
+    estadisticas = archivo_pedidos.estadisticas()
+    assert estadisticas["pedidos"] == len(esperados) and estadisticas["ultimo_id"] == 89
+    assert estadisticas["bloques"] == 6 + 5 # 36 y 29 pedidos en bloques de 7
+
+    # Los límites de cada bloque, los huecos y los identificadores entre segmentos
+    for bloque in archivo_pedidos._bloques:
+        assert archivo_pedidos.buscar(bloque.primer_id).id == bloque.primer_id
+        assert archivo_pedidos.buscar(bloque.ultimo_id).id == bloque.ultimo_id
+    comprobar_busquedas(archivo_pedidos, esperados)
+
+
+def test_cache_de_bloques(archivados):
+    archivo_pedidos, _ = archivados
+    archivo_pedidos.buscar(1)
+    archivo_pedidos.buscar(2)  # Mismo bloque: acierto
+    archivo_pedidos.buscar(70) # Otro bloque
+    archivo_pedidos.buscar(85) # Otro más: se expulsa el primero (caben 2)
+    archivo_pedidos.buscar(3)
+    estadisticas = archivo_pedidos.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"], estadisticas["bloques_en_cache"]) == (1, 4, 2)
+
+
+def test_cargar_al_arrancar(archivados, tmp_path):
+    archivo_pedidos, esperados = archivados
+    # Un segmento a medio escribir (sin índice) se descarta
+    with open(tmp_path / "segmento-000003.bin", "wb") as fichero:
+        fichero.write(b"incompleto")
+
+    cargado = ArchivoPedidos(str(tmp_path))
+    agregados = cargado.cargar()
+    assert not os.path.exists(tmp_path / "segmento-000003.bin")
+    assert cargado.estadisticas()["bloques"] == archivo_pedidos.estadisticas()["bloques"]
+    comprobar_busquedas(cargado, esperados)
+
+    # Las unidades vendidas de los pedidos archivados se recuperan del índice
+    assert agregados.unidades_productos[7] == sum(esperados)
+    # El siguiente segmento continúa la numeración
+    cargado.archivar(_pedidos([95]))
+    assert os.path.exists(tmp_path / "segmento-000003.json")
+    assert cargado.buscar(95).id == 95
+    cargado.cerrar()
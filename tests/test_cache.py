@@ -0,0 +1,89 @@
+# --------------------------------------------------------------------------------
+#                                   TEST_CACHE.PY
+#
+# Pruebas de la caché de respuestas de los GET (LRU, invalidación, ETag y 304).
+# --------------------------------------------------------------------------------
+
+from cache import CacheRespuestas
+
+
+def test_lru_por_bytes():
+    cache = CacheRespuestas(max_bytes=30)
+    cache.guardar("a", b"x" * 10)
+    cache.guardar("b", b"y" * 10)
+    cache.guardar("c", b"z" * 10)
+    assert cache.obtener("a") is not None # "a" pasa a ser la más usada
+    cache.guardar("d", b"w" * 10)         # Se expulsa "b", la menos usada
+
+    assert cache.obtener("b") is None
+    assert [clave for clave in "acd" if cache.obtener(clave) is not None] == ["a", "c", "d"]
+    assert cache.bytes == 30 and cache.expulsiones == 1
+
+    # Sustituir una entrada no cuenta sus bytes dos veces
+    cache.guardar("a", b"v" * 5)
+    assert cache.bytes == 25
+    # Las respuestas más grandes que la caché no se guardan, pero tienen ETag
+    entrada = cache.guardar("grande", b"g" * 31)
+    assert entrada.etag and cache.obtener("grande") is None
+
+
+def test_invalidar_y_generaciones():
+    cache = CacheRespuestas()
+    cache.guardar(("pedido", 1), b"{}")
+    cache.invalidar(("pedido", 1))
+    assert cache.obtener(("pedido", 1)) is None and cache.bytes == 0
+
+    clave = ("pedidos", cache.generacion("pedidos"), b"limit=2")
+    cache.guardar(clave, b"[]")
+    cache.nueva_generacion("pedidos")
+    assert ("pedidos", cache.generacion("pedidos"), b"limit=2") != clave
+
+
+def test_desactivada():
+    cache = CacheRespuestas(max_bytes=0)
+    entrada = cache.guardar("a", b"{}")
+    assert entrada.etag == CacheRespuestas().guardar("a", b"{}").etag
+    assert cache.obtener("a") is None and cache.bytes == 0
+
+
+# El body es el mismo byte a byte con la caché activada (acierto o fallo) y desactivada
+def test_mismo_body_con_y_sin_cache(api, cliente, monkeypatch):
+    producto_id = cliente.post("/productos", json={"nombre": "Caché ñ", "precio": 3.5}).get_json()["producto"]["id"]
+    pedido_id = cliente.post("/pedidos", json={"nombre_cliente": "Caché", "lista_pedidos": [
+        {"id_producto": producto_id, "cantidad": 2}]}).get_json()["pedido"]["pedido_id"]
+
+    for url in (f"/productos/{producto_id}/", f"/pedidos/{pedido_id}/", "/pedidos?limit=3"):
+        fallo = cliente.get(url)
+        acierto = cliente.get(url)
+        with monkeypatch.context() as parche:
+            parche.setattr(api.cache, "max_bytes", 0)
+            sin_cache = cliente.get(url)
+        assert fallo.get_data() == acierto.get_data() == sin_cache.get_data()
+        assert fallo.headers["ETag"] == acierto.headers["ETag"] == sin_cache.headers["ETag"]
+        assert fallo.mimetype == sin_cache.mimetype == "application/json"
+        # Igual que una respuesta de Flask que no pasa por la caché
+        assert fallo.get_data() == api.app.json.response(fallo.get_json()).get_data()
+
+
+def test_etag_304_e_invalidacion(cliente):
+    producto_id = cliente.post("/productos", json={"nombre": "ETag", "precio": 1}).get_json()["producto"]["id"]
+    lineas = [{"id_producto": producto_id, "cantidad": 1}]
+    pedido_id = cliente.post("/pedidos", json={"nombre_cliente": "ETag",
+                                               "lista_pedidos": lineas}).get_json()["pedido"]["pedido_id"]
+    url = f"/pedidos/{pedido_id}/"
+
+    etag = cliente.get(url).headers["ETag"]
+    respuesta = cliente.get(url, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 304 and respuesta.get_data() == b""
+
+    # Al modificar el pedido cambian el body y el ETag
+    cliente.patch(url, json={"nombre_cliente": "ETag cambiado"})
+    respuesta = cliente.get(url, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200 and respuesta.headers["ETag"] != etag
+    assert respuesta.get_json()["pedido"]["nombre_cliente"] == "ETag cambiado"
+
+    # Los listados se invalidan al crear un pedido (nueva generación)
+    listado = "/pedidos?nombre_cliente=ETag%20cambiado"
+    antes = cliente.get(listado).get_json()["listado_pedidos"]
+    cliente.post("/pedidos", json={"nombre_cliente": "ETag cambiado", "lista_pedidos": lineas})
+    assert len(cliente.get(listado).get_json()["listado_pedidos"]) == len(antes) + 1
@@ -0,0 +1,134 @@
+# --------------------------------------------------------------------------------
+#                                  TEST_CAMBIOS.PY
+#
+# Pruebas del registro de cambios: secuencias (cursores opacos), paginación,
+# cambios perdidos, esperas y el endpoint GET /cambios.
+# --------------------------------------------------------------------------------
+
+import asyncio
+import threading
+
+import pytest
+
+import cambios
+from cambios import PEDIDO_CREADO, PEDIDO_ELIMINADO, RegistroCambios
+
+
+def _emitir(registro: RegistroCambios, desde_id: int, numero: int):
+    registro.emitir([(PEDIDO_CREADO, pedido_id, {"pedido_id": pedido_id})
+                     for pedido_id in range(desde_id, desde_id + numero)])
+
+
+def test_cursores_y_paginacion():
+    registro = RegistroCambios(capacidad=100)
+    assert registro.leer("0", 10) == ([], registro.ultima)
+
+    _emitir(registro, 1, 25)
+    ids, desde = [], "0"
+    while True:
+        leidos, desde = registro.leer(desde, 10)
+        if not leidos:
+            break
+        ids += [cambio.entidad_id for cambio in leidos]
+    assert ids == list(range(1, 26)) and desde == registro.ultima
+
+    # Los cambios posteriores se leen a partir del último cursor
+    registro.emitir([(PEDIDO_ELIMINADO, 3, None)])
+    leidos, siguiente = registro.leer(desde, 10)
+    assert [(cambio.tipo, cambio.entidad_id) for cambio in leidos] == [(PEDIDO_ELIMINADO, 3)]
+    assert siguiente == leidos[-1].secuencia == registro.ultima
+    assert leidos[-1].to_dict()["secuencia"] == siguiente
+
+
+def test_cambios_perdidos():
+    registro = RegistroCambios(capacidad=10)
+    _emitir(registro, 1, 5)
+    desde = registro.ultima
+    antiguo = registro.leer("0", 1)[1] # Cursor del primer cambio
+    _emitir(registro, 6, 8)             # Se descartan los 3 más antiguos
+
+    assert registro.leer(antiguo, 10) == ([], None)
+    assert [cambio.entidad_id for cambio in registro.leer(desde, 10)[0]] == list(range(6, 14))
+    assert [cambio.entidad_id for cambio in registro.leer("0", 100)[0]] == list(range(4, 14))
+    assert registro.descartados == 3
+
+    # Un cursor "del futuro" (mismo arranque, número mayor que el último) tampoco es válido
+    assert registro.leer(registro.secuencia(registro.numero + 1), 10) == ([], None)
+
+
+# Los cursores de otro arranque se detectan por la época, sin depender del reloj
+def test_cursor_de_otro_arranque():
+    anterior = RegistroCambios()
+    _emitir(anterior, 1, 50)
+    nuevo = RegistroCambios()
+    assert nuevo.epoca != anterior.epoca
+    _emitir(nuevo, 1, 100)
+
+    assert nuevo.leer(anterior.ultima, 10) == ([], None)
+    assert nuevo.leer(anterior.secuencia(0), 10) == ([], None)
+
+
+def test_leer_parametros():
+    assert cambios.leer_parametros({}, {}) == ("0", cambios.LIMITE, cambios.ESPERA)
+    assert cambios.leer_parametros({}, {"Last-Event-ID": "ab12-7"})[0] == "ab12-7"
+    assert cambios.leer_parametros({"desde": "ab12-8"}, {"Last-Event-ID": "ab12-7"})[0] == "ab12-8"
+    for argumentos in ({"desde": "7"}, {"desde": "-1"}, {"desde": "ab12-"}, {"desde": "AB-1"},
+                       {"limit": "0"}, {"limit": "x"}, {"espera": "nan"}, {"espera": "61"}):
+        with pytest.raises(ValueError):
+            cambios.leer_parametros(argumentos, {})
+
+
+def test_esperas():
+    registro = RegistroCambios()
+    desde = registro.ultima
+    assert registro.esperar(desde, 0.05) is False
+
+    threading.Timer(0.05, _emitir, (registro, 1, 1)).start()
+    assert registro.esperar(desde, 5) is True
+
+    async def esperar():
+        desde = registro.ultima
+        threading.Timer(0.05, _emitir, (registro, 2, 1)).start()
+        return await registro.esperar_async(desde, 5), await registro.esperar_async(registro.ultima, 0.05)
+    assert asyncio.run(esperar()) == (True, False)
+
+
+def test_get_cambios(cliente):
+    desde = cliente.get("/cambios?espera=0").get_json()["ultima"]
+    producto_id = cliente.post("/productos", json={"nombre": "Cambios", "precio": 1}).get_json()["producto"]["id"]
+    lineas = [{"id_producto": producto_id, "cantidad": 1}]
+    pedido_id = cliente.post("/pedidos", json={"nombre_cliente": "Cambios",
+                                               "lista_pedidos": lineas}).get_json()["pedido"]["pedido_id"]
+    cliente.patch(f"/pedidos/{pedido_id}/", json={"nombre_cliente": "Cambios 2"})
+    cliente.delete(f"/pedidos/{pedido_id}/")
+
+    respuesta = cliente.get(f"/cambios?desde={desde}&espera=0&limit=2")
+    cuerpo = respuesta.get_json()
+    assert respuesta.status_code == 200
+    assert [(cambio["tipo"], cambio["id"]) for cambio in cuerpo["cambios"]] == [
+        ("producto_creado", producto_id), ("pedido_creado", pedido_id)]
+
+    cuerpo = cliente.get(f"/cambios?desde={cuerpo['siguiente']}&espera=0").get_json()
+    assert [(cambio["tipo"], cambio["id"]) for cambio in cuerpo["cambios"]] == [
+        ("pedido_actualizado", pedido_id), ("pedido_eliminado", pedido_id)]
+    assert cuerpo["cambios"][0]["datos"]["nombre_cliente"] == "Cambios 2"
+    assert cuerpo["siguiente"] == cuerpo["ultima"]
+
+    # Cursor de otro arranque (otra época): hay que volver a descargar los pedidos
+    respuesta = cliente.get("/cambios?desde=0123abcd-5&espera=0")
+    assert respuesta.status_code == 410 and "ultima" in respuesta.get_json()
+    assert cliente.get("/cambios?desde=1760000000000123").status_code == 400
+
+
+def test_get_cambios_sse(api, cliente, monkeypatch):
+    monkeypatch.setattr(cambios, "SSE_DURACION", 0.2)
+    desde = api.registro_cambios.ultima
+    producto_id = cliente.post("/productos", json={"nombre": "SSE", "precio": 1}).get_json()["producto"]["id"]
+
+    texto = cliente.get("/cambios", headers={"Accept": "text/event-stream", "Last-Event-ID": desde}).get_data(as_text=True)
+    assert texto.startswith(cambios.SSE_INICIO)
+    assert f"id: {api.registro_cambios.ultima}\nevent: producto_creado\n" in texto
+    assert f'"id": {producto_id}' in texto
+
+    texto = cliente.get("/cambios?desde=0123abcd-5", headers={"Accept": "text/event-stream"}).get_data(as_text=True)
+    assert "event: cambios_perdidos" in texto
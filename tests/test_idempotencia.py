@@ -0,0 +1,115 @@
+# --------------------------------------------------------------------------------
+#                                TEST_IDEMPOTENCIA.PY
+#
+# Pruebas de las respuestas guardadas por "Idempotency-Key": reintentos,
+# conflictos (misma clave con otra petición o mientras se ejecuta) y body NDJSON.
+# --------------------------------------------------------------------------------
+
+import io
+import json
+import uuid
+
+import idempotencia
+from idempotencia import DISTINTA, EN_CURSO, NUEVA, REPETIDA, CacheIdempotencia, LectorConHuella
+
+
+def test_estados():
+    cache = CacheIdempotencia()
+    huella = idempotencia.huella("POST", "/pedidos?", b'{"a": 1}')
+    otra = idempotencia.huella("POST", "/pedidos?", b'{"a": 2}')
+
+    assert cache.empezar("k", huella) == (NUEVA, None)
+    # Mientras se ejecuta: la misma petición espera y otra distinta se rechaza
+    assert cache.empezar("k", huella) == (EN_CURSO, None)
+    assert cache.empezar("k", otra) == (DISTINTA, None)
+
+    cache.guardar("k", 201, "application/json", b'{"ok": true}')
+    estado, guardada = cache.empezar("k", huella)
+    assert estado == REPETIDA and (guardada.codigo, guardada.cuerpo) == (201, b'{"ok": true}')
+    assert cache.empezar("k", otra) == (DISTINTA, None)
+
+    # Si la petición falla, la clave se libera para poder reintentar
+    assert cache.empezar("j", huella)[0] == NUEVA
+    cache.cancelar("j")
+    assert cache.empezar("j", huella)[0] == NUEVA
+
+
+def test_caducidad_y_tamano():
+    cache = CacheIdempotencia(duracion=0)
+    cache.empezar("k", b"h")
+    cache.guardar("k", 200, "application/json", b"{}")
+    assert cache.empezar("k", b"otra")[0] == NUEVA # La respuesta guardada ha caducado
+
+    cache = CacheIdempotencia(max_bytes=10)
+    for clave in "abc":
+        cache.empezar(clave, b"h")
+        cache.guardar(clave, 200, "application/json", b"x" * 4)
+    # Se expulsa la más antigua para no pasar de 10 bytes
+    assert cache.bytes == 8 and cache.empezar("a", b"h")[0] == NUEVA
+    assert cache.empezar("c", b"h")[0] == REPETIDA
+
+
+def test_lector_con_huella():
+    cuerpo = b"".join(json.dumps({"nombre": f"P{numero}", "precio": numero}).encode() + b"\n" for numero in range(2000))
+    lector = LectorConHuella("POST", "/productos/bulk?", io.BytesIO(cuerpo))
+    # Se lee solo una parte: el resto se lee al pedir la huella
+    assert io.BufferedReader(lector, buffer_size=1024).readline().startswith(b'{"nombre": "P0"')
+    assert lector.huella() == idempotencia.huella("POST", "/productos/bulk?", cuerpo)
+
+
+def _pedido(producto_id: int, cantidad: int = 1) -> dict:
+    return {"nombre_cliente": "Idempotente", "lista_pedidos": [{"id_producto": producto_id, "cantidad": cantidad}]}
+
+
+def test_reintento_y_conflictos(api, cliente, monkeypatch):
+    producto_id = cliente.post("/productos", json={"nombre": "Idem", "precio": 1}).get_json()["producto"]["id"]
+    clave = {"Idempotency-Key": str(uuid.uuid4())}
+    pedidos = len(api.lista_pedidos)
+
+    primera = cliente.post("/pedidos", json=_pedido(producto_id), headers=clave)
+    repetida = cliente.post("/pedidos", json=_pedido(producto_id), headers=clave)
+    assert primera.status_code == repetida.status_code == 201
+    assert repetida.get_data() == primera.get_data()
+    assert repetida.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in primera.headers
+    assert len(api.lista_pedidos) == pedidos + 1
+
+    # La misma clave con otro body o con otra ruta
+    assert cliente.post("/pedidos", json=_pedido(producto_id, 2), headers=clave).status_code == 422
+    assert cliente.post("/productos", json={"nombre": "Idem", "precio": 1}, headers=clave).status_code == 422
+
+    # La misma petición mientras la primera se está ejecutando
+    otra_clave = {"Idempotency-Key": str(uuid.uuid4())}
+    cuerpo = json.dumps(_pedido(producto_id, 3)).encode()
+    api.cache_idempotencia.empezar(otra_clave["Idempotency-Key"], idempotencia.huella("POST", "/pedidos?", cuerpo))
+    respuesta = cliente.post("/pedidos", data=cuerpo, content_type="application/json", headers=otra_clave)
+    assert respuesta.status_code == 409
+    api.cache_idempotencia.cancelar(otra_clave["Idempotency-Key"])
+    assert cliente.post("/pedidos", data=cuerpo, content_type="application/json", headers=otra_clave).status_code == 201
+
+    # Los errores del servidor no se guardan: el reintento se ejecuta
+    def fallar(*argumentos):
+        raise OSError("No queda espacio en el dispositivo")
+    clave_fallo = {"Idempotency-Key": str(uuid.uuid4())}
+    with monkeypatch.context() as parche:
+        parche.setattr(api.persistencia, "registrar_pedido", fallar)
+        assert cliente.post("/pedidos", json=_pedido(producto_id), headers=clave_fallo).status_code == 500
+    respuesta = cliente.post("/pedidos", json=_pedido(producto_id), headers=clave_fallo)
+    assert respuesta.status_code == 201 and "Idempotent-Replayed" not in respuesta.headers
+
+
+def test_bulk_ndjson(api, cliente):
+    clave = {"Idempotency-Key": str(uuid.uuid4())}
+    cuerpo = "".join(json.dumps({"nombre": f"NDJSON {numero}", "precio": numero}) + "\n" for numero in range(500))
+    productos = len(api.arbol_productos)
+
+    primera = cliente.post("/productos/bulk", data=cuerpo, content_type="application/x-ndjson", headers=clave)
+    repetida = cliente.post("/productos/bulk", data=cuerpo, content_type="application/x-ndjson", headers=clave)
+    assert primera.status_code == repetida.status_code == 201
+    assert repetida.get_data() == primera.get_data() and repetida.headers["Idempotent-Replayed"] == "true"
+    assert len(api.arbol_productos) == productos + 500
+
+    # Otro body con la misma clave se rechaza sin crear nada
+    respuesta = cliente.post("/productos/bulk", data=cuerpo + '{"nombre": "Otro", "precio": 1}\n',
+                             content_type="application/x-ndjson", headers=clave)
+    assert respuesta.status_code == 422
+    assert len(api.arbol_productos) == productos + 500
@@ -0,0 +1,137 @@
+# --------------------------------------------------------------------------------
+#                                  TEST_PEDIDOS.PY
+#
+# Pruebas de la lista de pedidos: índices secundarios (por cliente y por producto)
+# y paginación de los listados filtrados.
+# --------------------------------------------------------------------------------
+
+import random
+
+import pytest
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+
+
+# Comprueba que los índices secundarios coinciden con los que se obtienen recorriendo
+# todos los pedidos, y que cada lista de identificadores está ordenada
+def comprobar_indices(lista: ListaPedidos):
+    clientes, productos = {}, {}
+    for pedido in lista.listar_pedidos():
+        clientes.setdefault(pedido.nombre_cliente, []).append(pedido.id)
+        for producto_id in {producto_id for producto_id, _ in pedido.lista_pedidos.pares()}:
+            productos.setdefault(producto_id, []).append(pedido.id)
+    assert lista.indice_clientes == clientes
+    assert lista.indice_productos == {producto_id: sorted(ids) for producto_id, ids in productos.items()}
+
+
+# Pedidos que cumplen los filtros, recorriendo la lista completa
+def filtrar_todos(lista: ListaPedidos, nombre_cliente=None, producto_id=None) -> list[int]:
+    return [pedido.id for pedido in lista.listar_pedidos()
+            if (nombre_cliente is None or pedido.nombre_cliente == nombre_cliente)
+            and (producto_id is None or producto_id in {linea.producto_id for linea in pedido.lista_pedidos})]
+
+
+# Recorre los resultados filtrados por páginas de "limite" pedidos con el cursor "despues_de"
+def paginar(lista: ListaPedidos, limite: int, **filtros) -> list[int]:
+    ids, cursor = [], None
+    while True:
+        pagina = []
+        for pedido in lista.filtrar_pedidos(despues_de=cursor, **filtros):
+            pagina.append(pedido.id)
+            if len(pagina) == limite:
+                break
+        ids += pagina
+        if len(pagina) < limite:
+            return ids
+        cursor = pagina[-1]
+
+
+def _lineas(azar) -> list[LineaPedido]:
+    return [LineaPedido(producto_id, azar.randint(1, 5)) for producto_id in azar.sample(range(1, 9), azar.randint(1, 3))]
+
+
+@pytest.mark.parametrize("semilla", range(4))
+def test_indices_y_filtros_aleatorio(semilla):
+    azar = random.Random(semilla)
+    lista = ListaPedidos()
+    clientes = ["Ana", "Luis", "Eva"]
+    siguiente_id = 1
+
+    for paso in range(1200):
+        operacion = azar.random()
+        existentes = list(lista.indice)
+        if operacion < 0.35 or not existentes:
+            lista.agregar_pedido(Pedido(siguiente_id, azar.choice(clientes), _lineas(azar)))
+            siguiente_id += 1
+        elif operacion < 0.45:
+            lote = [Pedido(siguiente_id + desplazamiento, azar.choice(clientes), _lineas(azar))
+                    for desplazamiento in range(azar.randint(1, 5))]
+            lista.agregar_pedidos(lote)
+            siguiente_id += len(lote)
+        elif operacion < 0.6:
+            pedido_id = azar.choice(existentes)
+            lista.actualizar_pedido(pedido_id, Pedido(pedido_id, azar.choice(clientes), _lineas(azar)))
+        elif operacion < 0.8:
+            pedido_id = azar.choice(existentes)
+            cambios = {producto_id: azar.choice([0, 1, 7]) for producto_id in azar.sample(range(1, 9), 2)}
+            if len(lista.buscar_pedido(pedido_id).lista_pedidos) > len(cambios):
+                lista.modificar_lineas(pedido_id, cambios, azar.choice(clientes + [None]))
+        elif operacion < 0.97:
+            lista.eliminar_pedido(azar.choice(existentes))
+        else:
+            # Se archivan los pedidos más antiguos
+            lista.extraer_antiguos(azar.choice(existentes))
+
+        if paso % 100 == 0:
+            comprobar_indices(lista)
+
+    comprobar_indices(lista)
+    for filtros in ({"nombre_cliente": "Ana"}, {"producto_id": 3}, {"nombre_cliente": "Eva", "producto_id": 5},
+                    {"nombre_cliente": "Nadie"}, {"producto_id": 99}):
+        esperados = filtrar_todos(lista, **filtros)
+        assert [pedido.id for pedido in lista.filtrar_pedidos(**filtros)] == esperados
+        for limite in (1, 7):
+            assert paginar(lista, limite, **filtros) == esperados
+
+
+# El cursor puede ser un pedido que ya no existe o que no cumple el filtro
+def test_filtro_con_cursor_eliminado():
+    lista = ListaPedidos()
+    for pedido_id in range(1, 11):
+        lista.agregar_pedido(Pedido(pedido_id, "Ana" if pedido_id % 2 else "Luis", [LineaPedido(1, 1)]))
+    lista.eliminar_pedido(5)
+    assert [pedido.id for pedido in lista.filtrar_pedidos(nombre_cliente="Ana", despues_de=5)] == [7, 9]
+    assert [pedido.id for pedido in lista.filtrar_pedidos(nombre_cliente="Ana", despues_de=4)] == [7, 9]
+
+
+# Los pedidos que se eliminan mientras se recorre un filtro no se devuelven
+def test_filtro_mientras_se_elimina():
+    lista = ListaPedidos()
+    for pedido_id in range(1, 11):
+        lista.agregar_pedido(Pedido(pedido_id, "Ana", [LineaPedido(1, 1)]))
+    devueltos = []
+    for pedido in lista.filtrar_pedidos(nombre_cliente="Ana", producto_id=1):
+        devueltos.append(pedido.id)
+        lista.eliminar_pedido(pedido.id + 1)
+    assert devueltos == [1, 3, 5, 7, 9]
+
+
+def test_get_pedidos_filtrado_paginado(cliente):
+    producto_id = cliente.post("/productos", json={"nombre": "Filtro", "precio": 2}).get_json()["producto"]["id"]
+    creados = []
+    for numero in range(9):
+        lineas = [{"id_producto": producto_id, "cantidad": numero + 1}]
+        respuesta = cliente.post("/pedidos", json={"nombre_cliente": "Paginado" if numero % 3 else "Otro",
+                                                   "lista_pedidos": lineas})
+        creados.append((respuesta.get_json()["pedido"]["pedido_id"], numero % 3 != 0))
+
+    esperados = [pedido_id for pedido_id, paginado in creados if paginado]
+    ids, cursor = [], None
+    while True:
+        url = f"/pedidos?nombre_cliente=Paginado&producto_id={producto_id}&limit=4"
+        cuerpo = cliente.get(url + (f"&after={cursor}" if cursor is not None else "")).get_json()
+        ids += [pedido["pedido_id"] for pedido in cuerpo["listado_pedidos"]]
+        cursor = cuerpo["siguiente"]
+        if cursor is None:
+            break
+    assert ids == esperados
@@ -0,0 +1,168 @@
+# --------------------------------------------------------------------------------
+#                               TEST_PERSISTENCIA.PY
+#
+# Pruebas de la persistencia en disco: snapshot + registro (write-ahead log).
+# --------------------------------------------------------------------------------
+
+import os
+
+import pytest
+
+from lista_enlazada_pedidos import LineaPedido, ListaPedidos, Pedido
+from persistencia import FICHERO_REGISTRO, FICHERO_SNAPSHOT, Persistencia
+from productos import Producto, ProductosTreeBST
+
+
+def nueva_persistencia(directorio, operaciones_por_snapshot: int = 1000):
+    arbol, lista = ProductosTreeBST(), ListaPedidos()
+    persistencia = Persistencia(directorio=str(directorio), arbol=arbol, lista=lista,
+                                operaciones_por_snapshot=operaciones_por_snapshot)
+    siguientes = persistencia.cargar()
+    return persistencia, arbol, lista, siguientes
+
+
+def estado(arbol: ProductosTreeBST, lista: ListaPedidos) -> tuple[list, list]:
+    return ([producto.to_dict() for producto in arbol.recorrido_inorder()],
+            [pedido.to_dict() for pedido in lista.listar_pedidos()])
+
+
+# Hace las mismas operaciones que los endpoints: primero se anotan en el registro y
+# después se aplican en memoria
+def operaciones(persistencia: Persistencia, arbol: ProductosTreeBST, lista: ListaPedidos):
+    for producto_id in range(1, 6):
+        producto = Producto(producto_id, f"Producto {producto_id}", producto_id * 1.5)
+        persistencia.registrar_producto(producto)
+        arbol.insertar(producto)
+    productos = [Producto(producto_id, f"Lote {producto_id}", 2) for producto_id in range(6, 9)]
+    persistencia.registrar_productos(productos)
+    arbol.insertar_lote(productos)
+
+    for pedido_id in range(1, 5):
+        pedido = Pedido(pedido_id, f"Cliente {pedido_id % 2}", [LineaPedido(pedido_id, 2), LineaPedido(7, 1)])
+        persistencia.registrar_pedido(pedido)
+        lista.agregar_pedido(pedido)
+
+    actualizado = Pedido(2, "Cliente nuevo", [LineaPedido(3, 9)])
+    persistencia.registrar_actualizacion(actualizado)
+    lista.actualizar_pedido(2, actualizado)
+    persistencia.registrar_modificacion(3, {7: 0, 5: 4}, "Cliente 3")
+    lista.modificar_lineas(3, {7: 0, 5: 4}, "Cliente 3")
+    persistencia.registrar_eliminacion(4)
+    lista.eliminar_pedido(4)
+
+
+@pytest.mark.parametrize("operaciones_por_snapshot", [1000, 4])
+def test_ida_y_vuelta(tmp_path, operaciones_por_snapshot):
+    persistencia, arbol, lista, _ = nueva_persistencia(tmp_path, operaciones_por_snapshot)
+    operaciones(persistencia, arbol, lista)
+    esperado = estado(arbol, lista)
+    persistencia.cerrar()
+    if operaciones_por_snapshot < 1000:
+        # Se han generado snapshots por el camino y el registro solo tiene las últimas
+        assert os.path.getsize(tmp_path / FICHERO_SNAPSHOT) > 0
+
+    persistencia, arbol, lista, siguientes = nueva_persistencia(tmp_path, operaciones_por_snapshot)
+    assert estado(arbol, lista) == esperado
+    assert siguientes == (9, 5)
+
+    # Una snapshot explícita seguida de otro arranque da el mismo resultado
+    persistencia.guardar_snapshot()
+    persistencia.cerrar()
+    persistencia, arbol, lista, siguientes = nueva_persistencia(tmp_path)
+    assert estado(arbol, lista) == esperado and siguientes == (9, 5)
+    assert os.path.getsize(tmp_path / FICHERO_REGISTRO) == 0
+    persistencia.cerrar()
+
+
+def test_linea_incompleta_al_final(tmp_path):
+    persistencia, arbol, lista, _ = nueva_persistencia(tmp_path)
+    operaciones(persistencia, arbol, lista)
+    esperado = estado(arbol, lista)
+    persistencia.cerrar()
+
+    # El proceso se detiene mientras escribe la siguiente operación
+    ruta = tmp_path / FICHERO_REGISTRO
+    tamano = os.path.getsize(ruta)
+    with open(ruta, "ab") as fichero:
+        fichero.write(b'{"op": "agregar_pedido", "id": 9, "nombre_cl')
+
+    persistencia, arbol, lista, siguientes = nueva_persistencia(tmp_path)
+    assert estado(arbol, lista) == esperado and siguientes == (9, 5)
+    # La línea incompleta se ha borrado del registro
+    assert os.path.getsize(ruta) == tamano
+
+    # Las siguientes operaciones se leen bien en el próximo arranque
+    pedido = Pedido(5, "Después", [LineaPedido(1, 1)])
+    persistencia.registrar_pedido(pedido)
+    lista.agregar_pedido(pedido)
+    esperado = estado(arbol, lista)
+    persistencia.cerrar()
+    persistencia, arbol, lista, siguientes = nueva_persistencia(tmp_path)
+    assert estado(arbol, lista) == esperado and siguientes == (9, 6)
+    persistencia.cerrar()
+
+
+def test_escritura_fallida_no_deja_nada(tmp_path):
+    persistencia, arbol, lista, _ = nueva_persistencia(tmp_path)
+    operaciones(persistencia, arbol, lista)
+    esperado = estado(arbol, lista)
+    ruta = tmp_path / FICHERO_REGISTRO
+    tamano = os.path.getsize(ruta)
+
+    # El disco se llena a mitad de la escritura
+    fichero = persistencia.fichero_registro
+    class FicheroLleno:
+        def tell(self):
+            return fichero.tell()
+
+        def write(self, datos):
+            fichero.write(datos[:10])
+            fichero.flush()
+            raise OSError("No queda espacio en el dispositivo")
+
+        def close(self):
+            fichero.close()
+
+    persistencia.fichero_registro = FicheroLleno()
+    with pytest.raises(OSError):
+        persistencia.registrar_producto(Producto(9, "No se guarda", 1))
+    assert os.path.getsize(ruta) == tamano
+
+    # El registro se vuelve a abrir en la siguiente operación
+    producto = Producto(10, "Sí se guarda", 1)
+    persistencia.registrar_producto(producto)
+    arbol.insertar(producto)
+    esperado = estado(arbol, lista)
+    persistencia.cerrar()
+
+    persistencia, arbol, lista, _ = nueva_persistencia(tmp_path)
+    assert estado(arbol, lista) == esperado
+    assert arbol.buscar(9) is None
+    persistencia.cerrar()
+
+
+# Si no se puede escribir en el registro, la petición falla y los datos en memoria no cambian
+def test_endpoints_no_aplican_si_falla_el_registro(api, cliente, monkeypatch):
+    producto_id = cliente.post("/productos", json={"nombre": "Registro", "precio": 1}).get_json()["producto"]["id"]
+    pedido = cliente.post("/pedidos", json={"nombre_cliente": "Registro",
+                                            "lista_pedidos": [{"id_producto": producto_id, "cantidad": 1}]})
+    pedido_id = pedido.get_json()["pedido"]["pedido_id"]
+    antes = (len(api.arbol_productos), cliente.get(f"/pedidos/{pedido_id}/").get_json()["pedido"])
+
+    def fallar(*argumentos):
+        raise OSError("No queda espacio en el dispositivo")
+    for nombre in ("registrar_producto", "registrar_productos", "registrar_pedido", "registrar_pedidos",
+                   "registrar_actualizacion", "registrar_modificacion", "registrar_eliminacion"):
+        monkeypatch.setattr(api.persistencia, nombre, fallar)
+
+    lineas = [{"id_producto": producto_id, "cantidad": 5}]
+    assert cliente.post("/productos", json={"nombre": "No", "precio": 1}).status_code == 500
+    assert cliente.post("/productos/bulk", json=[{"nombre": "No", "precio": 1}]).status_code == 500
+    assert cliente.post("/pedidos", json={"nombre_cliente": "No", "lista_pedidos": lineas}).status_code == 500
+    assert cliente.post("/pedidos/batch", json=[{"nombre_cliente": "No", "lista_pedidos": lineas}]).status_code == 500
+    assert cliente.put(f"/pedidos/{pedido_id}/", json={"nombre_cliente": "No", "lista_pedidos": lineas}).status_code == 500
+    assert cliente.patch(f"/pedidos/{pedido_id}/", json={"lista_pedidos": lineas}).status_code == 500
+    assert cliente.delete(f"/pedidos/{pedido_id}/").status_code == 500
+
+    assert (len(api.arbol_productos), cliente.get(f"/pedidos/{pedido_id}/").get_json()["pedido"]) == antes
+    assert api.lista_pedidos.buscar_pedido(pedido_id + 1) is None
@@ -0,0 +1,177 @@
+# --------------------------------------------------------------------------------
+#                                 TEST_PRODUCTOS.PY
+#
+# Pruebas del árbol de productos (AVL) y de su índice de precios.
+# --------------------------------------------------------------------------------
+
+import random
+
+import pytest
+
+from productos import Producto, ProductosTreeBST
+
+
+# Comprueba que el árbol es un AVL correcto (orden, alturas y equilibrio) y devuelve
+# sus claves en orden
+def comprobar_avl(arbol: ProductosTreeBST) -> list:
+    claves = []
+    pila = [(arbol.root, False)]
+    while pila:
+        nodo, visitado = pila.pop()
+        if nodo is None:
+            continue
+        if visitado:
+            claves.append(nodo.clave)
+            continue
+        altura_izquierda = nodo.left.altura if nodo.left is not None else 0
+        altura_derecha = nodo.right.altura if nodo.right is not None else 0
+        assert nodo.altura == 1 + max(altura_izquierda, altura_derecha)
+        assert abs(altura_izquierda - altura_derecha) <= 1
+        pila += [(nodo.right, False), (nodo, True), (nodo.left, False)]
+
+    assert claves == sorted(claves) and len(set(claves)) == len(claves)
+    assert len(claves) == len(arbol)
+    return claves
+
+
+# Comprueba que el índice de precios tiene exactamente los productos del árbol con
+# precio numérico, ordenados por (precio, identificador)
+def comprobar_indice_precios(arbol: ProductosTreeBST):
+    comprobar_avl(arbol.indice_precios)
+    esperados = sorted((producto for producto in arbol.recorrido_inorder()
+                        if type(producto.precio) in (int, float) and producto.precio == producto.precio),
+                       key=lambda producto: (producto.precio, producto.id))
+    indexados = arbol.indice_precios.recorrido_inorder()
+    assert [producto.id for producto in indexados] == [producto.id for producto in esperados]
+    assert all(indexado is arbol.buscar(indexado.id) for indexado in indexados)
+
+
+def test_insercion_secuencial_equilibrada():
+    arbol = ProductosTreeBST()
+    for producto_id in range(1, 1025):
+        arbol.insertar(Producto(producto_id, f"Producto {producto_id}", 1.0))
+    assert comprobar_avl(arbol) == list(range(1, 1025))
+    # Un AVL con n nodos tiene como mucho 1.44 * log2(n) de altura
+    assert arbol.altura() <= 15
+
+
+@pytest.mark.parametrize("orden", ["creciente", "decreciente", "aleatorio"])
+def test_eliminar_reequilibra(orden):
+    ids = list(range(1, 501))
+    arbol = ProductosTreeBST()
+    for producto_id in ids:
+        arbol.insertar(Producto(producto_id, "P", producto_id % 7))
+
+    if orden == "decreciente":
+        ids.reverse()
+    elif orden == "aleatorio":
+        random.Random(1).shuffle(ids)
+
+    # Se eliminan dos tercios de los productos, comprobando el árbol después de cada uno
+    for posicion, producto_id in enumerate(ids[:len(ids) * 2 // 3]):
+        eliminado = arbol.eliminar(producto_id)
+        assert eliminado is not None and eliminado.id == producto_id
+        assert arbol.buscar(producto_id) is None
+        if posicion % 25 == 0:
+            comprobar_avl(arbol)
+            comprobar_indice_precios(arbol)
+
+    assert comprobar_avl(arbol) == sorted(ids[len(ids) * 2 // 3:])
+    comprobar_indice_precios(arbol)
+    assert arbol.eliminar(ids[0]) is None
+
+
+def test_eliminar_nodo_con_dos_hijos():
+    arbol = ProductosTreeBST()
+    for producto_id in (50, 30, 70, 20, 40, 60, 80):
+        arbol.insertar(Producto(producto_id, "P", producto_id))
+    assert arbol.eliminar(50).id == 50
+    assert comprobar_avl(arbol) == [20, 30, 40, 60, 70, 80]
+    assert arbol.root.clave == 60 # El sucesor ocupa el lugar de la raíz
+    comprobar_indice_precios(arbol)
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_indice_precios_aleatorio(semilla):
+    azar = random.Random(semilla)
+    arbol = ProductosTreeBST()
+    # Precios repetidos, decimales, enteros y algunos que no se pueden ordenar
+    precios = [1, 2, 2.5, 3, 10, 10.0, 0, -1, float("nan"), "gratis", None]
+
+    for paso in range(1500):
+        operacion = azar.random()
+        producto_id = azar.randint(1, 200)
+        if operacion < 0.6:
+            # Inserta o sustituye (puede cambiar el precio de un producto existente)
+            arbol.insertar(Producto(producto_id, f"P{paso}", azar.choice(precios)))
+        else:
+            arbol.eliminar(producto_id)
+        if paso % 50 == 0:
+            comprobar_avl(arbol)
+            comprobar_indice_precios(arbol)
+
+    comprobar_avl(arbol)
+    comprobar_indice_precios(arbol)
+
+    # La paginación por precio devuelve lo mismo que ordenar todos los productos
+    ordenados = arbol.indice_precios.recorrido_inorder()
+    entre = [producto.id for producto in ordenados if 1 <= producto.precio <= 10]
+    assert [producto.id for producto in arbol.iterar_por_precio(1, 10)] == entre
+    if entre:
+        mitad = len(entre) // 2
+        pagina = arbol.iterar_por_precio(1, 10, despues_de=entre[mitad])
+        assert [producto.id for producto in pagina] == entre[mitad + 1:]
+
+
+# ------------------------------------------------------------
+#                   CARGA EN BLOQUE (insertar_lote)
+# ------------------------------------------------------------
+def _lote(ids, azar):
+    return [Producto(producto_id, f"Lote {producto_id}", azar.choice([1, 2.5, 9, "gratis"]))
+            for producto_id in ids]
+
+
+@pytest.mark.parametrize("existentes, nuevos", [
+    (range(0), range(1, 5001)),                            # Árbol vacío
+    (range(1, 2001), range(2001, 6001)),                   # Identificadores mayores que los existentes
+    (range(1, 4001, 2), range(2, 4001, 2)),                # Intercalados con los existentes
+    (range(1, 3001), list(range(1500, 2500)) * 2),         # Sustituye existentes y trae repetidos
+    (range(1, 20001), [7, 19999, 500]),                    # Lote pequeño: se insertan uno a uno
+])
+def test_insertar_lote(existentes, nuevos):
+    azar = random.Random(len(nuevos))
+    arbol = ProductosTreeBST()
+    for producto in _lote(existentes, azar):
+        arbol.insertar(producto)
+
+    lote = _lote(nuevos, azar)
+    azar.shuffle(lote)
+    arbol.insertar_lote(lote)
+
+    assert comprobar_avl(arbol) == sorted(set(existentes) | set(nuevos))
+    comprobar_indice_precios(arbol)
+    # Con identificadores repetidos se queda el último producto del lote
+    ultimos = {producto.id: producto for producto in lote}
+    assert all(arbol.buscar(producto_id) is producto for producto_id, producto in ultimos.items())
+
+
+def test_post_productos_bulk(cliente):
+    respuesta = cliente.post("/productos/bulk", json=[
+        {"nombre": "Bulk A", "precio": 3},
+        {"nombre": "Bulk B"},
+        "no es un objeto",
+        {"nombre": "Bulk C", "precio": 1.5},
+    ])
+    assert respuesta.status_code == 201
+    cuerpo = respuesta.get_json()
+    assert cuerpo["creados"] == 2 and cuerpo["ultimo_id"] == cuerpo["primer_id"] + 1
+    assert [error["fila"] for error in cuerpo["errores"]] == [2, 3]
+
+    respuesta = cliente.post("/productos/bulk",
+                             data='{"nombre": "Bulk D", "precio": 2}\n\n{"nombre": "Bulk E", "precio": 4}\n',
+                             content_type="application/x-ndjson")
+    assert respuesta.status_code == 201 and respuesta.get_json()["creados"] == 2
+    producto = cliente.get(f"/productos/{respuesta.get_json()['ultimo_id']}/").get_json()["producto"]
+    assert producto["nombre"] == "Bulk E"
+
+    assert cliente.post("/productos/bulk", json=[{"nombre": "Sin precio"}]).status_code == 400